@@ -0,0 +1,179 @@
+# acc_tiers.py
+
+import json
+import re
+
+from regions import REGION_SCHEMAS
+import metrics
+
+# Word stems in the input that point at a region; matched against the start of each word.
+REGION_CUES = {
+    "amygdala": (
+        "scar", "afraid", "fear", "alarm", "scream", "threat", "danger", "panic", "worr", "angry", "sad", "happy",
+        "joy", "cry", "reward", "prize", "won", "emotion", "express",
+    ),
+    "prefrontal_cortex": (
+        "solve", "calculat", "plan", "organiz", "schedul", "decid", "decision", "think", "reflect", "priorit",
+        "question", "belief", "reason", "strateg",
+    ),
+    "sensory_cortex": (
+        "sound", "hear", "noise", "music", "melod", "piano", "rustl", "bark", "tapping", "touch", "textur", "rough",
+        "smooth", "smell", "odor", "scent", "taste",
+    ),
+    "visual_cortex": (
+        "see", "saw", "seen", "look", "image", "photo", "picture", "portrait", "view", "skyline", "landscape",
+        "aerial", "color", "colour", "moving", "movement", "motion", "running", "driving",
+    ),
+    "hippocampus": (
+        "remember", "recall", "memor", "forgot", "childhood", "pattern", "recurring", "vivid", "learn",
+    ),
+}
+# Regions each sensor's data usually belongs to.
+SENSOR_REGIONS = {
+    "camera": ("visual_cortex",),
+    "video": ("visual_cortex",),
+    "image": ("visual_cortex", "amygdala"),
+    "microphone": ("sensory_cortex",),
+    "audio": ("sensory_cortex", "amygdala"),
+}
+# Arithmetic such as "5 - 3" or "10/2" belongs to the prefrontal cortex.
+ARITHMETIC = re.compile(r"\d\s*[-+*/=x]\s*\d")
+# Confidence when the input carries no evidence either way.
+NEUTRAL_CONFIDENCE = 0.6
+
+ACC_TIERS = metrics.counter(
+    "albert_acc_tier_total", "ACC evaluations answered by the rule scorer (rules) or the model (model)", ["tier"]
+)
+ACC_ESCALATION_RATIO = metrics.gauge(
+    "albert_acc_escalation_ratio", "Share of ACC evaluations escalated from the rule scorer to the model"
+)
+ACC_RULE_CONFIDENCE = metrics.histogram(
+    "albert_acc_rule_confidence",
+    "Confidence of the rule scorer's ACC evaluations",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+ACC_TIER_AGREEMENT = metrics.counter(
+    "albert_acc_tier_agreement_total",
+    "Escalated evaluations where the model's pass_doubt agreed (agree) or not (disagree) with the rule scorer",
+    ["outcome"],
+)
+ACC_TIER_AGREEMENT_RATIO = metrics.gauge(
+    "albert_acc_tier_agreement_ratio", "Share of escalated evaluations where the model agreed with the rule scorer"
+)
+
+
+def _ratio(part, other):
+    total = part + other
+    return part / total if total else 0.0
+
+
+ACC_ESCALATION_RATIO.set_function(lambda: _ratio(ACC_TIERS.value(tier="model"), ACC_TIERS.value(tier="rules")))
+ACC_TIER_AGREEMENT_RATIO.set_function(
+    lambda: _ratio(ACC_TIER_AGREEMENT.value(outcome="agree"), ACC_TIER_AGREEMENT.value(outcome="disagree"))
+)
+
+
+def _as_text(input_data):
+    # Sensor payloads are not always strings (e.g. {"input_data": 42}); the rules read text.
+    return input_data if isinstance(input_data, str) else json.dumps(input_data)
+
+
+def evaluate_rules(thalamus_data: dict, input_data: str) -> dict:
+    """Rule-based ACC evaluation of a thalamus result."""
+    input_data = _as_text(input_data)
+    region = thalamus_data.get("region", "unknown")
+    schema = thalamus_data.get("schema", "unknown")
+
+    # Simple logic for fallback assessment
+    is_valid_region = region in REGION_SCHEMAS
+
+    # Basic assessment based on input type
+    is_math = any(op in input_data.lower() for op in ["+", "-", "*", "/", "=", "solve", "calculate"])
+    is_logical = region == "prefrontal_cortex" and schema in ["problem_solving", "planning", "self_awareness"]
+
+    pass_doubt = is_valid_region and (is_logical if is_math else True)
+    threshold_score = 0.8 if pass_doubt else 0.3
+
+    # Generate appropriate emotional response
+    if is_math and is_logical:
+        feelings = "Focused and analytical. Ready to process logical data."
+    elif region == "amygdala":
+        feelings = "Alert and evaluating emotional significance."
+    elif region == "visual_cortex":
+        feelings = "Visually engaged and processing spatial information."
+    else:
+        feelings = "Processing input with appropriate cognitive resources."
+
+    significance = 0.6 if is_math or "important" in input_data.lower() else 0.4
+
+    return {
+        "pass_doubt": pass_doubt,
+        "threshold_score": threshold_score,
+        "feelings": feelings,
+        "significance": significance
+    }
+
+
+def _sensor(thalamus_data):
+    # The thalamus result carries the original event as a JSON string.
+    try:
+        event = json.loads(thalamus_data.get("message") or "{}")
+    except (TypeError, json.JSONDecodeError):
+        return None
+    return event.get("sensor") if isinstance(event, dict) else None
+
+
+def rule_confidence(thalamus_data: dict, input_data: str) -> float:
+    """How sure the rules are that the thalamus route fits the input, from 0 to 1.
+
+    Cue words and arithmetic for the routed region (and a matching sensor) count
+    as support; cues for the strongest other region count against it.
+    """
+    input_data = _as_text(input_data)
+    region = thalamus_data.get("region")
+    if thalamus_data.get("schema") not in REGION_SCHEMAS.get(region, ()):
+        return 0.0
+    words = re.findall(r"[a-z]+", input_data.lower())
+    hits = {
+        name: sum(1 for word in words if word.startswith(cues)) for name, cues in REGION_CUES.items()
+    }
+    if ARITHMETIC.search(input_data):
+        hits["prefrontal_cortex"] += 1
+    support = hits.pop(region)
+    if region in SENSOR_REGIONS.get(_sensor(thalamus_data), ()):
+        support += 1
+    conflict = max(hits.values())
+    if support == conflict == 0:
+        return NEUTRAL_CONFIDENCE
+    return round(0.5 + 0.45 * (support - conflict) / (support + conflict), 4)
+
+
+class TieredACC:
+    """Answers ACC evaluations with the rule scorer, escalating unsure ones to the model.
+
+    With ``enabled`` off every evaluation goes to the model, as before.
+    """
+
+    def __init__(self, enabled=True, escalation_threshold=0.7):
+        self.enabled = enabled
+        self.escalation_threshold = escalation_threshold
+
+    def triage(self, thalamus_data: dict, input_data: str):
+        """Return ``(rules_result, escalate)``; ``rules_result`` is None when tiering is off."""
+        if not self.enabled:
+            ACC_TIERS.inc(tier="model")
+            return None, True
+        confidence = rule_confidence(thalamus_data, input_data)
+        ACC_RULE_CONFIDENCE.observe(confidence)
+        escalate = confidence < self.escalation_threshold
+        ACC_TIERS.inc(tier="model" if escalate else "rules")
+        return evaluate_rules(thalamus_data, input_data), escalate
+
+
+def record_agreement(rules_result: dict, model_result: dict):
+    """Compare the model's answer for an escalated evaluation with the rule scorer's."""
+    pass_doubt = model_result.get("pass_doubt")
+    if isinstance(pass_doubt, str):
+        pass_doubt = pass_doubt.strip().lower() == "true"
+    agree = bool(pass_doubt) == rules_result["pass_doubt"]
+    ACC_TIER_AGREEMENT.inc(outcome="agree" if agree else "disagree")
@@ -0,0 +1,233 @@
+# backends.py
+
+import functools
+import inspect
+import logging
+import os
+import threading
+
+import torch
+from torch import nn
+from transformers import AutoModelForCausalLM, VisionEncoderDecoderModel
+from transformers.pytorch_utils import Conv1D
+
+logger = logging.getLogger(__name__)
+
+# Inference backends for the thalamus and captioning models:
+#   eager   - the PyTorch fp32 model as loaded by from_pretrained
+#   int8    - dynamic int8 quantization of the Linear layers (CPU)
+#   compile - torch.compile'd forward passes
+#   onnx    - an exported ONNX Runtime graph (needs the optional optimum[onnxruntime])
+BACKENDS = ("eager", "int8", "compile", "onnx")
+
+# Backends whose past_key_values are a DynamicCache that can be copied and reused,
+# which prompt-prefix caching and single-pass candidate scoring rely on.
+KV_CACHE_BACKENDS = ("eager", "int8", "compile")
+
+# Weight dtypes selectable with chat.dtype / sight.dtype. bfloat16 halves weight memory
+# and has fast CPU kernels on recent x86 (AVX512-BF16/AMX); float16 is mainly for CUDA.
+DTYPES = {"float32": torch.float32, "bfloat16": torch.bfloat16, "float16": torch.float16}
+
+# Backends that can serve LoRA adapters (needs the optional peft): peft wraps the
+# model's own layers, which quantized, compiled or exported models no longer expose.
+ADAPTER_BACKENDS = ("eager",)
+# Adapter name peft uses for rows of a mixed batch that run on the base model alone.
+BASE_ADAPTER = "__base__"
+
+# Models loaded while sharing is on, keyed by their load arguments (see share_loaded_models).
+_shared_models = None
+
+# from_pretrained builds models on the meta device through process-wide state, so two
+# engines loading on parallel threads can break each other; only that step is serialized.
+# ONNX Runtime loads hold it too: they go through the same transformers loading code
+# (configs, and a PyTorch model when exporting).
+_FROM_PRETRAINED_LOCK = threading.Lock()
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def torch_dtype(dtype):
+    """The torch dtype for a dtype setting (None keeps the checkpoint's own)."""
+    if dtype is None:
+        return None
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype: {dtype} (expected one of {', '.join(DTYPES)})")
+    return DTYPES[dtype]
+
+
+def _check_dtype(backend, dtype):
+    if backend == "int8" and torch_dtype(dtype) not in (None, torch.float32):
+        raise ValueError("The int8 backend quantizes float32 weights; leave dtype unset or float32")
+    if backend == "onnx" and dtype is not None:
+        logger.warning(f"dtype {dtype} is ignored by the onnx backend; export the model in that precision instead")
+
+
+def share_loaded_models():
+    """Keep every model loaded from now on, so a later load with the same arguments reuses it.
+
+    serve.py turns this on and preloads the models before forking its workers: each
+    worker's engines then get the parent's model objects, whose weights stay shared
+    copy-on-write between the processes instead of being loaded once per worker.
+    """
+    global _shared_models
+    if _shared_models is None:
+        _shared_models = {}
+
+
+def _shareable(loader):
+    signature = inspect.signature(loader)
+
+    @functools.wraps(loader)
+    def wrapper(*args, **kwargs):
+        if _shared_models is None:
+            return loader(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        # Dicts (e.g. adapters) are not hashable, so they are keyed on their sorted items.
+        key = (loader.__name__, tuple(
+            (name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+            for name, value in bound.arguments.items()
+        ))
+        if key not in _shared_models:
+            _shared_models[key] = loader(*args, **kwargs)
+        return _shared_models[key]
+    return wrapper
+
+
+def _import_optimum():
+    try:
+        from optimum import onnxruntime
+    except ImportError as e:
+        raise RuntimeError("The onnx backend needs optimum[onnxruntime]: pip install 'optimum[onnxruntime]'") from e
+    return onnxruntime
+
+
+def _import_peft():
+    try:
+        import peft
+    except ImportError as e:
+        raise RuntimeError("Serving adapters needs peft: pip install peft") from e
+    return peft
+
+
+def attach_adapters(model, adapters):
+    """Wrap a causal LM in a peft model holding every adapter of ``adapters`` (name -> directory).
+
+    All adapters share the base model's weights; which one applies is chosen per batch
+    row with ``adapter_names`` (BASE_ADAPTER for none), so rows for different adapters
+    can share one forward pass.
+    """
+    peft = _import_peft()
+    (first_name, first_dir), *others = sorted(adapters.items())
+    model = peft.PeftModel.from_pretrained(model, first_dir, adapter_name=first_name)
+    for name, adapter_dir in others:
+        model.load_adapter(adapter_dir, adapter_name=name)
+    return model
+
+
+def conv1d_to_linear(model):
+    """Replace GPT-2 style Conv1D layers with equivalent nn.Linear layers, in place."""
+    for name, module in list(model.named_modules()):
+        for child_name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = nn.Linear(in_features, out_features)
+                # Conv1D computes x @ W + b with W stored as (in, out).
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(module, child_name, linear)
+    return model
+
+
+def quantize_int8(model):
+    """Dynamically quantize every Linear layer except the output projection to int8."""
+    conv1d_to_linear(model)
+    output_embeddings = model.get_output_embeddings()
+    qconfig_spec = {
+        name: torch.ao.quantization.default_dynamic_qconfig
+        for name, module in model.named_modules()
+        if isinstance(module, nn.Linear) and module is not output_embeddings
+    }
+    # The tied output projection stays fp32 so routing log-likelihoods stay close to the baseline.
+    return torch.ao.quantization.quantize_dynamic(model, qconfig_spec, dtype=torch.qint8)
+
+
+def compile_forward(module):
+    # Shapes change every decoding step, so compile for dynamic shapes up front.
+    module.forward = torch.compile(module.forward, dynamic=True)
+    return module
+
+
+@_shareable
+def load_causal_lm(model_dir, backend="eager", device="cpu", onnx_dir=None, dtype=None, adapters=None):
+    """Load the thalamus model on the given backend; returns the model ready for inference.
+
+    ``adapters`` maps adapter names to LoRA adapter directories loaded on top of the model.
+    """
+    _check_backend(backend)
+    _check_dtype(backend, dtype)
+    if adapters and backend not in ADAPTER_BACKENDS:
+        raise ValueError(f"Adapters are not supported by the {backend} backend (use {', '.join(ADAPTER_BACKENDS)})")
+    if backend == "onnx":
+        onnxruntime = _import_optimum()
+        if onnx_dir and os.path.isdir(onnx_dir):
+            with _FROM_PRETRAINED_LOCK:
+                return onnxruntime.ORTModelForCausalLM.from_pretrained(onnx_dir)
+        logger.warning(f"No exported ONNX model at {onnx_dir}; exporting {model_dir} at load time")
+        with _FROM_PRETRAINED_LOCK:
+            return onnxruntime.ORTModelForCausalLM.from_pretrained(model_dir, export=True)
+
+    with _FROM_PRETRAINED_LOCK:
+        # Weights are materialized once, straight in the target dtype (no fp32 copy first).
+        model = AutoModelForCausalLM.from_pretrained(model_dir, dtype=torch_dtype(dtype), low_cpu_mem_usage=True)
+    if adapters:
+        model = attach_adapters(model, adapters)
+    model.to(device)
+    model.eval()
+    if backend == "int8":
+        if device != "cpu":
+            raise ValueError("The int8 backend only runs on CPU")
+        model = quantize_int8(model)
+    elif backend == "compile":
+        compile_forward(model)
+    return model
+
+
+@_shareable
+def load_vision_encoder_decoder(model_name, backend="eager", device="cpu", onnx_dir=None, dtype=None):
+    """Load the captioning model on the given backend."""
+    _check_backend(backend)
+    _check_dtype(backend, dtype)
+    if backend == "onnx":
+        onnxruntime = _import_optimum()
+        if onnx_dir and os.path.isdir(onnx_dir):
+            with _FROM_PRETRAINED_LOCK:
+                return onnxruntime.ORTModelForVision2Seq.from_pretrained(onnx_dir)
+        logger.warning(f"No exported ONNX model at {onnx_dir}; exporting {model_name} at load time")
+        with _FROM_PRETRAINED_LOCK:
+            return onnxruntime.ORTModelForVision2Seq.from_pretrained(model_name, export=True)
+
+    with _FROM_PRETRAINED_LOCK:
+        model = VisionEncoderDecoderModel.from_pretrained(model_name, dtype=torch_dtype(dtype), low_cpu_mem_usage=True)
+    model.to(device)
+    model.eval()
+    if backend == "int8":
+        if device != "cpu":
+            raise ValueError("The int8 backend only runs on CPU")
+        model = quantize_int8(model)
+    elif backend == "compile":
+        compile_forward(model.encoder)
+        compile_forward(model.decoder)
+    return model
+
+
+def export_onnx(model_name, output_dir, kind="causal_lm"):
+    """Export a model (kind "causal_lm" or "vision2seq") to ONNX; tokenizers still load from the original."""
+    onnxruntime = _import_optimum()
+    model_class = onnxruntime.ORTModelForCausalLM if kind == "causal_lm" else onnxruntime.ORTModelForVision2Seq
+    model = model_class.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    return output_dir
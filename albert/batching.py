@@ -0,0 +1,117 @@
+# batching.py
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+BATCHER_QUEUE_DEPTH = gauge("albert_batcher_queue_depth", "Requests waiting to be collected into a batch", ["batcher"])
+BATCH_SIZE = histogram(
+    "albert_batch_size", "Items per handler call of each micro-batcher", ["batcher"], buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+
+class _PendingRequest:
+    def __init__(self, item, key, deadline):
+        self.item = item
+        self.key = key
+        self.deadline = deadline
+        self.future = Future()
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches and runs them on a single worker thread.
+
+    The handler is called as ``handler(key, items)`` and must return one result per item,
+    in order. Requests are only batched with others that share the same key.
+
+    Requests are collected first come, first served: each batch takes the oldest queued
+    requests (up to max_batch_size), and its keys run in the order they first appear.
+    Priority classes and client deadlines are applied earlier, when a call waits for a
+    pool worker (see inference_pool.py). They do not reorder requests already waiting here.
+    """
+
+    def __init__(self, handler, max_batch_size=8, max_wait_ms=10, request_timeout=None, name="batcher"):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.request_timeout = request_timeout
+        self.name = name
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        BATCHER_QUEUE_DEPTH.set_function(self._queue.qsize, batcher=name)
+
+    def submit(self, item, key=None, timeout=None):
+        """Queue an item and return a Future that resolves to its result."""
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        timeout = self.request_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        request = _PendingRequest(item, key, deadline)
+        self._queue.put(request)
+        return request.future
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        # Block for the first request, then keep the window open for max_wait.
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        window_end = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Drop requests that were cancelled or timed out while queued.
+            now = time.monotonic()
+            groups = {}
+            for request in batch:
+                # Claim the future first: a cancelled one must not be completed (InvalidStateError).
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                if request.deadline is not None and now > request.deadline:
+                    request.future.set_exception(TimeoutError(f"{self.name}: request timed out in queue"))
+                    continue
+                groups.setdefault(request.key, []).append(request)
+
+            for key, requests in groups.items():
+                BATCH_SIZE.observe(len(requests), batcher=self.name)
+                try:
+                    results = self.handler(key, [request.item for request in requests])
+                    if len(results) != len(requests):
+                        raise RuntimeError(f"{self.name}: handler returned {len(results)} results for {len(requests)} items")
+                except Exception as e:
+                    logger.error(f"{self.name}: batch of {len(requests)} failed: {e}")
+                    for request in requests:
+                        request.future.set_exception(e)
+                    continue
+                for request, result in zip(requests, results):
+                    request.future.set_result(result)
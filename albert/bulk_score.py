@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Re-route a JSONL log of sensor events through thalamus and ACC offline.
+
+    python bulk_score.py --input events.jsonl --output-dir scored/ --workers 4
+
+Each input line is a sensor event ({"sensor", "input_type", "input_data", ...}).
+The input is read lazily in chunks of --chunk-size lines. Worker processes score
+each chunk with batched in-process inference (the same pipeline as POST /pipeline)
+and write it to its own part-NNNNNN.jsonl shard. Finished chunks are recorded in
+_checkpoint.json, so rerunning the same command after an interruption only scores
+the chunks that are still missing. Model settings default to config/settings.yaml.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from settings import load_settings  # noqa: E402
+from prompt_store import PromptStore  # noqa: E402
+from chat_engine import ROUTING_MODES, model_version, reply_version  # noqa: E402
+
+PROMPTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts", "prompts.yaml")
+CHECKPOINT_NAME = "_checkpoint.json"
+
+logger = logging.getLogger("bulk_score")
+
+# Per-process engine and options, set up once by _init_worker.
+_worker = {}
+
+
+def iter_chunks(path, chunk_size):
+    """Yield ``(index, start, end, first_line)`` byte ranges of ``chunk_size`` lines each."""
+    with open(path, "rb") as f:
+        index, start, line_number, count = 0, 0, 0, 0
+        while f.readline():
+            count += 1
+            if count == chunk_size:
+                end = f.tell()
+                yield index, start, end, line_number
+                index, start, line_number, count = index + 1, end, line_number + count, 0
+        if count:
+            yield index, start, f.tell(), line_number
+
+
+def shard_path(output_dir, index):
+    return os.path.join(output_dir, f"part-{index:06d}.jsonl")
+
+
+def _write_atomically(path, text):
+    # Readers (and a resumed run) only ever see complete files.
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def _init_worker(options):
+    logging.basicConfig(level=logging.WARNING)
+    import torch
+    from chat_engine import ChatEngine
+    from acc_tiers import TieredACC
+
+    if options["threads"]:
+        torch.set_num_threads(options["threads"])
+    chat = options["chat"]
+    engine = ChatEngine(
+        model_dir=chat.get("model_dir"),
+        max_batch_size=options["batch_size"],
+        max_wait_ms=0,
+        # A chunk is queued all at once, so queued prompts must not time out.
+        request_timeout=None,
+        prefix_cache=chat.get("prefix_cache", True),
+        decoding=chat.get("decoding", "structured"),
+        routing_mode=options["mode"],
+        score_temperature=chat.get("score_temperature", 1.0),
+        deterministic=chat.get("deterministic", False),
+        backend=chat.get("backend", "eager"),
+        onnx_dir=chat.get("onnx_dir"),
+        dtype=chat.get("dtype"),
+        adapters=chat.get("adapters"),
+    )
+    for engine_name, prefix in PromptStore(PROMPTS_PATH).prefixes().items():
+        engine.set_prompt_prefix(engine_name, prefix)
+    acc = options["acc"]
+    acc_tiers = TieredACC(enabled=acc.get("tiered", True), escalation_threshold=acc.get("escalation_threshold", 0.7))
+    _worker.update(engine=engine, acc_tiers=acc_tiers, options=options)
+
+
+def _parse_event(raw, field):
+    event = json.loads(raw)
+    if field:
+        event = event[field]
+        # Training-data style rows hold the event as a JSON string.
+        if isinstance(event, str):
+            event = json.loads(event)
+    if not isinstance(event, dict):
+        raise ValueError("expected a JSON object")
+    return event
+
+
+def score_chunk(chunk):
+    """Score one chunk of the input and write its shard; returns ``(index, rows, errors, bytes)``."""
+    from pipeline import run_pipeline
+
+    index, start, end, first_line = chunk
+    options = _worker["options"]
+    with open(options["input"], "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).splitlines()
+
+    rows, events, positions = [], [], []
+    for offset, raw in enumerate(lines):
+        if not raw.strip():
+            continue
+        row = {"line": first_line + offset + 1}
+        try:
+            row["event"] = _parse_event(raw, options["field"])
+        except (ValueError, KeyError, TypeError) as e:
+            row["error"] = f"Invalid input line: {e}"
+        else:
+            events.append(row["event"])
+            positions.append(len(rows))
+        rows.append(row)
+
+    results = run_pipeline(_worker["engine"], events, mode=options["mode"], acc_tiers=_worker["acc_tiers"])
+    for position, result in zip(positions, results):
+        rows[position].update(result)
+    _write_atomically(shard_path(options["output_dir"], index), "".join(json.dumps(row) + "\n" for row in rows))
+    return index, len(rows), sum("error" in row for row in rows), end - start
+
+
+def load_checkpoint(path, run_config, restart):
+    """Return the checkpoint state to resume from (empty for a fresh run)."""
+    state = {"config": run_config, "chunks": {}}
+    if restart or not os.path.exists(path):
+        return state
+    with open(path, "r") as f:
+        saved = json.load(f)
+    if saved["config"] != run_config:
+        changed = sorted(key for key in run_config if saved["config"].get(key) != run_config[key])
+        raise SystemExit(
+            f"{path} belongs to a run with different {', '.join(changed)}; pass --restart or use another --output-dir"
+        )
+    return saved
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run(args):
+    settings = load_settings(args.settings)
+    chat = dict(settings.get("chat", {}))
+    for key in ("model_dir", "backend"):
+        if getattr(args, key):
+            chat[key] = getattr(args, key)
+    if args.deterministic:
+        chat["deterministic"] = True
+    mode = args.mode or chat.get("routing_mode", "generate")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    input_path = os.path.abspath(args.input)
+    total_bytes = os.path.getsize(input_path)
+    # Anything that changes the chunking or the replies must match to resume. The reply
+    # versions are the ones the engine uses for its routing cache: model weights, backend,
+    # dtype, adapters, mode and decoding.
+    weights = model_version(
+        chat.get("model_dir"), chat.get("backend", "eager"), chat.get("dtype"), chat.get("adapters")
+    )
+    reply_options = dict(
+        decoding=chat.get("decoding", "structured"),
+        score_temperature=chat.get("score_temperature", 1.0),
+        deterministic=chat.get("deterministic", False),
+    )
+    run_config = {
+        "input": input_path,
+        "input_bytes": total_bytes,
+        "chunk_size": args.chunk_size,
+        "field": args.field,
+        "thalamus_version": reply_version(weights, "thalamus", mode, **reply_options),
+        "acc_version": reply_version(weights, "acc", "generate", **reply_options),
+        "prompts_version": PromptStore(PROMPTS_PATH).version,
+        "acc": settings.get("acc", {}),
+    }
+    checkpoint_path = os.path.join(args.output_dir, CHECKPOINT_NAME)
+    state = load_checkpoint(checkpoint_path, run_config, args.restart)
+    # chunk index -> [rows, errors, bytes]; chunks whose shard has since been deleted are rescored.
+    chunks_done = {
+        int(index): stats for index, stats in state["chunks"].items()
+        if os.path.exists(shard_path(args.output_dir, int(index)))
+    }
+    if chunks_done:
+        logger.warning(f"Resuming: {len(chunks_done)} chunks already scored")
+
+    workers = args.workers
+    options = {
+        "input": input_path,
+        "output_dir": args.output_dir,
+        "field": args.field,
+        "mode": mode,
+        "batch_size": args.batch_size,
+        "chat": chat,
+        "acc": settings.get("acc", {}),
+        "threads": args.threads or (max(1, (os.cpu_count() or 1) // workers) if workers else None),
+    }
+    chunks = (chunk for chunk in iter_chunks(input_path, args.chunk_size) if chunk[0] not in chunks_done)
+
+    start = time.perf_counter()
+    session_rows = session_bytes = 0
+    pool = None
+    if workers:
+        # spawn: forking a process that has already imported torch can deadlock its thread pools.
+        pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(options,))
+        results = pool.imap_unordered(score_chunk, chunks)
+    else:
+        _init_worker(options)
+        results = map(score_chunk, chunks)
+    try:
+        for index, rows, errors, chunk_bytes in results:
+            chunks_done[index] = [rows, errors, chunk_bytes]
+            state["chunks"] = {str(index): stats for index, stats in sorted(chunks_done.items())}
+            _write_atomically(checkpoint_path, json.dumps(state))
+
+            session_rows += rows
+            session_bytes += chunk_bytes
+            total_rows, total_errors, bytes_done = (sum(column) for column in zip(*chunks_done.values()))
+            elapsed = time.perf_counter() - start
+            rate = session_rows / elapsed if elapsed else 0.0
+            eta = (total_bytes - bytes_done) / (session_bytes / elapsed) if session_bytes else 0.0
+            print(
+                f"chunk {index}: {total_rows} rows scored ({total_errors} errors), "
+                f"{100 * bytes_done / max(total_bytes, 1):.1f}% of input, "
+                f"{rate:.1f} rows/s, ETA {format_duration(eta)}",
+                file=sys.stderr,
+                flush=True,
+            )
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    total_rows = sum(rows for rows, _, _ in chunks_done.values())
+    total_errors = sum(errors for _, errors, _ in chunks_done.values())
+    print(
+        f"Done: {total_rows} rows in {len(chunks_done)} shards under {args.output_dir} "
+        f"({session_rows} this run in {format_duration(elapsed)}, {total_errors} errors)",
+        file=sys.stderr,
+    )
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a JSONL sensor log with thalamus and ACC offline")
+    parser.add_argument("--input", required=True, help="JSONL file with one sensor event per line")
+    parser.add_argument("--output-dir", required=True, help="Directory for the part-*.jsonl shards and checkpoint")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (0 scores in this process)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker (default: cores / workers)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Input lines per chunk and output shard")
+    parser.add_argument("--batch-size", type=int, default=32, help="Prompts per model.generate call")
+    parser.add_argument("--field", default=None,
+                        help="Read the event from this field of each line (a JSON string or object)")
+    parser.add_argument("--mode", choices=ROUTING_MODES, default=None, help="Thalamus routing mode (default: settings)")
+    parser.add_argument("--model-dir", default=None, help="Thalamus model directory (default: settings)")
+    parser.add_argument("--backend", default=None, help="Inference backend (default: settings)")
+    parser.add_argument("--deterministic", action="store_true", help="Greedy decoding for reproducible replies")
+    parser.add_argument("--settings", default=None, help="Settings file (default: config/settings.yaml)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and score everything")
+    args = parser.parse_args()
+    if args.chunk_size < 1 or args.batch_size < 1 or args.workers < 0:
+        parser.error("--chunk-size and --batch-size must be positive and --workers non-negative")
+
+    logging.basicConfig(level=logging.WARNING)
+    run(args)
@@ -0,0 +1,162 @@
+# cache.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import counter, gauge
+
+CACHE_LOOKUPS = counter(
+    "albert_cache_lookups_total", "Cache lookups by result (hit, disk_hit, coalesced, miss)", ["cache", "result"]
+)
+CACHE_EVICTIONS = counter("albert_cache_evictions_total", "Cache evictions by reason (lru, ttl)", ["cache", "reason"])
+CACHE_ENTRIES = gauge("albert_cache_entries", "Entries held in the in-memory cache tier", ["cache"])
+
+_MISSING = object()
+
+
+class SqliteStore:
+    """Optional on-disk tier: JSON values keyed by string, with an expiry timestamp."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return _MISSING, None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return _MISSING, None
+        return json.loads(value), expires
+
+    def put(self, key, value, expires):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """Bounded LRU cache with TTL expiry and coalescing of concurrent identical lookups.
+
+    Keys are strings and values must be JSON-serializable if ``disk_path`` is set,
+    in which case entries are also written through to SQLite and survive restarts.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl_seconds=None, disk_path=None):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires)
+        self._inflight = {}
+        self.disk = SqliteStore(disk_path) if disk_path else None
+        CACHE_ENTRIES.set_function(lambda: len(self._entries), cache=name)
+
+    def _expiry(self):
+        return time.time() + self.ttl if self.ttl else None
+
+    def _get_memory(self, key):
+        # Caller holds the lock.
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires = entry
+        if expires is not None and expires < time.time():
+            del self._entries[key]
+            CACHE_EVICTIONS.inc(cache=self.name, reason="ttl")
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key, value, expires):
+        # Caller holds the lock.
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.inc(cache=self.name, reason="lru")
+
+    def peek(self, key, default=None):
+        """Memory-only lookup that never blocks on disk or in-flight work."""
+        with self._lock:
+            value = self._get_memory(key)
+        if value is _MISSING:
+            return default
+        CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+        return value
+
+    def put(self, key, value):
+        expires = self._expiry()
+        with self._lock:
+            self._put_memory(key, value, expires)
+        if self.disk is not None:
+            self.disk.put(key, value, expires)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, computing it once if missing.
+
+        Concurrent callers with the same key share a single ``compute()`` call.
+        """
+        with self._lock:
+            value = self._get_memory(key)
+            if value is not _MISSING:
+                CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return value
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            CACHE_LOOKUPS.inc(cache=self.name, result="coalesced")
+            return pending.result()
+
+        try:
+            value = _MISSING
+            if self.disk is not None:
+                value, expires = self.disk.get(key)
+                if value is not _MISSING:
+                    CACHE_LOOKUPS.inc(cache=self.name, result="disk_hit")
+                    with self._lock:
+                        self._put_memory(key, value, expires)
+            if value is _MISSING:
+                CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                value = compute()
+                self.put(key, value)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+        pending.set_result(value)
+        return value
@@ -0,0 +1,143 @@
+# caption_cache.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from cache import TTLCache, CACHE_LOOKUPS, CACHE_EVICTIONS, CACHE_ENTRIES
+from metrics import counter
+
+CAPTION_SOURCES = counter(
+    "albert_sight_captions_total", "Sight captions by source (exact, near, model)", ["source"]
+)
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 grayscale thumbnail is brighter than its right neighbour."""
+    pixels = image.convert("L").resize((9, 8), Image.BILINEAR).tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+class PerceptualIndex:
+    """LRU map from 64-bit perceptual hashes to values with Hamming-distance lookup.
+
+    Hashes are split into ``max_distance + 1`` bands; two hashes within
+    ``max_distance`` bits must agree exactly on at least one band, so only
+    entries sharing a band are compared.
+    """
+
+    def __init__(self, name, max_entries=4096, max_distance=4):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = 64 // bands
+        self._bands = [
+            (band * width, (1 << (64 - band * width if band == bands - 1 else width)) - 1) for band in range(bands)
+        ]
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # hash -> value
+        self._buckets = [{} for _ in self._bands]  # band value -> set of hashes
+        CACHE_ENTRIES.set_function(lambda: len(self._entries), cache=name)
+
+    def _band_values(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._bands]
+
+    def get(self, phash, default=None):
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            for bucket, band in zip(self._buckets, self._band_values(phash)):
+                for candidate in bucket.get(band, ()):
+                    distance = (candidate ^ phash).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = candidate, distance
+            if best is None:
+                CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+                return default
+            self._entries.move_to_end(best)
+            value = self._entries[best]
+        CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+        return value
+
+    def put(self, phash, value):
+        with self._lock:
+            if phash not in self._entries:
+                for bucket, band in zip(self._buckets, self._band_values(phash)):
+                    bucket.setdefault(band, set()).add(phash)
+            self._entries[phash] = value
+            self._entries.move_to_end(phash)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                for bucket, band in zip(self._buckets, self._band_values(evicted)):
+                    bucket[band].discard(evicted)
+                    if not bucket[band]:
+                        del bucket[band]
+                CACHE_EVICTIONS.inc(cache=self.name, reason="lru")
+
+
+class CaptionCache:
+    """Caption cache keyed on the exact upload bytes and, for near-identical frames, a perceptual hash.
+
+    The exact tier is a TTLCache (optionally persisted to SQLite) keyed on the
+    SHA-256 of the upload, so a hit skips decoding too. The perceptual tier is
+    memory only. ``version`` must change whenever captions would (model or decoding).
+    """
+
+    def __init__(self, version, max_entries=4096, ttl_seconds=None, disk_path=None, max_distance=4):
+        self.version = version
+        self.exact = TTLCache("caption", max_entries=max_entries, ttl_seconds=ttl_seconds, disk_path=disk_path)
+        # A negative max_distance turns near-duplicate lookup off.
+        self.near = PerceptualIndex("caption_phash", max_entries, max_distance) if max_distance >= 0 else None
+
+    def key(self, contents: bytes) -> str:
+        return f"{self.version}:{hashlib.sha256(contents).hexdigest()}"
+
+    def get_exact(self, key):
+        caption = self.exact.peek(key)
+        if caption is not None:
+            CAPTION_SOURCES.inc(source="exact")
+        return caption
+
+    def get_near(self, image: Image.Image):
+        """Return ``(phash, caption)``; caption is None when no stored frame is close enough."""
+        if self.near is None:
+            return None, None
+        phash = dhash(image)
+        caption = self.near.get(phash)
+        if caption is not None:
+            CAPTION_SOURCES.inc(source="near")
+        return phash, caption
+
+    def put(self, key, phash, caption):
+        self.exact.put(key, caption)
+        if phash is not None:
+            self.near.put(phash, caption)
+
+    def get_or_caption(self, contents: bytes, decode, generate) -> str:
+        """Caption an upload, reusing a cached caption for the same or a near-identical frame.
+
+        ``decode(contents)`` returns the image and ``generate(image)`` runs the model;
+        concurrent requests for the same bytes share one decode and generation.
+        """
+        key = self.key(contents)
+        caption = self.get_exact(key)
+        if caption is not None:
+            return caption
+
+        def compute():
+            image = decode(contents)
+            phash, caption = self.get_near(image)
+            if caption is None:
+                CAPTION_SOURCES.inc(source="model")
+                caption = generate(image)
+                if phash is not None:
+                    self.near.put(phash, caption)
+            return caption
+
+        return self.exact.get_or_compute(key, compute)
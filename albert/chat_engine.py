@@ -1,26 +1,266 @@
 # chat_engine.py
 
 import os
+import json
+import logging
+import math
+import time
+from concurrent.futures import Future
 from thalamus.thalamus import Thalamus
+from batching import MicroBatcher
+from constrained import RowTemplates, thalamus_template, acc_template
+from metrics import counter, histogram
+from instrumentation import (
+    GENERATED_TOKENS, PROMPT_TOKENS, DECODE_TOKENS_PER_SECOND, MODEL_MEMORY_BYTES, STAGE_SECONDS,
+    model_memory_bytes, observe_stages,
+)
+from regions import ROUTING_LABELS
+
+logger = logging.getLogger(__name__)
 
 # Compute the absolute model path.
 current_dir = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(current_dir, "thalamus", "model", "thalamus_finetuned")
 
+# Engines served by the Thalamus model.
+MODEL_ENGINES = ("thalamus", "acc")
+
+# Thalamus routing either generates its answer or scores every known label.
+ROUTING_MODES = ("generate", "score")
+
+# Batch key shared by the engines served by adapters: their prompts are generated together,
+# each row with its own adapter.
+ADAPTER_BATCH = "adapters"
+
+TOKENS_SAVED = counter(
+    "albert_structured_tokens_saved_total",
+    "Unused generation budget thanks to structured decoding stopping at the closing brace",
+    ["engine"],
+)
+TIME_TO_FIRST_TOKEN = histogram(
+    "albert_time_to_first_token_seconds", "Time from queueing a streamed request to its first token", ["engine"]
+)
+INTER_TOKEN_SECONDS = histogram(
+    "albert_inter_token_seconds",
+    "Time between consecutive tokens of a streamed reply",
+    ["engine"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+def _files_version(model_dir):
+    # Retraining rewrites the weights, so their newest mtime tells model revisions apart.
+    if not os.path.isdir(model_dir):
+        return model_dir
+    mtimes = [os.stat(os.path.join(model_dir, name)).st_mtime_ns for name in os.listdir(model_dir)]
+    return f"{os.path.realpath(model_dir)}@{max(mtimes, default=0)}"
+
+def model_version(model_dir=None, backend="eager", dtype=None, adapters=None):
+    """Identifies the weights a ChatEngine with these settings answers from, without loading them."""
+    # Quantized, exported or reduced-precision models may answer differently, so both are part of the version.
+    version = f"{_files_version(model_dir or model_path)}|{backend}" + (f"|{dtype}" if dtype else "")
+    for engine, adapter_dir in sorted((adapters or {}).items()):
+        version += f"|{engine}={_files_version(adapter_dir)}"
+    return version
+
+def reply_version(model_version, engine, mode, decoding="structured", score_temperature=1.0, deterministic=False):
+    """Identifies everything besides the prompt that shapes a reply (see ChatEngine.reply_version)."""
+    if mode == "score":
+        detail = f"t={score_temperature}"
+    else:
+        detail = decoding if deterministic else f"{decoding}|sampled"
+    return f"{model_version}|{engine}|{mode}|{detail}"
+
 class ChatEngine:
-    def __init__(self):
+    def __init__(self, model_dir=None, max_batch_size=8, max_wait_ms=10, request_timeout=30.0,
+                 prefix_cache=True, decoding="structured", routing_mode="generate", score_temperature=1.0,
+                 deterministic=False, backend="eager", onnx_dir=None, dtype=None, adapters=None):
         # Instantiate the Thalamus engine once with the correct model path.
-        self.thalamus = Thalamus(model_dir=model_path)
+        self.model_dir = model_dir or model_path
+        # Engine name -> LoRA adapter directory; those engines run on their adapter
+        # instead of being steered by an instruction prompt.
+        self.adapters = dict(adapters or {})
+        unknown = set(self.adapters) - set(MODEL_ENGINES)
+        if unknown:
+            raise ValueError(f"Adapters for unknown engines: {', '.join(sorted(unknown))}")
+        self.thalamus = Thalamus(
+            model_dir=self.model_dir, do_sample=not deterministic, backend=backend, onnx_dir=onnx_dir, dtype=dtype,
+            adapters=self.adapters,
+        )
+        self.model_version = model_version(self.model_dir, backend, dtype, self.adapters)
+        MODEL_MEMORY_BYTES.set(model_memory_bytes(self.thalamus.model), engine="thalamus")
+        self.deterministic = deterministic
+        self.request_timeout = request_timeout
+        # Static system-prompt prefix per engine; prompts for that engine are just the tail.
+        self.prefixes = {}
+        if prefix_cache and not self.thalamus.supports_kv_cache:
+            logger.warning(f"Prefix caching is not supported by the {backend} backend; sending full prompts")
+            prefix_cache = False
+        self.prefix_cache = prefix_cache
+        # "structured" restricts thalamus/ACC output to their JSON shapes; "sample" is free sampling.
+        self.decoding = decoding
+        self.constraints = {}
+        if decoding == "structured":
+            tokenizer = self.thalamus.tokenizer
+            self.constraints = {"thalamus": thalamus_template(tokenizer), "acc": acc_template(tokenizer)}
+        # Score mode ranks every region/schema continuation in one forward pass;
+        # score_temperature calibrates the resulting confidence.
+        if routing_mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode: {routing_mode}")
+        self.routing_mode = routing_mode
+        self.score_temperature = score_temperature
+        self.routing_labels = list(ROUTING_LABELS)
+        self.routing_candidates = [
+            " " + json.dumps({"region": region, "schema": schema}) for region, schema in self.routing_labels
+        ]
+        # Concurrent thalamus/ACC prompts share one batched generate() call.
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            request_timeout=request_timeout,
+            name="chat-batcher",
+        )
         # You can also set up other engines or defaults here.
-    
-    def generate_reply(self, prompt, engine="default"):
-        if engine == "thalamus":
-            # Call our Thalamus generate_text method.
-            return self.thalamus.generate_text(prompt)
-        elif engine == "acc":
-            # Use the same model but with ACC prompting
-            return self.thalamus.generate_text(prompt)
-        else:
-            # Fallback to default implementation or error handling.
-            return "Default engine response not configured."
 
+    def is_deterministic(self, engine="thalamus", mode=None):
+        """Whether the same prompt always produces the same reply (so it can be cached)."""
+        mode = mode or (self.routing_mode if engine == "thalamus" else "generate")
+        return mode == "score" or self.deterministic
+
+    def reply_version(self, engine="thalamus", mode=None):
+        """Identifies everything besides the prompt that shapes a reply."""
+        mode = mode or (self.routing_mode if engine == "thalamus" else "generate")
+        return reply_version(
+            self.model_version, engine, mode, self.decoding, self.score_temperature, self.deterministic
+        )
+
+    def set_prompt_prefix(self, engine, text):
+        """Register the static prompt prefix for an engine and precompute its KV cache."""
+        if engine in self.adapters:
+            # Adapters are trained on the bare input (see trainer.py --lora), so their prompts need no prefix.
+            return
+        if self.prefix_cache:
+            self.thalamus.cache_prefix(engine, text)
+        self.prefixes[engine] = text
+
+    def _routing_result(self, log_likelihoods):
+        # Temperature-scaled softmax over the candidates' total log-likelihoods.
+        scaled = [value / self.score_temperature for value in log_likelihoods]
+        peak = max(scaled)
+        weights = [math.exp(value - peak) for value in scaled]
+        total = sum(weights)
+        distribution = sorted(
+            (
+                {"region": region, "schema": schema, "probability": round(weight / total, 4)}
+                for (region, schema), weight in zip(self.routing_labels, weights)
+            ),
+            key=lambda entry: entry["probability"],
+            reverse=True,
+        )
+        best = distribution[0]
+        return {
+            "region": best["region"],
+            "schema": best["schema"],
+            "confidence": best["probability"],
+            "distribution": distribution,
+        }
+
+    def score_routing(self, prompt, prefix=None, adapter=None):
+        """Score every region/schema pair for a thalamus prompt and return the distribution."""
+        log_likelihoods = self.thalamus.score_candidates(prompt, self.routing_candidates, prefix=prefix, adapter=adapter)
+        return self._routing_result(log_likelihoods)
+
+    def _generate_batch(self, key, items):
+        # Batches are keyed by (engine, mode), so every prompt here shares the same prefix.
+        # Engines served by adapters share the ADAPTER_BATCH key instead: they have no
+        # prefix, and each row runs on its own engine's adapter and template.
+        engine, mode = key
+        prompts = [prompt for prompt, _, _ in items]
+        token_callbacks = [on_token for _, on_token, _ in items]
+        engines = [row_engine for _, _, row_engine in items]
+        if engine == ADAPTER_BATCH:
+            return self._generate_adapter_batch(prompts, token_callbacks, engines)
+        prefix = self.prefixes.get(engine)
+        constraint = self.constraints.get(engine)
+        adapter = engine if engine in self.adapters else None
+        prefix_name = None
+        if prefix is not None:
+            if self.prefix_cache:
+                prefix_name = engine
+            else:
+                prompts = [prefix + prompt for prompt in prompts]
+        if mode == "score":
+            replies = []
+            for prompt in prompts:
+                start = time.perf_counter()
+                replies.append(json.dumps(self.score_routing(prompt, prefix=prefix_name, adapter=adapter)))
+                STAGE_SECONDS.observe(time.perf_counter() - start, engine=engine, stage="score")
+            return replies
+
+        return self._generate(prompts, token_callbacks, engines, prefix_name, constraint, [adapter] * len(prompts))
+
+    def _generate_adapter_batch(self, prompts, token_callbacks, engines):
+        constraint = None
+        if self.constraints:
+            constraint = RowTemplates(self.constraints[row_engine] for row_engine in engines)
+        return self._generate(prompts, token_callbacks, engines, None, constraint, engines)
+
+    def _generate(self, prompts, token_callbacks, engines, prefix_name, constraint, adapters):
+        timings = {}
+        replies, token_counts = self.thalamus.generate_texts(
+            prompts, prefix=prefix_name, constraint=constraint, return_token_counts=True,
+            token_callbacks=token_callbacks, timings=timings, adapters=adapters,
+        )
+
+        decoding = "structured" if constraint is not None else "sample"
+        # Batch-wide stages are attributed to the batch's engines together, e.g. "acc+thalamus".
+        label = "+".join(sorted(set(engines)))
+        PROMPT_TOKENS.inc(timings.pop("prompt_tokens"), engine=label)
+        observe_stages(label, timings)
+        if timings["decode"] > 0:
+            DECODE_TOKENS_PER_SECOND.observe(sum(token_counts) / timings["decode"], engine=label)
+        for engine, count in zip(engines, token_counts):
+            GENERATED_TOKENS.inc(count, engine=engine, decoding=decoding)
+            if constraint is not None:
+                TOKENS_SAVED.inc(self.thalamus.max_new_tokens - count, engine=engine)
+        return replies
+
+    def _timed_token_callback(self, on_token, engine):
+        # Latencies are measured from queueing, so batching delays count towards TTFT.
+        start = time.perf_counter()
+        last = None
+
+        def callback(text):
+            nonlocal last
+            now = time.perf_counter()
+            if last is None:
+                TIME_TO_FIRST_TOKEN.observe(now - start, engine=engine)
+            else:
+                INTER_TOKEN_SECONDS.observe(now - last, engine=engine)
+            last = now
+            on_token(text)
+        return callback
+
+    def submit_reply(self, prompt, engine="default", mode=None, on_token=None):
+        """Queue a prompt for generation and return a Future for the reply.
+
+        If the engine has a prompt prefix registered, ``prompt`` is only the text after it.
+        ``mode`` picks "generate" or "score" routing for the thalamus engine.
+        ``on_token`` is called from the batcher thread with each new piece of reply
+        text as it is generated (score mode has no tokens to stream).
+        """
+        if engine in MODEL_ENGINES:
+            mode = mode or (self.routing_mode if engine == "thalamus" else "generate")
+            if mode not in ROUTING_MODES or (mode == "score" and engine != "thalamus"):
+                raise ValueError(f"Mode {mode!r} is not supported for engine {engine!r}")
+            if on_token is not None:
+                on_token = self._timed_token_callback(on_token, engine)
+            key = (ADAPTER_BATCH, mode) if engine in self.adapters and mode == "generate" else (engine, mode)
+            return self.batcher.submit((prompt, on_token, engine), key=key)
+        # Fallback to default implementation or error handling.
+        future = Future()
+        future.set_result("Default engine response not configured.")
+        return future
+    
+    def generate_reply(self, prompt, engine="default", mode=None):
+        return self.submit_reply(prompt, engine, mode=mode).result(timeout=self.request_timeout)
@@ -3,8 +3,11 @@
 from .chat_client import ChatClient
 
 class ACCClient(ChatClient):
-    def __init__(self):
-        super().__init__(model="hf/acc")
+    def __init__(self, url: str = "http://localhost:8000/chat/completions", **kwargs):
+        super().__init__(model="hf/acc", url=url, **kwargs)
 
     def evaluate(self, thalamus_output: str) -> str:
         return self.send_message(thalamus_output)
+
+    def evaluate_many(self, thalamus_outputs: list, max_concurrency: int = None) -> list:
+        return self.send_messages(thalamus_outputs, max_concurrency)
@@ -0,0 +1,203 @@
+# async_client.py
+
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+
+from .http_client import RetryPolicy, RETRY_STATUSES, retry_after_seconds
+from .chat_client import parse_sse_data, handle_stream_chunk
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHTTPClient:
+    """asyncio counterpart of HTTPClient built on a pooled httpx.AsyncClient."""
+
+    def __init__(self, timeout: float = 30.0, max_connections: int = 10, retry: RetryPolicy = None,
+                 client: httpx.AsyncClient = None, verify: bool = True):
+        self.max_connections = max_connections
+        self.retry = retry or RetryPolicy()
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            verify=verify,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def request(self, method: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        """Send a request, retrying connection errors and retryable statuses.
+
+        With ``stream`` the body is left unread; close the response with ``aclose()``.
+        """
+        for attempt in range(self.retry.max_retries + 1):
+            last_attempt = attempt == self.retry.max_retries
+            try:
+                request = self.client.build_request(method, url, **kwargs)
+                response = await self.client.send(request, stream=stream)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if last_attempt:
+                    raise
+                wait = self.retry.delay(attempt)
+                logger.warning(f"{method} {url} failed ({e}), retrying in {wait:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    if stream and response.is_error:
+                        await response.aclose()
+                    response.raise_for_status()
+                    return response
+                wait = self.retry.delay(attempt, retry_after_seconds(response.headers))
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {wait:.2f}s")
+                await response.aclose()
+            await asyncio.sleep(wait)
+
+    async def gather_limited(self, fn, items, max_concurrency: int = None) -> list:
+        """Await ``fn(item)`` for every item with at most ``max_concurrency`` in flight."""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_connections)
+
+        async def run(item):
+            async with semaphore:
+                return await fn(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def close(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncChatClient(AsyncHTTPClient):
+    def __init__(self, model: str, url: str = "http://localhost:8000/chat/completions", **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.model = model
+
+    async def send_message(self, message: str) -> str:
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": message}
+            ]
+        }
+        response = await self.request("POST", self.url, json=payload)
+        data = response.json()
+        choices = data.get("choices", [])
+        if not choices:
+            raise ValueError("No choices available in response: " + str(data))
+        return choices[0].get("message", {}).get("content", "")
+
+    async def stream_message(self, message: str, on_token=None) -> str:
+        """Streaming counterpart of ``send_message``; see ChatClient.stream_message."""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": message}
+            ],
+            "stream": True,
+        }
+        response = await self.request("POST", self.url, json=payload, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                chunk = parse_sse_data(line)
+                if chunk is not None:
+                    content = handle_stream_chunk(chunk, on_token)
+                    if content is not None:
+                        return content
+        finally:
+            await response.aclose()
+        raise ValueError("Stream ended without a final result")
+
+    async def send_messages(self, messages: list, max_concurrency: int = None) -> list:
+        return await self.gather_limited(self.send_message, messages, max_concurrency)
+
+
+class AsyncThalamusClient(AsyncChatClient):
+    def __init__(self, url: str = "http://localhost:8000/chat/completions", **kwargs):
+        super().__init__(model="hf/thalamus", url=url, **kwargs)
+
+    async def analyze(self, sensor: str, input_type: str, input_data: str) -> str:
+        inner_message = json.dumps({
+            "sensor": sensor,
+            "input_type": input_type,
+            "input_data": input_data,
+        })
+        for attempt in range(self.retry.max_retries + 1):
+            try:
+                return await self.send_message(inner_message)
+            except ValueError as e:
+                if attempt == self.retry.max_retries:
+                    raise ValueError(
+                        f"Failed to send message to Thalamus model after {attempt + 1} attempts: " + str(e)
+                    )
+                await asyncio.sleep(self.retry.delay(attempt))
+
+    async def analyze_many(self, events: list, max_concurrency: int = None) -> list:
+        return await self.gather_limited(
+            lambda event: self.analyze(event["sensor"], event["input_type"], event["input_data"]),
+            events,
+            max_concurrency,
+        )
+
+
+class AsyncACCClient(AsyncChatClient):
+    def __init__(self, url: str = "http://localhost:8000/chat/completions", **kwargs):
+        super().__init__(model="hf/acc", url=url, **kwargs)
+
+    async def evaluate(self, thalamus_output: str) -> str:
+        return await self.send_message(thalamus_output)
+
+    async def evaluate_many(self, thalamus_outputs: list, max_concurrency: int = None) -> list:
+        return await self.send_messages(thalamus_outputs, max_concurrency)
+
+
+class AsyncPipelineClient(AsyncHTTPClient):
+    def __init__(self, url: str = "http://localhost:8000/pipeline", batch_size: int = 64, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.batch_size = batch_size
+
+    async def _post(self, payload: dict) -> list:
+        response = await self.request("POST", self.url, json=payload)
+        return response.json().get("results", [])
+
+    async def process(self, sensor: str, input_type: str, input_data: str) -> dict:
+        results = await self._post({
+            "sensor": sensor,
+            "input_type": input_type,
+            "input_data": input_data,
+        })
+        if not results:
+            raise ValueError("No result returned for event")
+        return results[0]
+
+    async def process_many(self, events: list, max_concurrency: int = None) -> list:
+        batches = [events[i:i + self.batch_size] for i in range(0, len(events), self.batch_size)]
+        results = await self.gather_limited(lambda batch: self._post({"events": batch}), batches, max_concurrency)
+        return [result for batch_results in results for result in batch_results]
+
+
+class AsyncVisionClient(AsyncHTTPClient):
+    def __init__(self, url: str = "http://localhost:8000/sight/", verify: bool = False, **kwargs):
+        super().__init__(verify=verify, **kwargs)
+        self.url = url
+
+    async def get_caption(self, image_path: str) -> dict:
+        with open(image_path, "rb") as f:
+            contents = f.read()
+        try:
+            response = await self.request("POST", self.url, files={"file": (os.path.basename(image_path), contents)})
+        except Exception as e:
+            logger.error(f"Caption request for {image_path} failed: {e}")
+            return {}
+        return response.json()
+
+    async def get_captions(self, image_paths: list, max_concurrency: int = None) -> list:
+        return await self.gather_limited(self.get_caption, image_paths, max_concurrency)
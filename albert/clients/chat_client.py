@@ -1,10 +1,39 @@
 # chat_client.py
 
-import requests
+import json
 
-class ChatClient:
+from .http_client import HTTPClient
+
+
+def parse_sse_data(line: str):
+    """Return the JSON payload of an SSE ``data:`` line; None for other lines and the ``[DONE]`` marker."""
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    return json.loads(data)
+
+
+def handle_stream_chunk(chunk: dict, on_token=None):
+    """Pass a chunk's content delta to ``on_token``; returns the reply content once the final chunk arrives."""
+    if "choices" not in chunk or chunk.get("error"):
+        raise ValueError("Stream failed: " + str(chunk.get("error", chunk)))
+    choice = chunk["choices"][0]
+    text = choice.get("delta", {}).get("content")
+    if text and on_token is not None:
+        on_token(text)
+    if choice.get("finish_reason") is None:
+        return None
+    # The final chunk carries the validated result; thalamus/ACC results are objects.
+    result = chunk.get("result")
+    return result if isinstance(result, str) else json.dumps(result)
+
+
+class ChatClient(HTTPClient):
     """A base client for interacting with a chat completion API."""
-    def __init__(self, model: str, url: str = "http://localhost:8000/chat/completions"):
+    def __init__(self, model: str, url: str = "http://localhost:8000/chat/completions", **kwargs):
+        super().__init__(**kwargs)
         self.url = url
         self.model = model
 
@@ -15,11 +44,37 @@ class ChatClient:
                 {"role": "user", "content": message}
             ]
         }
-        response = requests.post(self.url, json=payload)
-        response.raise_for_status()
+        response = self.request("POST", self.url, json=payload)
         data = response.json()
         choices = data.get("choices", [])
         if not choices:
             raise ValueError("No choices available in response: " + str(data))
         content = choices[0].get("message", {}).get("content", "")
-        return content
\ No newline at end of file
+        return content
+
+    def stream_message(self, message: str, on_token=None) -> str:
+        """Send a message with ``stream: true``, calling ``on_token`` with each piece of text as it arrives.
+
+        Returns the same validated content as ``send_message`` once the stream ends.
+        """
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": message}
+            ],
+            "stream": True,
+        }
+        # Retries only happen before the stream starts (e.g. a 503 while the model loads).
+        response = self.request("POST", self.url, json=payload, stream=True)
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                chunk = parse_sse_data(line or "")
+                if chunk is not None:
+                    content = handle_stream_chunk(chunk, on_token)
+                    if content is not None:
+                        return content
+        raise ValueError("Stream ended without a final result")
+
+    def send_messages(self, messages: list, max_concurrency: int = None) -> list:
+        """Send many messages concurrently over the pooled connections."""
+        return self.map_concurrently(self.send_message, messages, max_concurrency)
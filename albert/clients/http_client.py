@@ -0,0 +1,91 @@
+# http_client.py
+
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: overload (429/503) and bad gateway. Not 504: the server
+# answers it when a request's deadline or queue timeout ran out, and retrying would
+# only resend expired work while the server is saturated.
+RETRY_STATUSES = {429, 502, 503}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honoring Retry-After when the server sends it."""
+
+    def __init__(self, max_retries: int = 3, backoff: float = 0.1, max_backoff: float = 5.0, jitter: bool = True):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+def retry_after_seconds(headers) -> float:
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class HTTPClient:
+    """Keep-alive HTTP client: pooled connections, timeouts and retries with backoff."""
+
+    def __init__(self, timeout: float = 30.0, max_connections: int = 10, retry: RetryPolicy = None,
+                 session: requests.Session = None, verify: bool = True):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.retry = retry or RetryPolicy()
+        self.verify = verify
+        # Clients can share one session (and its connection pool) by passing it in.
+        self._owns_session = session is None
+        self.session = session or requests.Session()
+        if self._owns_session:
+            adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying connection errors and retryable statuses."""
+        for attempt in range(self.retry.max_retries + 1):
+            last_attempt = attempt == self.retry.max_retries
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, verify=self.verify, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                wait = self.retry.delay(attempt)
+                logger.warning(f"{method} {url} failed ({e}), retrying in {wait:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    response.raise_for_status()
+                    return response
+                wait = self.retry.delay(attempt, retry_after_seconds(response.headers))
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {wait:.2f}s")
+            time.sleep(wait)
+
+    def map_concurrently(self, fn, items, max_concurrency: int = None) -> list:
+        """Apply ``fn`` to every item on a thread pool; results keep the input order."""
+        with ThreadPoolExecutor(max_workers=max_concurrency or self.max_connections) as pool:
+            return list(pool.map(fn, items))
+
+    def close(self):
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
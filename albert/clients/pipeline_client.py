@@ -0,0 +1,31 @@
+# pipeline_client.py
+
+from .http_client import HTTPClient
+
+class PipelineClient(HTTPClient):
+    """Runs thalamus routing and ACC evaluation in one round trip via /pipeline."""
+    def __init__(self, url: str = "http://localhost:8000/pipeline", batch_size: int = 64, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        # Should not exceed the server's pipeline.max_events.
+        self.batch_size = batch_size
+
+    def _post(self, payload: dict) -> list:
+        response = self.request("POST", self.url, json=payload)
+        return response.json().get("results", [])
+
+    def process(self, sensor: str, input_type: str, input_data: str) -> dict:
+        results = self._post({
+            "sensor": sensor,
+            "input_type": input_type,
+            "input_data": input_data,
+        })
+        if not results:
+            raise ValueError("No result returned for event")
+        return results[0]
+
+    def process_many(self, events: list, max_concurrency: int = None) -> list:
+        # Events are dicts with sensor, input_type and input_data; results keep their order.
+        batches = [events[i:i + self.batch_size] for i in range(0, len(events), self.batch_size)]
+        results = self.map_concurrently(lambda batch: self._post({"events": batch}), batches, max_concurrency)
+        return [result for batch_results in results for result in batch_results]
@@ -1,11 +1,12 @@
 # thalamus_client.py
 
 import json
+import time
 from .chat_client import ChatClient
 
 class ThalamusClient(ChatClient):
-    def __init__(self):
-        super().__init__(model="hf/thalamus")
+    def __init__(self, url: str = "http://localhost:8000/chat/completions", **kwargs):
+        super().__init__(model="hf/thalamus", url=url, **kwargs)
 
     def analyze(self, sensor: str, input_type: str, input_data: str) -> str:
         inner_message = json.dumps({
@@ -13,14 +14,21 @@ class ThalamusClient(ChatClient):
             "input_type": input_type,
             "input_data": input_data,
         })
-        # Attempt to send the inner message to the Thalamus model
-        try:
-            return self.send_message(inner_message)
-        except ValueError as e:
-            # Retry sending up to 3 times if a ValueError occurs
-            for _ in range(3):
-                try:
-                    return self.send_message(inner_message)
-                except ValueError:
-                    continue
-            raise ValueError("Failed to send message to Thalamus model after 3 attempts: " + str(e))
\ No newline at end of file
+        # An empty reply (ValueError) is retried with the same backoff as transport errors
+        for attempt in range(self.retry.max_retries + 1):
+            try:
+                return self.send_message(inner_message)
+            except ValueError as e:
+                if attempt == self.retry.max_retries:
+                    raise ValueError(
+                        f"Failed to send message to Thalamus model after {attempt + 1} attempts: " + str(e)
+                    )
+                time.sleep(self.retry.delay(attempt))
+
+    def analyze_many(self, events: list, max_concurrency: int = None) -> list:
+        """Analyze many events (dicts with sensor, input_type, input_data) concurrently."""
+        return self.map_concurrently(
+            lambda event: self.analyze(event["sensor"], event["input_type"], event["input_data"]),
+            events,
+            max_concurrency,
+        )
@@ -1,21 +1,31 @@
 # vision_client.py
 
-import requests
+import logging
+import os
 import urllib3
+from .http_client import HTTPClient
 
-class VisionClient:
-    def __init__(self, url: str = "http://localhost:8000/sight/"):
+logger = logging.getLogger(__name__)
+
+class VisionClient(HTTPClient):
+    def __init__(self, url: str = "http://localhost:8000/sight/", verify: bool = False, **kwargs):
+        super().__init__(verify=verify, **kwargs)
         self.url = url
-        # Disable insecure request warnings (optional).
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        if not verify:
+            # Disable insecure request warnings (optional).
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
     def get_caption(self, image_path: str) -> dict:
+        # Read the file up front so retries can resend it.
         with open(image_path, "rb") as f:
-            files = {"file": f}
-            response = requests.post(self.url, files=files, verify=False)
-        if response.ok:
-            print("Server Response:", response.status_code, response.reason)
-            return response.json()
-        else:
-            print("Error:", response.status_code, response.text)
+            contents = f.read()
+        try:
+            response = self.request("POST", self.url, files={"file": (os.path.basename(image_path), contents)})
+        except Exception as e:
+            logger.error(f"Caption request for {image_path} failed: {e}")
             return {}
+        logger.debug(f"Server Response: {response.status_code} {response.reason}")
+        return response.json()
+
+    def get_captions(self, image_paths: list, max_concurrency: int = None) -> list:
+        return self.map_concurrently(self.get_caption, image_paths, max_concurrency)
@@ -0,0 +1,224 @@
+# constrained.py
+
+import json
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+from regions import ROUTING_LABELS
+
+
+class Literal:
+    """Fixed text that is forced token by token."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Choice:
+    """One of a fixed list of strings."""
+
+    def __init__(self, options):
+        self.options = list(options)
+
+
+class FreeString:
+    """Free text inside a JSON string: no quotes, backslashes, braces or newlines.
+
+    Must be followed by a Literal that closes the string.
+    """
+
+    def __init__(self, max_tokens=32):
+        self.max_tokens = max_tokens
+
+
+# Trie key marking the end of a Choice option.
+_END = -1
+
+
+class JsonTemplate:
+    """Token-level state machine that only allows output matching a fixed JSON shape."""
+
+    def __init__(self, tokenizer, segments):
+        self.eos_token_id = tokenizer.eos_token_id
+        self.segments = []
+        self.max_tokens = 1
+        for segment in segments:
+            if isinstance(segment, Literal):
+                ids = tokenizer.encode(segment.text, add_special_tokens=False)
+                self.segments.append(("literal", ids))
+                self.max_tokens += len(ids)
+            elif isinstance(segment, Choice):
+                trie, longest = {}, 0
+                for option in segment.options:
+                    ids = tokenizer.encode(option, add_special_tokens=False)
+                    node = trie
+                    for token_id in ids:
+                        node = node.setdefault(token_id, {})
+                    node[_END] = {}
+                    longest = max(longest, len(ids))
+                self.segments.append(("choice", trie))
+                self.max_tokens += longest
+            elif isinstance(segment, FreeString):
+                self.segments.append(("free", segment.max_tokens))
+                self.max_tokens += segment.max_tokens
+            else:
+                raise TypeError(f"Unknown template segment: {segment!r}")
+
+        self._safe_ids = None
+        if any(kind == "free" for kind, _ in self.segments):
+            self._safe_ids = self._string_safe_ids(tokenizer)
+            for index, (kind, _) in enumerate(self.segments):
+                if kind == "free":
+                    following = self.segments[index + 1] if index + 1 < len(self.segments) else None
+                    if following is None or following[0] != "literal" or following[1][0] in self._safe_ids:
+                        raise ValueError("FreeString must be followed by a Literal that closes the string")
+        self._safe_masks = {}
+
+    @staticmethod
+    def _string_safe_ids(tokenizer):
+        # Tokens that can appear inside a JSON string without ending or escaping it.
+        special = set(tokenizer.all_special_ids)
+        safe = set()
+        for token_id in range(len(tokenizer)):
+            if token_id in special:
+                continue
+            text = tokenizer.decode([token_id])
+            if text and text.isprintable() and not any(c in text for c in '"\\{}\ufffd'):
+                safe.add(token_id)
+        return safe
+
+    def safe_mask(self, vocab_size, device):
+        key = (vocab_size, str(device))
+        mask = self._safe_masks.get(key)
+        if mask is None:
+            mask = torch.zeros(vocab_size, dtype=torch.bool)
+            mask[[token_id for token_id in self._safe_ids if token_id < vocab_size]] = True
+            mask = self._safe_masks[key] = mask.to(device)
+        return mask
+
+    def _walk(self, tokens, segment_index=0, position=0):
+        """Return (allow_free_text, allowed_ids, complete) after consuming ``tokens``."""
+        while segment_index < len(self.segments):
+            kind, data = self.segments[segment_index]
+            if kind == "literal":
+                for expected in data:
+                    if position == len(tokens):
+                        return False, {expected}, False
+                    if tokens[position] != expected:
+                        return False, {self.eos_token_id}, False
+                    position += 1
+            elif kind == "choice":
+                node = data
+                while True:
+                    if position < len(tokens) and tokens[position] in node:
+                        node = node[tokens[position]]
+                        position += 1
+                        continue
+                    if _END not in node:
+                        if position == len(tokens):
+                            return False, set(node), False
+                        return False, {self.eos_token_id}, False
+                    if position == len(tokens) and len(node) > 1:
+                        # A finished option that is also the prefix of a longer one.
+                        free, following, complete = self._walk(tokens, segment_index + 1, position)
+                        return free, (set(node) - {_END}) | following, complete
+                    break
+            else:
+                count = 0
+                while position < len(tokens) and count < data and tokens[position] in self._safe_ids:
+                    position += 1
+                    count += 1
+                if position == len(tokens):
+                    closing = self.segments[segment_index + 1][1][0]
+                    return count < data, {closing}, False
+            segment_index += 1
+        return False, {self.eos_token_id}, True
+
+    def allowed(self, tokens):
+        free, allowed_ids, _ = self._walk(tokens)
+        return free, allowed_ids
+
+    def is_complete(self, tokens):
+        return self._walk(tokens)[2]
+
+    def for_row(self, row):
+        return self
+
+    def logits_processor(self, prompt_length):
+        return TemplateLogitsProcessor(self, prompt_length)
+
+    def stopping_criteria(self, prompt_length):
+        return TemplateStoppingCriteria(self, prompt_length)
+
+
+class RowTemplates:
+    """One template per batch row, for batches mixing engines (e.g. thalamus and ACC adapters)."""
+
+    def __init__(self, templates):
+        self.templates = list(templates)
+        self.max_tokens = max(template.max_tokens for template in self.templates)
+
+    def for_row(self, row):
+        return self.templates[row]
+
+    def logits_processor(self, prompt_length):
+        return TemplateLogitsProcessor(self, prompt_length)
+
+    def stopping_criteria(self, prompt_length):
+        return TemplateStoppingCriteria(self, prompt_length)
+
+
+class TemplateLogitsProcessor(LogitsProcessor):
+    """Masks every token that would leave the template's JSON shape."""
+
+    def __init__(self, template, prompt_length):
+        self.template = template
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores):
+        mask = torch.full_like(scores, float("-inf"))
+        for row in range(input_ids.shape[0]):
+            template = self.template.for_row(row)
+            free, allowed_ids = template.allowed(input_ids[row, self.prompt_length:].tolist())
+            if free:
+                mask[row, template.safe_mask(scores.shape[-1], scores.device)] = 0
+            mask[row, list(allowed_ids)] = 0
+        return scores + mask
+
+
+class TemplateStoppingCriteria(StoppingCriteria):
+    """Stops a row as soon as its template is complete, without waiting for EOS."""
+
+    def __init__(self, template, prompt_length):
+        self.template = template
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = [
+            self.template.for_row(index).is_complete(row[self.prompt_length:].tolist())
+            for index, row in enumerate(input_ids)
+        ]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+def thalamus_template(tokenizer):
+    # The output is exactly one of the known region/schema pairs. Like the prompt
+    # examples ("Output: {...}"), the object starts after a space.
+    options = [" " + json.dumps({"region": region, "schema": schema}) for region, schema in ROUTING_LABELS]
+    return JsonTemplate(tokenizer, [Choice(options)])
+
+
+def acc_template(tokenizer, feelings_max_tokens=32):
+    # Scores are restricted to two decimals between 0 and 1.
+    scores = [f" {value / 100:.2f}" for value in range(101)]
+    return JsonTemplate(tokenizer, [
+        Literal(' {"pass_doubt":'),
+        Choice([" true", " false"]),
+        Literal(', "threshold_score":'),
+        Choice(scores),
+        Literal(', "feelings": "'),
+        FreeString(max_tokens=feelings_max_tokens),
+        Literal('", "significance":'),
+        Choice(scores),
+        Literal("}"),
+    ])
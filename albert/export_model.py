@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Export the thalamus or captioning model to ONNX for the onnx backend.
+
+    python export_model.py thalamus --output thalamus/model/thalamus_onnx
+    python export_model.py sight --output models/vit-gpt2-onnx
+
+Point chat.onnx_dir / sight.onnx_dir in config/settings.yaml at the output.
+The int8 and compile backends need no export; they convert the model at load time.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backends import export_onnx  # noqa: E402
+from chat_engine import model_path  # noqa: E402
+
+DEFAULT_SIGHT_MODEL = "nlpconnect/vit-gpt2-image-captioning"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a model to ONNX Runtime")
+    parser.add_argument("model", choices=["thalamus", "sight"])
+    parser.add_argument("--source", help="Model directory or Hugging Face name (defaults to the served model)")
+    parser.add_argument("--output", required=True, help="Directory to write the ONNX model to")
+    args = parser.parse_args()
+
+    if args.model == "thalamus":
+        source, kind = args.source or model_path, "causal_lm"
+    else:
+        source, kind = args.source or DEFAULT_SIGHT_MODEL, "vision2seq"
+    print(f"Exporting {source} to {args.output}...")
+    export_onnx(source, args.output, kind=kind)
+    print("Done.")
@@ -0,0 +1,106 @@
+# frame_stream.py
+
+import time
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import open_image
+from metrics import counter, histogram
+
+STREAM_FRAMES = counter(
+    "albert_sight_stream_frames_total", "Streamed frames by result (captioned, skipped, error)", ["camera", "result"]
+)
+STREAM_CAPTION_SECONDS = histogram(
+    "albert_sight_stream_caption_seconds", "Caption latency for streamed frames that were captioned", ["camera"]
+)
+
+
+class ChangeDetector:
+    """Decides which frames of a stream are worth captioning.
+
+    Each frame is decoded to a tiny grayscale grid and compared with the last
+    captioned frame; the motion score is the mean absolute pixel change (0-1).
+    A frame is captioned when the score reaches ``threshold`` or when
+    ``max_interval`` seconds have passed since the last caption. Frames over the
+    byte or pixel limits raise ImageTooLargeError before they are decoded.
+    """
+
+    def __init__(self, threshold=0.05, max_interval=10.0, grid_size=32, max_upload_bytes=None, max_pixels=None):
+        if not 0 <= threshold <= 1 or max_interval <= 0 or grid_size < 2:
+            raise ValueError("threshold must be in [0, 1], max_interval positive and grid_size at least 2")
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.grid_size = grid_size
+        self.max_upload_bytes = max_upload_bytes
+        self.max_pixels = max_pixels
+        self._reference = None
+        self._last_caption = None
+
+    def thumbnail(self, contents: bytes) -> np.ndarray:
+        image = open_image(contents, self.max_upload_bytes, self.max_pixels)
+        # JPEG frames are decoded at 1/8 scale when that is still larger than the grid.
+        image.draft("L", (self.grid_size, self.grid_size))
+        image = image.convert("L").resize((self.grid_size, self.grid_size), Image.BILINEAR)
+        return np.asarray(image, dtype=np.float32) / 255.0
+
+    def motion(self, thumbnail: np.ndarray) -> float:
+        if self._reference is None:
+            return 1.0
+        return float(np.abs(thumbnail - self._reference).mean())
+
+    def should_caption(self, motion: float, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return (
+            self._reference is None
+            or motion >= self.threshold
+            or now - self._last_caption >= self.max_interval
+        )
+
+    def update(self, thumbnail: np.ndarray, now: float = None):
+        """Make ``thumbnail`` the reference frame after it has been captioned."""
+        self._reference = thumbnail
+        self._last_caption = time.monotonic() if now is None else now
+
+
+class StreamStats:
+    """Per-stream counters for tuning a camera's threshold and interval."""
+
+    def __init__(self, camera, detector):
+        self.camera = camera
+        self.detector = detector
+        self.started = time.time()
+        self.frames = 0
+        self.captioned = 0
+        self.skipped = 0
+        self.errors = 0
+        self.caption_seconds = 0.0
+        self.max_caption_seconds = 0.0
+
+    def record(self, result, caption_seconds=None):
+        self.frames += 1
+        if result == "captioned":
+            self.captioned += 1
+            self.caption_seconds += caption_seconds
+            self.max_caption_seconds = max(self.max_caption_seconds, caption_seconds)
+            STREAM_CAPTION_SECONDS.observe(caption_seconds, camera=self.camera)
+        elif result == "skipped":
+            self.skipped += 1
+        else:
+            self.errors += 1
+        STREAM_FRAMES.inc(camera=self.camera, result=result)
+
+    def snapshot(self):
+        return {
+            "camera": self.camera,
+            "threshold": self.detector.threshold,
+            "max_interval": self.detector.max_interval,
+            "frames": self.frames,
+            "captioned": self.captioned,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "skip_ratio": round(self.skipped / self.frames, 4) if self.frames else 0.0,
+            "mean_caption_ms": round(1000 * self.caption_seconds / self.captioned, 2) if self.captioned else None,
+            "max_caption_ms": round(1000 * self.max_caption_seconds, 2) if self.captioned else None,
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
@@ -0,0 +1,83 @@
+# image_preprocessing.py
+
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+class ImageTooLargeError(ValueError):
+    """An upload exceeds the configured byte or pixel limit."""
+
+
+def open_image(contents: bytes, max_upload_bytes=None, max_pixels=None) -> Image.Image:
+    """Open an upload lazily, checking the byte count and the header's dimensions.
+
+    Only the header has been read when this returns, so oversized uploads are
+    rejected before any pixel data is decoded.
+    """
+    if max_upload_bytes and len(contents) > max_upload_bytes:
+        raise ImageTooLargeError(f"Upload is {len(contents)} bytes, limit is {max_upload_bytes}")
+    image = Image.open(BytesIO(contents))
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(f"Image is {width}x{height} pixels, limit is {max_pixels}")
+    return image
+
+
+class ImagePreprocessor:
+    """Decodes uploads straight to the captioning model's input size and normalizes them.
+
+    Replaces full decode -> thumbnail -> ViTImageProcessor: JPEGs are decoded at a
+    reduced DCT scale (``Image.draft``), resized once to the model size, and turned
+    into a normalized float tensor with one copy per batch.
+    """
+
+    def __init__(self, size=(224, 224), image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5),
+                 rescale_factor=1 / 255, resample=Image.BILINEAR, max_upload_bytes=None, max_pixels=None,
+                 draft=True):
+        self.size = tuple(size)  # (width, height)
+        self.resample = resample
+        self.max_upload_bytes = max_upload_bytes
+        self.max_pixels = max_pixels
+        self.draft = draft
+        # (x * rescale - mean) / std == x * scale - shift, applied in place per channel.
+        mean = torch.tensor(image_mean, dtype=torch.float32).view(1, 3, 1, 1)
+        std = torch.tensor(image_std, dtype=torch.float32).view(1, 3, 1, 1)
+        self._scale = rescale_factor / std
+        self._shift = mean / std
+
+    @classmethod
+    def from_processor(cls, processor, **kwargs):
+        """Build a preprocessor that matches a Hugging Face ViTImageProcessor's settings."""
+        size = processor.size
+        return cls(
+            size=(size["width"], size["height"]),
+            image_mean=processor.image_mean if processor.do_normalize else (0.0, 0.0, 0.0),
+            image_std=processor.image_std if processor.do_normalize else (1.0, 1.0, 1.0),
+            rescale_factor=processor.rescale_factor if processor.do_rescale else 1.0,
+            resample=processor.resample,
+            **kwargs,
+        )
+
+    def decode(self, contents: bytes) -> Image.Image:
+        """Decode an upload to an RGB image at the model input size (limits as in open_image)."""
+        image = open_image(contents, self.max_upload_bytes, self.max_pixels)
+        if self.draft:
+            # JPEG only: decode at the smallest 1/2, 1/4 or 1/8 scale still >= the model size.
+            image.draft("RGB", self.size)
+        return self.resize(image.convert("RGB"))
+
+    def resize(self, image: Image.Image) -> Image.Image:
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != self.size:
+            image = image.resize(self.size, resample=self.resample)
+        return image
+
+    def to_tensor(self, images: list) -> torch.Tensor:
+        """Stack images into a normalized (N, 3, H, W) float tensor."""
+        array = np.stack([np.asarray(self.resize(image)) for image in images])
+        pixel_values = torch.from_numpy(array).permute(0, 3, 1, 2).to(torch.float32, memory_format=torch.contiguous_format)
+        return pixel_values.mul_(self._scale).sub_(self._shift)
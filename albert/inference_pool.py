@@ -0,0 +1,157 @@
+# inference_pool.py
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import counter, gauge, histogram
+from scheduler import DeadlineExceeded, FairQueue, PriorityPolicy, Ticket
+
+logger = logging.getLogger(__name__)
+
+POOL_QUEUE_DEPTH = gauge("albert_pool_queue_depth", "Admitted calls waiting for a pool worker", ["pool"])
+POOL_CLASS_DEPTH = gauge(
+    "albert_pool_queue_depth_by_priority", "Admitted calls waiting for a pool worker, per priority class",
+    ["pool", "priority"],
+)
+POOL_IN_FLIGHT = gauge("albert_pool_in_flight", "Admitted calls, running or queued", ["pool"])
+QUEUE_WAIT_SECONDS = histogram(
+    "albert_pool_queue_wait_seconds", "Time admitted calls waited for a pool worker", ["pool", "priority"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+POOL_DROPPED = counter(
+    "albert_pool_dropped_total",
+    "Calls dropped before running: deadline passed, or shed from a full queue for more urgent work",
+    ["pool", "priority", "reason"],
+)
+
+
+class PoolFullError(Exception):
+    """Raised when an engine's admission queue is full."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} inference queue is full")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while its work was pending."""
+
+
+class _Work:
+    def __init__(self, fn, args, kwargs, ticket):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.ticket = ticket
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class InferencePool:
+    """Runs blocking engine calls on dedicated worker threads with bounded admission.
+
+    At most ``max_concurrency`` calls run at once and at most ``max_queue`` more may
+    wait; anything beyond that is rejected with PoolFullError so the server can shed load.
+    Queued calls are served by priority class (see scheduler.py), taking turns between
+    clients within a class. When the queue is full, a more urgent call displaces the
+    newest call of the least urgent class. Calls whose deadline passes while queued
+    fail with DeadlineExceeded instead of running.
+    """
+
+    def __init__(self, name, max_concurrency=1, max_queue=16, retry_after=1, disconnect_poll_ms=100, policy=None):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = retry_after
+        self.disconnect_poll = disconnect_poll_ms / 1000.0
+        self.policy = policy or PriorityPolicy()
+        self._queue = FairQueue(self.policy)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._workers = [
+            threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(self.max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+        POOL_QUEUE_DEPTH.set_function(lambda: len(self._queue), pool=name)
+        for priority in self.policy.classes:
+            depth = lambda priority=priority: self._queue.depth(priority)
+            POOL_CLASS_DEPTH.set_function(depth, pool=name, priority=priority)
+        POOL_IN_FLIGHT.set_function(lambda: self._admitted, pool=name)
+
+    @property
+    def in_flight(self):
+        """Number of admitted calls, running or queued."""
+        return self._admitted
+
+    def submit(self, fn, *args, ticket=None, **kwargs):
+        """Admit a call and return a Future for its result, or raise PoolFullError.
+
+        ``ticket`` (a scheduler.Ticket) sets the call's priority class, client and deadline.
+        """
+        work = _Work(fn, args, kwargs, ticket or Ticket(self.policy.default_class))
+        if work.ticket.expired():
+            POOL_DROPPED.inc(pool=self.name, priority=work.ticket.priority, reason="deadline")
+            raise DeadlineExceeded(f"{self.name}: deadline passed before the request was queued")
+        shed = None
+        with self._lock:
+            if self._admitted >= self.max_concurrency + self.max_queue:
+                # The displaced call's admission slot goes to this one.
+                shed = self._queue.evict_less_urgent(work.ticket.priority)
+                if shed is None:
+                    raise PoolFullError(self.name, self.retry_after)
+            else:
+                self._admitted += 1
+            self._queue.put(work)
+        if shed is not None and shed.future.set_running_or_notify_cancel():
+            POOL_DROPPED.inc(pool=self.name, priority=shed.ticket.priority, reason="shed")
+            shed.future.set_exception(PoolFullError(self.name, self.retry_after))
+        return work.future
+
+    async def run(self, fn, *args, request=None, ticket=None, **kwargs):
+        """Run a call on the pool and await it, cancelling it if the client disconnects."""
+        future = self.submit(fn, *args, ticket=ticket, **kwargs)
+        waiter = asyncio.wrap_future(future)
+        if request is None:
+            return await waiter
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=self.disconnect_poll)
+            if done:
+                return waiter.result()
+            if await request.is_disconnected():
+                # Queued work is dropped; a call already running finishes and is discarded.
+                waiter.cancel()
+                logger.info(f"{self.name}: client disconnected, cancelled pending work")
+                raise ClientDisconnected()
+
+    def _work(self):
+        while True:
+            work = self._queue.get()
+            future, ticket = work.future, work.ticket
+            now = time.monotonic()
+            QUEUE_WAIT_SECONDS.observe(now - work.enqueued, pool=self.name, priority=ticket.priority)
+            result, error = None, None
+            if ticket.expired(now):
+                # Nobody can use the answer any more; don't spend the model on it.
+                POOL_DROPPED.inc(pool=self.name, priority=ticket.priority, reason="deadline")
+                if future.set_running_or_notify_cancel():
+                    error = DeadlineExceeded(f"{self.name}: deadline passed while queued")
+            elif future.set_running_or_notify_cancel():
+                try:
+                    result, error = work.fn(*work.args, **work.kwargs), None
+                except BaseException as e:
+                    result, error = None, e
+            # Release the admission slot before waking the caller.
+            with self._lock:
+                self._admitted -= 1
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
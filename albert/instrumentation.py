@@ -0,0 +1,108 @@
+# instrumentation.py
+
+import functools
+import os
+import time
+
+import torch
+
+from metrics import counter, gauge, histogram
+
+# Latency buckets down to half a millisecond: parsing and tokenization are far below the default buckets.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = histogram(
+    "albert_stage_seconds",
+    "Time spent in each inference stage (tokenize, prefill, decode, parse, fallback, preprocess, beam_search, ...)",
+    ["engine", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+PROMPT_TOKENS = counter(
+    "albert_prompt_tokens_total", "Prompt tokens prefilled by the model, excluding padding and cached prefixes", ["engine"]
+)
+GENERATED_TOKENS = counter(
+    "albert_generated_tokens_total", "Tokens generated by each engine's model", ["engine", "decoding"]
+)
+DECODE_TOKENS_PER_SECOND = histogram(
+    "albert_decode_tokens_per_second",
+    "Generated tokens per second of decoding, per batch",
+    ["engine"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+MODEL_MEMORY_BYTES = gauge("albert_model_memory_bytes", "Parameter and buffer memory of each loaded model", ["engine"])
+PROCESS_MEMORY_BYTES = gauge("albert_process_resident_memory_bytes", "Resident memory of the server process")
+PROCESS_PSS_BYTES = gauge(
+    "albert_process_proportional_memory_bytes",
+    "Proportional set size of the server process: shared pages count divided by the processes sharing them",
+)
+PROCESS_SHARED_BYTES = gauge(
+    "albert_process_shared_memory_bytes", "Resident memory of the server process that is shared with other processes"
+)
+CUDA_MEMORY_BYTES = gauge("albert_cuda_memory_allocated_bytes", "CUDA memory currently allocated by PyTorch")
+
+
+def timed(engine, stage):
+    """Decorator recording a function's duration in albert_stage_seconds."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, engine=engine, stage=stage)
+        return wrapper
+    return decorator
+
+
+def observe_stages(engine, timings):
+    """Record a dict of stage -> seconds, e.g. the timings filled in by Thalamus.generate_texts."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, engine=engine, stage=stage)
+
+
+def model_memory_bytes(model):
+    """Bytes held by a PyTorch model's parameters and buffers (0 for non-PyTorch backends)."""
+    if not isinstance(model, torch.nn.Module):
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    # Dynamically quantized layers keep their int8 weights in packed params, not parameters().
+    for module in model.modules():
+        packed = getattr(module, "_packed_params", None)
+        if packed is not None and hasattr(packed, "_weight_bias"):
+            tensors.extend(t for t in packed._weight_bias() if t is not None)
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _resident_memory_bytes():
+    # Linux only; the gauge is simply left out elsewhere.
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def memory_usage(pid="self"):
+    """Resident memory of a process in bytes: rss, pss, shared and private (Linux only).
+
+    With several workers sharing preloaded weights, rss counts the shared pages in
+    every worker while pss splits them between the workers, so summing pss across
+    workers gives the real footprint.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0]) * 1024
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+PROCESS_MEMORY_BYTES.set_function(_resident_memory_bytes)
+PROCESS_PSS_BYTES.set_function(lambda: memory_usage()["pss"])
+PROCESS_SHARED_BYTES.set_function(lambda: memory_usage()["shared"])
+if torch.cuda.is_available():
+    CUDA_MEMORY_BYTES.set_function(torch.cuda.memory_allocated)
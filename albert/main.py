@@ -1,248 +1,890 @@
 # main.py
 
-from fastapi import FastAPI, Request, HTTPException, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, HTTPException, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import uvicorn
-import yaml
+import asyncio
 import os
-import re
 import json
 import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from concurrent.futures import Future, as_completed
 from io import BytesIO
 from PIL import Image
 
 # Import our custom engine classes.
-from chat_engine import ChatEngine
-from sight_engine import SightEngine
+from chat_engine import ChatEngine, ROUTING_MODES
+from sight_engine import SightEngine, caption_version
+from settings import load_settings
+from prompt_store import PromptStore
+from inference_pool import InferencePool, PoolFullError, ClientDisconnected
+from scheduler import DEFAULT_CLASSES, DeadlineExceeded, PriorityPolicy, Ticket
+from processing import (
+    build_acc_input,
+    generate_fallback_acc_response,
+    parse_acc_reply,
+    parse_thalamus_reply,
+)
+from cache import TTLCache
+from caption_cache import CaptionCache, CAPTION_SOURCES
+from frame_stream import ChangeDetector, StreamStats
+from image_preprocessing import ImageTooLargeError
+from model_manager import ModelManager, EngineUnavailable
+from acc_tiers import TieredACC
+from pipeline import run_pipeline
+import metrics
 
-# Load prompts from YAML
+# Load prompts from YAML; the static prefixes are rebuilt whenever the file changes.
 PROMPTS_PATH = os.path.join(os.path.dirname(__file__), "prompts/prompts.yaml")
-with open(PROMPTS_PATH, "r") as f:
-    prompts_data = yaml.safe_load(f)
-
-# Extract prompt segments (for Thalamus and ACC)
-THALAMUS_MAIN_SYSTEM_PROMPT = prompts_data["thalamus"]["main_prompt"]
-THALAMUS_REGION_KEY_PROMPT = prompts_data["thalamus"]["region_key_prompt"]
-THALAMUS_SCHEMA_KEY_PROMPT = prompts_data["thalamus"]["schema_key_prompt"]
-THALAMUS_EXAMPLE_PROMPT = prompts_data["thalamus"]["example_prompt"]
-
-ACC_MAIN_SYSTEM_PROMPT = prompts_data["acc"]["main_system_prompt"]
-ACC_PASS_DOUBT_KEY_PROMPT = prompts_data["acc"]["pass_doubt_key_prompt"]
-ACC_THRESHOLD_SCORE_KEY_PROMPT = prompts_data["acc"]["threshold_score_key_prompt"]
-ACC_FEELINGS_KEY_PROMPT = prompts_data["acc"]["feelings_key_prompt"]
-ACC_SIGNIFICANCE_PROMPT = prompts_data["acc"]["significance_key_prompt"]
-ACC_EXAMPLE_PROMPT = prompts_data["acc"]["example_prompt"]
+prompt_store = PromptStore(PROMPTS_PATH)
+
+# Load server settings (batching, timeouts, model paths)
+settings = load_settings()
+CHAT_SETTINGS = settings.get("chat", {})
+EXECUTOR_SETTINGS = settings.get("executor", {})
+ROUTING_CACHE_SETTINGS = settings.get("routing_cache", {})
+PIPELINE_SETTINGS = settings.get("pipeline", {})
+SIGHT_SETTINGS = settings.get("sight", {})
+CAPTION_CACHE_SETTINGS = settings.get("caption_cache", {})
+SIGHT_STREAM_SETTINGS = settings.get("sight_stream", {})
+BATCH_SETTINGS = settings.get("batch", {})
+MODEL_SETTINGS = settings.get("models", {})
+ACC_SETTINGS = settings.get("acc", {})
+SCHEDULING_SETTINGS = settings.get("scheduling", {})
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def _generate_fallback_acc_response(thalamus_data: dict, input_data: str) -> str:
-    """Generate a fallback ACC response when the model fails to produce valid JSON."""
-    region = thalamus_data.get("region", "unknown")
-    schema = thalamus_data.get("schema", "unknown")
-    
-    # Simple logic for fallback assessment
-    valid_regions = ["amygdala", "prefrontal_cortex", "sensory_cortex", "visual_cortex", "hippocampus"]
-    is_valid_region = region in valid_regions
-    
-    # Basic assessment based on input type
-    is_math = any(op in input_data.lower() for op in ["+", "-", "*", "/", "=", "solve", "calculate"])
-    is_logical = region == "prefrontal_cortex" and schema in ["problem_solving", "planning", "self_awareness"]
-    
-    pass_doubt = is_valid_region and (is_logical if is_math else True)
-    threshold_score = 0.8 if pass_doubt else 0.3
-    
-    # Generate appropriate emotional response
-    if is_math and is_logical:
-        feelings = "Focused and analytical. Ready to process logical data."
-    elif region == "amygdala":
-        feelings = "Alert and evaluating emotional significance."
-    elif region == "visual_cortex":
-        feelings = "Visually engaged and processing spatial information."
-    else:
-        feelings = "Processing input with appropriate cognitive resources."
-    
-    significance = 0.6 if is_math or "important" in input_data.lower() else 0.4
-    
-    fallback_response = {
-        "pass_doubt": pass_doubt,
-        "threshold_score": threshold_score,
-        "feelings": feelings,
-        "significance": significance
-    }
-    
-    return json.dumps(fallback_response)
+# Engines are built by the model manager when the app starts (or on first use
+# with lazy loading), never at import time.
+def _load_chat_engine():
+    chat_engine = ChatEngine(
+        model_dir=CHAT_SETTINGS.get("model_dir"),
+        max_batch_size=CHAT_SETTINGS.get("max_batch_size", 8),
+        max_wait_ms=CHAT_SETTINGS.get("max_wait_ms", 10),
+        request_timeout=CHAT_SETTINGS.get("request_timeout", 30),
+        prefix_cache=CHAT_SETTINGS.get("prefix_cache", True),
+        decoding=CHAT_SETTINGS.get("decoding", "structured"),
+        routing_mode=CHAT_SETTINGS.get("routing_mode", "generate"),
+        score_temperature=CHAT_SETTINGS.get("score_temperature", 1.0),
+        deterministic=CHAT_SETTINGS.get("deterministic", False),
+        backend=CHAT_SETTINGS.get("backend", "eager"),
+        onnx_dir=CHAT_SETTINGS.get("onnx_dir"),
+        dtype=CHAT_SETTINGS.get("dtype"),
+        adapters=CHAT_SETTINGS.get("adapters"),
+    )
+    for engine_name, prefix in prompt_store.prefixes().items():
+        chat_engine.set_prompt_prefix(engine_name, prefix)
+    if routing_cache is not None and not chat_engine.is_deterministic("thalamus"):
+        logger.warning("Routing cache only serves score mode: set chat.deterministic to cache generated routes")
+    return chat_engine
+
+def _warm_up_chat_engine(chat_engine):
+    # One thalamus route and one ACC evaluation, through the batcher like real traffic.
+    event = json.dumps({"sensor": "chat", "input_type": "text", "input_data": "What is 12 + 30?"})
+    chat_engine.generate_reply(PromptStore.build_suffix(event), engine="thalamus")
+    acc_input, _ = build_acc_input({"region": "prefrontal_cortex", "schema": "problem_solving", "message": event})
+    chat_engine.generate_reply(PromptStore.build_suffix(json.dumps(acc_input)), engine="acc")
+    if chat_engine.routing_mode != "score":
+        chat_engine.generate_reply(PromptStore.build_suffix(event), engine="thalamus", mode="score")
+
+def _load_sight_engine():
+    return SightEngine(
+        model_name=SIGHT_SETTINGS.get("model_name", "nlpconnect/vit-gpt2-image-captioning"),
+        max_batch_size=SIGHT_SETTINGS.get("max_batch_size", 8),
+        max_wait_ms=SIGHT_SETTINGS.get("max_wait_ms", 10),
+        request_timeout=SIGHT_SETTINGS.get("request_timeout", 60),
+        max_length=SIGHT_SETTINGS.get("max_length", 16),
+        num_beams=SIGHT_SETTINGS.get("num_beams", 4),
+        max_upload_bytes=SIGHT_SETTINGS.get("max_upload_bytes"),
+        max_pixels=SIGHT_SETTINGS.get("max_pixels"),
+        draft=SIGHT_SETTINGS.get("draft", True),
+        backend=SIGHT_SETTINGS.get("backend", "eager"),
+        onnx_dir=SIGHT_SETTINGS.get("onnx_dir"),
+        dtype=SIGHT_SETTINGS.get("dtype"),
+    )
+
+def _warm_up_sight_engine(sight_engine):
+    # Decode and caption a synthetic camera-sized JPEG.
+    buffer = BytesIO()
+    Image.radial_gradient("L").convert("RGB").resize((1280, 720)).save(buffer, format="JPEG")
+    sight_engine.generate_sight(sight_engine.decode_image(buffer.getvalue()))
+
+enabled_engines = MODEL_SETTINGS.get("enabled", {})
+models = ModelManager(
+    lazy=MODEL_SETTINGS.get("loading", "eager") == "lazy",
+    warmup=MODEL_SETTINGS.get("warmup", True),
+    retry_after=MODEL_SETTINGS.get("retry_after", 5),
+)
+models.register("chat", _load_chat_engine, _warm_up_chat_engine, enabled=enabled_engines.get("chat", True))
+models.register("sight", _load_sight_engine, _warm_up_sight_engine, enabled=enabled_engines.get("sight", True))
+
+@asynccontextmanager
+async def lifespan(app):
+    models.start()
+    yield
 
 # Initialize FastAPI
-app = FastAPI()
-
-# Instantiate our engines with error handling
-try:
-    chat_engine = ChatEngine()
-    logger.info("Chat engine initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize chat engine: {e}")
-    raise
-
-try:
-    sight_engine = SightEngine()
-    logger.info("Sight engine initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize sight engine: {e}")
-    raise
+app = FastAPI(lifespan=lifespan)
+
+# Queued engine calls are served by priority class, then in turns per client.
+priority_policy = PriorityPolicy(
+    classes=SCHEDULING_SETTINGS.get("classes", DEFAULT_CLASSES),
+    default_class=SCHEDULING_SETTINGS.get("default_class", "normal"),
+    rules=SCHEDULING_SETTINGS.get("rules", []),
+)
+CLIENT_HEADER = SCHEDULING_SETTINGS.get("client_header", "X-Client-ID")
+DEADLINE_HEADER = SCHEDULING_SETTINGS.get("deadline_header", "X-Deadline-Ms")
+
+# Engine calls run on per-engine worker pools so a slow caption never blocks
+# the event loop or cheap thalamus routing calls.
+def _make_pool(name):
+    pool_settings = EXECUTOR_SETTINGS.get(name, {})
+    return InferencePool(
+        name,
+        max_concurrency=pool_settings.get("max_concurrency", 1),
+        max_queue=pool_settings.get("max_queue", 16),
+        retry_after=EXECUTOR_SETTINGS.get("retry_after", 1),
+        disconnect_poll_ms=EXECUTOR_SETTINGS.get("disconnect_poll_ms", 100),
+        policy=priority_policy,
+    )
+
+chat_pool = _make_pool("chat")
+sight_pool = _make_pool("sight")
+
+@app.exception_handler(PoolFullError)
+async def pool_full_handler(request: Request, exc: PoolFullError):
+    logger.warning(f"Rejecting request: {exc}")
+    return JSONResponse(
+        {"error": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(EngineUnavailable)
+async def engine_unavailable_handler(request: Request, exc: EngineUnavailable):
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse({"error": str(exc)}, status_code=503, headers=headers)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    logger.info(f"Dropping request: {exc}")
+    return JSONResponse({"error": str(exc)}, status_code=504)
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening any more; 499 mirrors the nginx convention for logs.
+    return Response(status_code=499)
+
+def _client_id(connection):
+    # Fair sharing is per client: an explicit ID header, else the peer address.
+    return connection.headers.get(CLIENT_HEADER) or (connection.client.host if connection.client else None)
+
+def _deadline_budget(connection):
+    """Seconds the client is willing to wait (the deadline header, in ms), or None."""
+    budget = connection.headers.get(DEADLINE_HEADER)
+    return float(budget) / 1000.0 if budget is not None else None
+
+def _ticket(request, priority):
+    """Scheduling ticket for an HTTP request in the given priority class."""
+    try:
+        budget = _deadline_budget(request)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{DEADLINE_HEADER} must be a number of milliseconds")
+    deadline = time.monotonic() + budget if budget is not None else None
+    return Ticket(priority, client=_client_id(request), deadline=deadline)
+
+def _chat_attributes(model, user_prompt):
+    """Priority rule attributes of a chat request: the model and any sensor, region and schema in it."""
+    attributes = {"model": model}
+    try:
+        content = json.loads(user_prompt)
+        if model == "hf/acc" and isinstance(content, dict):
+            # ACC input is a thalamus result carrying the original event as "message".
+            attributes.update(region=content.get("region"), schema=content.get("schema"))
+            content = json.loads(content.get("message") or "{}")
+    except (json.JSONDecodeError, TypeError):
+        return attributes
+    if isinstance(content, dict):
+        attributes["sensor"] = content.get("sensor")
+    return attributes
+
+def _user_prompt(messages):
+    """Join the message contents into the prompt; raises HTTPException for malformed messages."""
+    if not isinstance(messages, list) or not all(
+        isinstance(msg, dict) and isinstance(msg.get("content", ""), str) for msg in messages
+    ):
+        raise HTTPException(status_code=400, detail="Expected messages to be a list of objects with string content")
+    return " ".join(msg.get("content", "") for msg in messages)
+
+def _parse_acc_request(user_prompt):
+    """Parse the thalamus JSON of an ACC request; returns ``(thalamus_data, acc_input, input_data)``."""
+    try:
+        thalamus_data = json.loads(user_prompt)
+        if not isinstance(thalamus_data, dict):
+            raise ValueError("Thalamus output must be a JSON object")
+        acc_input, input_data = build_acc_input(thalamus_data)
+    except (ValueError, TypeError, AttributeError):
+        # JSONDecodeError is a ValueError; the others come from a malformed nested message.
+        raise HTTPException(status_code=400, detail="ACC requires valid Thalamus JSON output as input")
+    return thalamus_data, acc_input, input_data
+
+def _chat_batch_priority(items):
+    # A batch runs as one pool call, so it is queued in the class of its most urgent item.
+    names = []
+    for item in items:
+        try:
+            user_prompt = " ".join(msg.get("content", "") for msg in item.get("messages") or [])
+            names.append(priority_policy.classify(**_chat_attributes(item.get("model"), user_prompt)))
+        except (AttributeError, TypeError):
+            continue  # malformed items are rejected individually later
+    return priority_policy.most_urgent(names)
+
+def _refresh_prompt_prefixes(chat_engine):
+    # Cheap mtime check; prefixes (and their KV caches) are only rebuilt after an edit.
+    def rebuild(prefixes):
+        for engine_name, prefix in prefixes.items():
+            chat_engine.set_prompt_prefix(engine_name, prefix)
+
+    if prompt_store.reload_if_changed(on_reload=rebuild):
+        logger.info(f"prompts.yaml changed, rebuilt prompt prefixes (version {prompt_store.version})")
+
+def _generate_with_current_prompts(prompt, engine, mode=None):
+    chat_engine = models.get("chat")
+    _refresh_prompt_prefixes(chat_engine)
+    return chat_engine.generate_reply(prompt, engine=engine, mode=mode)
+
+async def _generate_reply(prompt, engine, request=None, mode=None, ticket=None):
+    # The pool worker waits on the micro-batcher, so concurrent requests still
+    # get collected into the same batch.
+    return await chat_pool.run(_generate_with_current_prompts, prompt, engine, mode, request=request, ticket=ticket)
+
+# Thalamus routing results are cached on the normalized sensor event.
+routing_cache = None
+if ROUTING_CACHE_SETTINGS.get("enabled", False):
+    routing_cache = TTLCache(
+        "routing",
+        max_entries=ROUTING_CACHE_SETTINGS.get("max_entries", 4096),
+        ttl_seconds=ROUTING_CACHE_SETTINGS.get("ttl_seconds"),
+        disk_path=ROUTING_CACHE_SETTINGS.get("disk_path"),
+    )
+
+# ACC evaluations go to the model only when the rule scorer is unsure.
+acc_tiers = TieredACC(
+    enabled=ACC_SETTINGS.get("tiered", True),
+    escalation_threshold=ACC_SETTINGS.get("escalation_threshold", 0.7),
+)
+
+def _normalize_text(text):
+    return " ".join(text.lower().split())
+
+def _routing_cache_key(chat_engine, user_prompt, mode):
+    # Sensors resend the same events, so case and whitespace don't split entries.
+    try:
+        event = json.loads(user_prompt)
+        fields = [_normalize_text(str(event.get(key, ""))) for key in ("sensor", "input_type", "input_data")]
+    except (json.JSONDecodeError, AttributeError):
+        fields = [_normalize_text(user_prompt)]
+    return json.dumps([chat_engine.reply_version("thalamus", mode), prompt_store.version, *fields])
+
+def _route_with_cache(prompt, user_prompt, mode):
+    chat_engine = models.get("chat")
+    _refresh_prompt_prefixes(chat_engine)
+    if not chat_engine.is_deterministic("thalamus", mode):
+        return chat_engine.generate_reply(prompt, engine="thalamus", mode=mode)
+    key = _routing_cache_key(chat_engine, user_prompt, mode)
+    # Concurrent identical events share one generation.
+    return routing_cache.get_or_compute(
+        key, lambda: chat_engine.generate_reply(prompt, engine="thalamus", mode=mode)
+    )
+
+async def _route_thalamus(prompt, user_prompt, request=None, mode=None, ticket=None):
+    chat_engine = models.peek("chat")
+    if routing_cache is None or (chat_engine is not None and not chat_engine.is_deterministic("thalamus", mode)):
+        return await _generate_reply(prompt, engine="thalamus", request=request, mode=mode, ticket=ticket)
+    # Memory hits are answered right here without queueing for a pool worker
+    # (there are none before the engine has loaded).
+    if chat_engine is not None:
+        cached = routing_cache.peek(_routing_cache_key(chat_engine, user_prompt, mode))
+        if cached is not None:
+            return cached
+    return await chat_pool.run(_route_with_cache, prompt, user_prompt, mode, request=request, ticket=ticket)
 
 @app.post("/chat/completions")
 async def chat_completions(request: Request):
     try:
         payload = await request.json()
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=400, detail="Expected an object with model and messages")
         model_requested = payload.get("model")
         messages = payload.get("messages", [])
+        # Optional thalamus routing mode: "generate" or "score" (defaults to settings).
+        routing_mode = payload.get("mode")
 
         if not model_requested or not messages:
             raise HTTPException(status_code=400, detail="Missing model or messages")
+        if routing_mode not in (None, *ROUTING_MODES):
+            raise HTTPException(status_code=400, detail=f"Unknown mode: {routing_mode}")
 
         # Construct user's prompt from messages
-        user_prompt = " ".join([msg.get("content", "") for msg in messages])
+        user_prompt = _user_prompt(messages)
         logger.info(f"Processing request for model: {model_requested}")
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON in request body")
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    ticket = _ticket(request, priority_policy.classify(**_chat_attributes(model_requested, user_prompt)))
+    if payload.get("stream"):
+        # Checked up front so these still get a plain 400/503 instead of an error event.
+        if model_requested == "hf/acc":
+            _parse_acc_request(user_prompt)
+        models.check("chat")
+        return _stream_results(
+            chat_pool, _run_chat_stream, payload, encode=_sse_event, media_type="text/event-stream", done=SSE_DONE,
+            ticket=ticket,
+        )
+
     # Split prompt composition based on requested model
     if model_requested == "hf/thalamus":
-        combined_prompt = (
-            THALAMUS_MAIN_SYSTEM_PROMPT
-            + "\n\n"
-            + THALAMUS_REGION_KEY_PROMPT
-            + "\n\n"
-            + THALAMUS_SCHEMA_KEY_PROMPT
-            + "\n\n"
-            + THALAMUS_EXAMPLE_PROMPT
-            + "\n\nInput:\n"
-            + user_prompt
-            + "\nOutput:"
-        )
+        # Only the input tail is sent; the static prefix is cached by the engine.
+        thalamus_prompt = PromptStore.build_suffix(user_prompt)
         try:
             # Now call our ChatEngine with engine="thalamus"
-            reply = chat_engine.generate_reply(combined_prompt, engine="thalamus")
-            logger.info(f"Thalamus raw response: {reply}")
+            reply = await _route_thalamus(
+                thalamus_prompt, user_prompt, request=request, mode=routing_mode, ticket=ticket
+            )
+            logger.debug(f"Thalamus raw response: {reply}")
             
             # Validate and enhance the Thalamus output for ACC compatibility
-            match = re.search(r'\{.*?\}', reply)
-            if match:
-                thalamus_json = match.group(0)
-                try:
-                    # Parse and enhance the Thalamus output to include original message
-                    thalamus_data = json.loads(thalamus_json)
-                    # Validate required fields
-                    if "region" not in thalamus_data or "schema" not in thalamus_data:
-                        raise HTTPException(status_code=500, detail="Thalamus response missing required fields")
-                    # Add the original message for ACC processing
-                    thalamus_data["message"] = user_prompt
-                    reply = json.dumps(thalamus_data)
-                    logger.info(f"Enhanced Thalamus response: {reply}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse Thalamus JSON: {e}")
-                    raise HTTPException(status_code=500, detail="Invalid JSON from Thalamus model")
-            else:
-                logger.error(f"No JSON found in Thalamus response: {reply}")
-                raise HTTPException(status_code=500, detail="Invalid response from Thalamus model")
+            thalamus_data = parse_thalamus_reply(reply, user_prompt)
+            reply = json.dumps(thalamus_data)
+            logger.debug(f"Enhanced Thalamus response: {reply}")
+        except (PoolFullError, ClientDisconnected, EngineUnavailable, DeadlineExceeded):
+            raise
+        except TimeoutError:
+            logger.error("Thalamus request timed out waiting for its batch")
+            raise HTTPException(status_code=504, detail="Thalamus request timed out")
         except Exception as e:
             logger.error(f"Error in Thalamus processing: {e}")
             raise HTTPException(status_code=500, detail=f"Thalamus processing error: {str(e)}")
 
     elif model_requested == "hf/acc":
         # ACC expects enhanced input with perception and message fields
-        try:
-            thalamus_data = json.loads(user_prompt)
-            # Extract original input data to create perception
-            original_message = json.loads(thalamus_data.get("message", "{}"))
-            input_data = original_message.get("input_data", "Unknown input")
-            
-            # Create enhanced input for ACC with perception field
-            acc_input = {
-                "region": thalamus_data.get("region", ""),
-                "schema": thalamus_data.get("schema", ""),
-                "perception": f"Analyzed: {input_data}",
-                "message": thalamus_data.get("message", "{}")
-            }
-            
-            combined_prompt = (
-                ACC_MAIN_SYSTEM_PROMPT
-                + "\n\n"
-                + ACC_PASS_DOUBT_KEY_PROMPT
-                + "\n\n"
-                + ACC_THRESHOLD_SCORE_KEY_PROMPT
-                + "\n\n"
-                + ACC_FEELINGS_KEY_PROMPT
-                + "\n\n"
-                + ACC_SIGNIFICANCE_PROMPT
-                + "\n\n"
-                + ACC_EXAMPLE_PROMPT
-                + "\n\nInput:\n"
-                + json.dumps(acc_input)
-                + "\nOutput:"
-            )
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="ACC requires valid Thalamus JSON output as input")
-        
-        try:
-            reply = chat_engine.generate_reply(combined_prompt, engine="acc")
-            logger.info(f"ACC raw response: {reply}")
-            
-            match = re.search(r'\{.*?\}', reply)
-            if match:
-                acc_json = match.group(0)
-                # Validate ACC JSON
-                try:
-                    acc_data = json.loads(acc_json)
-                    required_fields = ["pass_doubt", "threshold_score", "feelings", "significance"]
-                    missing_fields = [field for field in required_fields if field not in acc_data]
-                    if missing_fields:
-                        logger.warning(f"ACC response missing fields: {missing_fields}")
-                        # Use fallback when required fields are missing
-                        reply = _generate_fallback_acc_response(thalamus_data, input_data)
-                        logger.info(f"Using fallback ACC response due to missing fields: {reply}")
-                    else:
-                        reply = acc_json
-                        logger.info(f"Valid ACC response: {reply}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse ACC JSON: {e}")
-                    # Fallback to structured response
-                    reply = _generate_fallback_acc_response(thalamus_data, input_data)
-                    logger.info(f"Using fallback ACC response: {reply}")
-            else:
-                logger.error(f"No JSON found in ACC response: {reply}")
+        thalamus_data, acc_input, input_data = _parse_acc_request(user_prompt)
+        acc_prompt = PromptStore.build_suffix(json.dumps(acc_input))
+
+        # Unambiguous events are answered by the rule scorer without running the model.
+        rules_result, escalate = acc_tiers.triage(thalamus_data, input_data)
+        if not escalate:
+            reply = json.dumps(rules_result)
+        else:
+            try:
+                reply = await _generate_reply(acc_prompt, engine="acc", request=request, ticket=ticket)
+                logger.debug(f"ACC raw response: {reply}")
+                reply = json.dumps(parse_acc_reply(reply, thalamus_data, input_data, rules_result))
+            except (PoolFullError, ClientDisconnected, EngineUnavailable, DeadlineExceeded):
+                raise
+            except Exception as e:
+                logger.error(f"Error in ACC processing: {e}")
                 # Fallback to structured response
-                reply = _generate_fallback_acc_response(thalamus_data, input_data)
-                logger.info(f"Using fallback ACC response: {reply}")
-        except Exception as e:
-            logger.error(f"Error in ACC processing: {e}")
-            # Fallback to structured response
-            reply = _generate_fallback_acc_response(thalamus_data, input_data)
-            logger.info(f"Using fallback ACC response due to error: {reply}")
+                reply = json.dumps(generate_fallback_acc_response(thalamus_data, input_data))
+                logger.info(f"Using fallback ACC response due to error: {reply}")
 
     else:
         # Fallback to a default chat engine behavior
-        reply = chat_engine.generate_reply(user_prompt)
+        reply = await _generate_reply(user_prompt, engine="default", request=request, ticket=ticket)
 
     response = {"choices": [{"message": {"content": reply}}]}
     return JSONResponse(response)
 
+def _run_pipeline(events, mode=None):
+    """Route events through thalamus and then ACC, batching each stage across all events."""
+    chat_engine = models.get("chat")
+    _refresh_prompt_prefixes(chat_engine)
+    lookup = store = None
+    if routing_cache is not None and chat_engine.is_deterministic("thalamus", mode):
+        lookup = lambda user_prompt: routing_cache.peek(_routing_cache_key(chat_engine, user_prompt, mode))
+        store = lambda user_prompt, reply: routing_cache.put(_routing_cache_key(chat_engine, user_prompt, mode), reply)
+    return run_pipeline(
+        chat_engine, events, mode, lookup=lookup, store=store, timeout=chat_engine.request_timeout, acc_tiers=acc_tiers
+    )
+
+@app.post("/pipeline")
+async def pipeline(request: Request):
+    """Thalamus routing and ACC evaluation for one or more sensor events in a single request."""
+    try:
+        payload = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Expected a sensor event or a non-empty list of events")
+    # Either {"events": [...]} or a single {"sensor", "input_type", "input_data"} event.
+    events = payload.get("events") if "events" in payload else [payload]
+    routing_mode = payload.get("mode")
+    if not isinstance(events, list) or not events or not all(isinstance(event, dict) for event in events):
+        raise HTTPException(status_code=400, detail="Expected a sensor event or a non-empty list of events")
+    max_events = PIPELINE_SETTINGS.get("max_events", 64)
+    if len(events) > max_events:
+        raise HTTPException(status_code=413, detail=f"At most {max_events} events per request")
+    if routing_mode not in (None, *ROUTING_MODES):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {routing_mode}")
+
+    priority = priority_policy.most_urgent(
+        priority_policy.classify(model="pipeline", sensor=event.get("sensor")) for event in events
+    )
+    ticket = _ticket(request, priority)
+    results = await chat_pool.run(_run_pipeline, events, routing_mode, request=request, ticket=ticket)
+    return JSONResponse({"results": results})
+
+# Captions are cached on the exact upload bytes and on a perceptual hash, so
+# repeated or near-identical frames from fixed cameras skip the model.
+caption_cache = None
+if CAPTION_CACHE_SETTINGS.get("enabled", False):
+    caption_cache = CaptionCache(
+        caption_version(
+            SIGHT_SETTINGS.get("model_name", "nlpconnect/vit-gpt2-image-captioning"),
+            SIGHT_SETTINGS.get("max_length", 16),
+            SIGHT_SETTINGS.get("num_beams", 4),
+            SIGHT_SETTINGS.get("draft", True),
+            SIGHT_SETTINGS.get("backend", "eager"),
+            SIGHT_SETTINGS.get("dtype"),
+        ),
+        max_entries=CAPTION_CACHE_SETTINGS.get("max_entries", 4096),
+        ttl_seconds=CAPTION_CACHE_SETTINGS.get("ttl_seconds"),
+        disk_path=CAPTION_CACHE_SETTINGS.get("disk_path"),
+        max_distance=CAPTION_CACHE_SETTINGS.get("max_distance", 4),
+    )
+
+def _caption_upload(contents):
+    # Decoding runs on the sight pool, off the event loop; the caption is batched
+    # with other requests' images by the sight engine.
+    sight_engine = models.get("sight")
+    if caption_cache is None:
+        return sight_engine.generate_sight(sight_engine.decode_image(contents))
+    return caption_cache.get_or_caption(contents, sight_engine.decode_image, sight_engine.generate_sight)
+
+def _check_upload_size(upload: UploadFile):
+    # The upload is already spooled by the form parser; refuse it before reading it into memory.
+    max_bytes = SIGHT_SETTINGS.get("max_upload_bytes")
+    if max_bytes and upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload is {upload.size} bytes, limit is {max_bytes}")
+
 @app.post("/sight/")
-async def sight_image(file: UploadFile = File(...)):
+async def sight_image(request: Request, file: UploadFile = File(...)):
+    _check_upload_size(file)
     try:
         contents = await file.read()
-        image = Image.open(BytesIO(contents)).convert("RGB")
-        image.thumbnail((640, 640))
-        sight_description = sight_engine.generate_sight(image)
+        ticket = _ticket(request, priority_policy.classify(model="sight"))
+        sight_description = await sight_pool.run(_caption_upload, contents, request=request, ticket=ticket)
         return JSONResponse({"sight": sight_description})
+    except (PoolFullError, ClientDisconnected, EngineUnavailable, DeadlineExceeded):
+        raise
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+def _check_batch_request(request: Request):
+    # Oversized bodies are rejected from the header, before anything is read or parsed.
+    max_bytes = BATCH_SETTINGS.get("max_payload_bytes", 25 * 1024 * 1024)
+    try:
+        content_length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if content_length > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Batch requests are limited to {max_bytes} bytes")
+
+def _check_batch_size(count):
+    max_items = BATCH_SETTINGS.get("max_items", 64)
+    if count > max_items:
+        raise HTTPException(status_code=413, detail=f"At most {max_items} items per batch")
+
+def _emit(results, index, result, on_result=None):
+    results[index] = {"index": index, **result}
+    if on_result is not None:
+        on_result(results[index])
+
+def _item_error(exc: HTTPException):
+    return {"error": exc.detail, "status": exc.status_code}
+
+def _finished_future(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def _start_chat_item(chat_engine, item, default_mode=None, on_token=None):
+    """Validate one /chat/completions/batch item and queue its generation.
+
+    Returns ``(future, finish)`` where ``finish(future)`` turns the finished
+    generation into the reply content. Raises HTTPException for a bad item.
+    ``on_token`` receives the raw reply text as it is generated.
+    """
+    if not isinstance(item, dict):
+        raise HTTPException(status_code=400, detail="Expected an object with model and messages")
+    model_requested = item.get("model")
+    messages = item.get("messages", [])
+    routing_mode = item.get("mode", default_mode)
+    if not model_requested or not messages:
+        raise HTTPException(status_code=400, detail="Missing model or messages")
+    if routing_mode not in (None, *ROUTING_MODES):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {routing_mode}")
+    user_prompt = _user_prompt(messages)
+
+    if model_requested == "hf/thalamus":
+        cache_key = None
+        if routing_cache is not None and chat_engine.is_deterministic("thalamus", routing_mode):
+            cache_key = _routing_cache_key(chat_engine, user_prompt, routing_mode)
+        cached = routing_cache.peek(cache_key) if cache_key else None
+        if cached is not None:
+            future = _finished_future(cached)
+        else:
+            future = chat_engine.submit_reply(
+                PromptStore.build_suffix(user_prompt), engine="thalamus", mode=routing_mode, on_token=on_token
+            )
+
+        def finish(future):
+            try:
+                reply = future.result()
+                if cache_key and cached is None:
+                    routing_cache.put(cache_key, reply)
+                return json.dumps(parse_thalamus_reply(reply, user_prompt))
+            except TimeoutError:
+                raise HTTPException(status_code=504, detail="Thalamus request timed out")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Thalamus processing error: {str(e)}")
+        return future, finish
+
+    if model_requested == "hf/acc":
+        thalamus_data, acc_input, input_data = _parse_acc_request(user_prompt)
+        rules_result, escalate = acc_tiers.triage(thalamus_data, input_data)
+        if not escalate:
+            return _finished_future(json.dumps(rules_result)), lambda future: future.result()
+        future = chat_engine.submit_reply(
+            PromptStore.build_suffix(json.dumps(acc_input)), engine="acc", on_token=on_token
+        )
+
+        def finish(future):
+            try:
+                return json.dumps(parse_acc_reply(future.result(), thalamus_data, input_data, rules_result))
+            except Exception as e:
+                logger.error(f"Error in ACC processing: {e}")
+                return json.dumps(generate_fallback_acc_response(thalamus_data, input_data))
+        return future, finish
+
+    return chat_engine.submit_reply(user_prompt, engine="default"), lambda future: future.result()
+
+def _run_chat_batch(items, mode=None, on_result=None):
+    """Run a /chat/completions/batch request; results are returned in input order."""
+    chat_engine = models.get("chat")
+    _refresh_prompt_prefixes(chat_engine)
+    results = [None] * len(items)
+    # Every item is queued before any is awaited so thalamus and ACC prompts share batches.
+    finishers = {}
+    for index, item in enumerate(items):
+        try:
+            future, finish = _start_chat_item(chat_engine, item, mode)
+        except HTTPException as e:
+            _emit(results, index, _item_error(e), on_result)
+            continue
+        finishers[future] = (index, finish)
+    # Finish items in completion order so streamed results go out as soon as they are ready.
+    for future in as_completed(finishers):
+        index, finish = finishers[future]
+        try:
+            _emit(results, index, {"choices": [{"message": {"content": finish(future)}}]}, on_result)
+        except HTTPException as e:
+            _emit(results, index, _item_error(e), on_result)
+    return results
+
+def _caption_uploads(uploads, on_result=None):
+    """Caption a batch of (filename, bytes) uploads; undecodable images fail individually."""
+    sight_engine = models.get("sight")
+    results = [None] * len(uploads)
+    # Images go through the sight batcher, so they share batches with /sight/ traffic
+    # and stream back one batch at a time. Cached captions are sent right away.
+    pending = {}
+    cache_keys = {}
+    for index, (filename, contents) in enumerate(uploads):
+        try:
+            if caption_cache is None:
+                pending[sight_engine.submit_sight(sight_engine.decode_image(contents))] = index
+                continue
+            key = caption_cache.key(contents)
+            caption = caption_cache.get_exact(key)
+            if caption is None:
+                image = sight_engine.decode_image(contents)
+                phash, caption = caption_cache.get_near(image)
+            if caption is not None:
+                _emit(results, index, {"filename": filename, "sight": caption}, on_result)
+                continue
+            future = sight_engine.submit_sight(image)
+            pending[future] = index
+            cache_keys[future] = (key, phash)
+        except ImageTooLargeError as e:
+            _emit(results, index, {"filename": filename, "error": str(e), "status": 413}, on_result)
+        except Exception as e:
+            _emit(results, index, {"filename": filename, "error": f"Invalid image: {e}", "status": 400}, on_result)
+    for future in as_completed(pending):
+        index = pending[future]
+        filename = uploads[index][0]
+        try:
+            caption = future.result()
+            if future in cache_keys:
+                CAPTION_SOURCES.inc(source="model")
+                caption_cache.put(*cache_keys[future], caption)
+            _emit(results, index, {"filename": filename, "sight": caption}, on_result)
+        except Exception as e:
+            logger.error(f"Captioning {filename} failed: {e}")
+            _emit(results, index, {"filename": filename, "error": str(e), "status": 500}, on_result)
+    return results
+
+def _ndjson_line(result):
+    return json.dumps(result) + "\n"
+
+def _sse_event(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+# OpenAI-style end-of-stream marker.
+SSE_DONE = "data: [DONE]\n\n"
+
+def _stream_results(pool, fn, *args, encode=_ndjson_line, media_type="application/x-ndjson", done=None, ticket=None):
+    """Run ``fn(*args, on_result=...)`` on a pool and stream each result (NDJSON lines by default).
+
+    ``done`` is sent after the last result, e.g. the SSE ``[DONE]`` marker.
+    """
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue()
+    # Submitted up front so a full pool is still a plain 503 rather than a broken stream.
+    future = pool.submit(
+        fn, *args, ticket=ticket, on_result=lambda result: loop.call_soon_threadsafe(results.put_nowait, result)
+    )
+    waiter = asyncio.wrap_future(future)
+    waiter.add_done_callback(lambda _: results.put_nowait(None))
+
+    async def lines():
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                yield encode(result)
+            try:
+                waiter.result()
+            except Exception as e:
+                logger.error(f"Result stream failed: {e}")
+                yield encode({"error": str(e)})
+            if done is not None:
+                yield done
+        finally:
+            # Drops the work if the client went away before it started.
+            future.cancel()
+
+    return StreamingResponse(lines(), media_type=media_type)
+
+def _completion_chunk(completion_id, model, delta, finish_reason=None, **extra):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        **extra,
+    }
+
+def _run_chat_stream(item, on_result=None):
+    """Run a streamed /chat/completions request, emitting OpenAI-style completion chunks.
+
+    Content deltas carry the raw model text as it is generated. The last chunk has
+    ``finish_reason`` "stop" and the validated, enhanced reply in ``result`` (or
+    "error" and an ``error`` object), the same content a non-streamed request returns.
+    """
+    chat_engine = models.get("chat")
+    _refresh_prompt_prefixes(chat_engine)
+    model_requested = item["model"]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    streamed = False
+
+    def on_token(text):
+        nonlocal streamed
+        streamed = True
+        on_result(_completion_chunk(completion_id, model_requested, {"content": text}))
+
+    on_result(_completion_chunk(completion_id, model_requested, {"role": "assistant"}))
+    try:
+        future, finish = _start_chat_item(chat_engine, item, on_token=on_token)
+        content = finish(future)
+    except HTTPException as e:
+        error = {"message": e.detail, "status": e.status_code}
+        on_result(_completion_chunk(completion_id, model_requested, {}, "error", error=error))
+        return
+    if not streamed:
+        # Cached routes, score mode and the default engine answer all at once.
+        on_result(_completion_chunk(completion_id, model_requested, {"content": content}))
+    result = json.loads(content) if model_requested in ("hf/thalamus", "hf/acc") else content
+    on_result(_completion_chunk(completion_id, model_requested, {}, "stop", result=result))
+
+@app.post("/chat/completions/batch")
+async def chat_completions_batch(request: Request):
+    """Many thalamus/ACC/default requests in one call, with per-item results and errors.
+
+    Body: ``{"requests": [{"model", "messages", "mode"?}, ...], "mode"?, "stream"?}``.
+    With ``"stream": true`` results are sent as NDJSON lines as each item finishes.
+    """
+    _check_batch_request(request)
+    try:
+        payload = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Expected a non-empty list of requests")
+    _check_batch_size(len(items))
+    routing_mode = payload.get("mode")
+    if routing_mode not in (None, *ROUTING_MODES):
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {routing_mode}")
+
+    ticket = _ticket(request, _chat_batch_priority(items))
+    if payload.get("stream"):
+        return _stream_results(chat_pool, _run_chat_batch, items, routing_mode, ticket=ticket)
+    results = await chat_pool.run(_run_chat_batch, items, routing_mode, request=request, ticket=ticket)
+    return JSONResponse({"results": results})
+
+@app.post("/sight/batch")
+async def sight_batch(request: Request):
+    """Caption several images (multipart ``files`` fields) in one call.
+
+    Pass ``?stream=true`` to get NDJSON lines as results become ready.
+    """
+    _check_batch_request(request)
+    max_items = BATCH_SETTINGS.get("max_items", 64)
+    form = await request.form(max_files=max_items + 1)
+    files = form.getlist("files")
+    if not files or not all(hasattr(upload, "read") for upload in files):
+        raise HTTPException(status_code=400, detail="Expected one or more image files in 'files'")
+    _check_batch_size(len(files))
+    uploads = [(upload.filename, await upload.read()) for upload in files]
+
+    ticket = _ticket(request, priority_policy.classify(model="sight"))
+    if request.query_params.get("stream", "").lower() in ("1", "true"):
+        return _stream_results(sight_pool, _caption_uploads, uploads, ticket=ticket)
+    results = await sight_pool.run(_caption_uploads, uploads, request=request, ticket=ticket)
+    return JSONResponse({"results": results})
+
+# Stats for the frame streams currently connected to /sight/stream.
+active_streams = {}
+
+def _stream_frame_features(detector, contents):
+    thumbnail = detector.thumbnail(contents)
+    return thumbnail, detector.motion(thumbnail)
+
+async def _process_stream_frame(detector, stats, index, contents, ticket=None):
+    try:
+        # The cheap change check runs first; only changed frames reach the captioner.
+        thumbnail, motion = await sight_pool.run(_stream_frame_features, detector, contents, ticket=ticket)
+        if not detector.should_caption(motion):
+            stats.record("skipped")
+            return {"frame": index, "motion": round(motion, 4), "captioned": False}
+        start = time.perf_counter()
+        caption = await sight_pool.run(_caption_upload, contents, ticket=ticket)
+        latency = time.perf_counter() - start
+    except Exception as e:
+        # A full pool or a bad frame costs this frame only; the stream continues.
+        stats.record("error")
+        return {"frame": index, "error": str(e)}
+    detector.update(thumbnail)
+    stats.record("captioned", latency)
+    return {
+        "frame": index,
+        "motion": round(motion, 4),
+        "captioned": True,
+        "sight": caption,
+        "latency_ms": round(1000 * latency, 2),
+    }
+
+@app.websocket("/sight/stream")
+async def sight_stream(websocket: WebSocket):
+    """Caption a continuous frame sequence, skipping frames that barely changed.
+
+    Send each frame as a binary message; every frame gets a JSON reply with its
+    motion score and, if it was captioned, the caption. Send the text "stats"
+    for this stream's counters. Query parameters ``camera``, ``threshold`` and
+    ``max_interval`` override the sight_stream settings for this stream.
+    """
+    await websocket.accept()
+    params = websocket.query_params
+    camera = params.get("camera", "default")
+    try:
+        detector = ChangeDetector(
+            threshold=float(params.get("threshold", SIGHT_STREAM_SETTINGS.get("motion_threshold", 0.05))),
+            max_interval=float(params.get("max_interval", SIGHT_STREAM_SETTINGS.get("max_interval", 10))),
+            grid_size=SIGHT_STREAM_SETTINGS.get("grid_size", 32),
+            # The captioner's limits, checked before the frame is decoded for the change check.
+            max_upload_bytes=SIGHT_SETTINGS.get("max_upload_bytes"),
+            max_pixels=SIGHT_SETTINGS.get("max_pixels"),
+        )
+        # With a deadline header, each frame gets that long before it is dropped as stale.
+        frame_budget = _deadline_budget(websocket)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    stats = StreamStats(camera, detector)
+    priority = priority_policy.classify(model="sight", sensor="camera")
+    stream_id = id(stats)
+    active_streams[stream_id] = stats
+    logger.info(f"Frame stream opened for camera {camera}")
+    try:
+        index = 0
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") == "stats":
+                await websocket.send_json({"stats": stats.snapshot()})
+                continue
+            if message.get("bytes") is None:
+                await websocket.send_json({"error": "Send frames as binary messages or 'stats'"})
+                continue
+            deadline = time.monotonic() + frame_budget if frame_budget is not None else None
+            ticket = Ticket(priority, client=_client_id(websocket), deadline=deadline)
+            await websocket.send_json(await _process_stream_frame(detector, stats, index, message["bytes"], ticket))
+            index += 1
+    except WebSocketDisconnect:
+        pass
+    finally:
+        del active_streams[stream_id]
+        logger.info(f"Frame stream closed: {stats.snapshot()}")
+
+@app.get("/sight/streams")
+async def sight_streams():
+    """Skip ratio and caption latency for each connected frame stream."""
+    return JSONResponse({"streams": [stats.snapshot() for stats in active_streams.values()]})
+
+@app.get("/health/live")
+async def health_live():
+    # The process is up and serving; models may still be loading.
+    return JSONResponse({"status": "ok"})
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once every enabled engine is loaded and warmed up, else 503; includes per-engine status."""
+    ready = models.ready
+    return JSONResponse(
+        {"status": "ready" if ready else "not_ready", "engines": models.status()},
+        status_code=200 if ready else 503,
+    )
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus text format
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
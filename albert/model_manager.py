@@ -0,0 +1,163 @@
+# model_manager.py
+
+import logging
+import threading
+import time
+
+from metrics import gauge
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOAD_SECONDS = gauge("albert_model_load_seconds", "Time taken to load each engine's model", ["engine"])
+MODEL_WARMUP_SECONDS = gauge("albert_model_warmup_seconds", "Time taken by each engine's warm-up pass", ["engine"])
+MODEL_READY = gauge("albert_model_ready", "1 when the engine is loaded and warmed up", ["engine"])
+
+# Engine lifecycle states.
+DISABLED = "disabled"
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class EngineUnavailable(Exception):
+    """Raised when an engine is disabled, failed to load, or is still loading."""
+
+    def __init__(self, name, reason, retry_after=None):
+        super().__init__(f"{name} engine is {reason}")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ManagedEngine:
+    def __init__(self, name, factory, warmup=None, enabled=True):
+        self.name = name
+        self.factory = factory
+        self.warmup = warmup
+        self.state = NOT_LOADED if enabled else DISABLED
+        self.engine = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.lock = threading.Lock()
+        self.loaded = threading.Event()
+
+    def status(self):
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+class ModelManager:
+    """Owns engine construction: eager parallel or lazy loading, warm-up and readiness.
+
+    Engines are registered with a factory (and optional warm-up function) and
+    built either all at once on background threads by ``start()``, or on first
+    ``get()`` when ``lazy`` is set. Nothing is loaded at import or registration time.
+    """
+
+    def __init__(self, lazy=False, warmup=True, retry_after=5):
+        self.lazy = lazy
+        self.run_warmup = warmup
+        self.retry_after = retry_after
+        self._engines = {}
+
+    def register(self, name, factory, warmup=None, enabled=True):
+        self._engines[name] = _ManagedEngine(name, factory, warmup, enabled)
+        MODEL_READY.set(0, engine=name)
+
+    def enabled(self, name):
+        return name in self._engines and self._engines[name].state != DISABLED
+
+    def start(self):
+        """Begin loading every enabled engine in parallel, unless loading is lazy."""
+        if self.lazy:
+            return
+        for managed in self._engines.values():
+            if managed.state == NOT_LOADED:
+                threading.Thread(target=self._load, args=(managed,), name=f"load-{managed.name}", daemon=True).start()
+
+    def _load(self, managed):
+        with managed.lock:
+            if managed.state != NOT_LOADED:
+                return
+            managed.state = LOADING
+            logger.info(f"Loading {managed.name} engine")
+            try:
+                start = time.perf_counter()
+                engine = managed.factory()
+                managed.load_seconds = round(time.perf_counter() - start, 3)
+                MODEL_LOAD_SECONDS.set(managed.load_seconds, engine=managed.name)
+                if managed.warmup is not None and self.run_warmup:
+                    managed.state = WARMING
+                    start = time.perf_counter()
+                    managed.warmup(engine)
+                    managed.warmup_seconds = round(time.perf_counter() - start, 3)
+                    MODEL_WARMUP_SECONDS.set(managed.warmup_seconds, engine=managed.name)
+            except Exception as e:
+                managed.state = FAILED
+                managed.error = str(e)
+                logger.error(f"Failed to initialize {managed.name} engine: {e}")
+            else:
+                managed.engine = engine
+                managed.state = READY
+                MODEL_READY.set(1, engine=managed.name)
+                logger.info(
+                    f"{managed.name} engine ready (load {managed.load_seconds}s, warm-up {managed.warmup_seconds}s)"
+                )
+            finally:
+                managed.loaded.set()
+
+    def get(self, name, timeout=None):
+        """Return a ready engine, loading it first if nothing has started loading it yet.
+
+        While another thread loads the engine, lazy managers wait for it (up to
+        ``timeout`` seconds) and eager ones fail fast so callers get a 503 during
+        startup. May block on loading, so call it from worker threads, not the event loop.
+        """
+        managed = self._engines.get(name)
+        if managed is None or managed.state == DISABLED:
+            raise EngineUnavailable(name, DISABLED)
+        if managed.state == NOT_LOADED:
+            self._load(managed)
+        if timeout is None and not self.lazy:
+            timeout = 0
+        if not managed.loaded.wait(timeout):
+            raise EngineUnavailable(name, managed.state, self.retry_after)
+        if managed.state != READY:
+            raise EngineUnavailable(name, managed.state)
+        return managed.engine
+
+    def check(self, name):
+        """Raise EngineUnavailable if ``get`` could not serve the engine right now, without loading it."""
+        managed = self._engines.get(name)
+        if managed is None or managed.state == DISABLED:
+            raise EngineUnavailable(name, DISABLED)
+        if managed.state == FAILED:
+            raise EngineUnavailable(name, FAILED)
+        if managed.state != READY and not self.lazy:
+            raise EngineUnavailable(name, managed.state, self.retry_after)
+
+    def peek(self, name):
+        """Return the engine if it is ready, else None, without loading or waiting."""
+        managed = self._engines.get(name)
+        return managed.engine if managed is not None and managed.state == READY else None
+
+    @property
+    def ready(self):
+        """True once every enabled engine is ready (lazy engines count once they can be loaded)."""
+        for managed in self._engines.values():
+            if managed.state in (READY, DISABLED):
+                continue
+            if managed.state == NOT_LOADED and self.lazy:
+                continue
+            return False
+        return True
+
+    def status(self):
+        return {name: managed.status() for name, managed in self._engines.items()}
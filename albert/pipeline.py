@@ -0,0 +1,78 @@
+# pipeline.py
+
+import json
+import logging
+
+from prompt_store import PromptStore
+from processing import (
+    ThalamusOutputError,
+    build_acc_input,
+    generate_fallback_acc_response,
+    parse_acc_reply,
+    parse_thalamus_reply,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def run_pipeline(chat_engine, events, mode=None, lookup=None, store=None, timeout=None, acc_tiers=None):
+    """Route events through thalamus and then ACC, batching each stage across all events.
+
+    Returns one ``{"thalamus", "acc"}`` or ``{"error"}`` dict per event, in order.
+    ``lookup(user_prompt)`` may return an already known thalamus reply and
+    ``store(user_prompt, reply)`` is called with each newly generated one (the
+    server's routing cache). ``timeout`` bounds the wait for each reply.
+    With ``acc_tiers`` (a TieredACC), only events its rule scorer is unsure
+    about are sent to the ACC model.
+    """
+    user_prompts = [json.dumps(event) for event in events]
+    results = [{} for _ in events]
+
+    # Stage 1: thalamus. Every uncached event is queued at once so they share batches.
+    pending = {}
+    replies = {}
+    for index, user_prompt in enumerate(user_prompts):
+        cached = lookup(user_prompt) if lookup is not None else None
+        if cached is not None:
+            replies[index] = cached
+        else:
+            pending[index] = chat_engine.submit_reply(PromptStore.build_suffix(user_prompt), engine="thalamus", mode=mode)
+    for index, future in pending.items():
+        try:
+            replies[index] = future.result(timeout=timeout)
+            if store is not None:
+                store(user_prompts[index], replies[index])
+        except Exception as e:
+            logger.error(f"Pipeline thalamus error for event {index}: {e}")
+            results[index] = {"error": f"Thalamus processing error: {e}"}
+
+    routed = {}
+    for index, reply in replies.items():
+        try:
+            routed[index] = parse_thalamus_reply(reply, user_prompts[index])
+        except ThalamusOutputError as e:
+            results[index] = {"error": f"Thalamus processing error: {e}"}
+
+    # Stage 2: ACC on the in-memory thalamus results, again batched across events.
+    pending = {}
+    rules_results = {}
+    for index, thalamus_data in routed.items():
+        input_data = events[index].get("input_data", "Unknown input")
+        if acc_tiers is not None:
+            rules_results[index], escalate = acc_tiers.triage(thalamus_data, input_data)
+            if not escalate:
+                results[index] = {"thalamus": thalamus_data, "acc": rules_results[index]}
+                continue
+        acc_input, _ = build_acc_input(thalamus_data, input_data)
+        pending[index] = chat_engine.submit_reply(PromptStore.build_suffix(json.dumps(acc_input)), engine="acc")
+    for index, future in pending.items():
+        thalamus_data = routed[index]
+        input_data = events[index].get("input_data", "Unknown input")
+        try:
+            reply = future.result(timeout=timeout)
+            acc_data = parse_acc_reply(reply, thalamus_data, input_data, rules_results.get(index))
+        except Exception as e:
+            logger.error(f"Pipeline ACC error for event {index}: {e}")
+            acc_data = generate_fallback_acc_response(thalamus_data, input_data)
+        results[index] = {"thalamus": thalamus_data, "acc": acc_data}
+    return results
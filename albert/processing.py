@@ -0,0 +1,135 @@
+# processing.py
+
+import json
+import logging
+import re
+
+from regions import ACC_FIELDS
+from acc_tiers import evaluate_rules, record_agreement
+from instrumentation import timed
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CHAT_RESPONSES = metrics.counter(
+    "albert_chat_responses_total",
+    "Thalamus/ACC replies by outcome (valid, invalid, fallback)",
+    ["engine", "outcome"],
+)
+ACC_FALLBACK_RATIO = metrics.gauge(
+    "albert_acc_fallback_ratio", "Share of ACC replies answered by the rule-based fallback since startup"
+)
+
+
+def _acc_fallback_ratio():
+    fallback = CHAT_RESPONSES.value(engine="acc", outcome="fallback")
+    total = fallback + CHAT_RESPONSES.value(engine="acc", outcome="valid")
+    return fallback / total if total else 0.0
+
+
+ACC_FALLBACK_RATIO.set_function(_acc_fallback_ratio)
+
+
+class ThalamusOutputError(ValueError):
+    """The thalamus model did not return a usable routing decision."""
+
+
+def extract_json_object(reply: str):
+    """Return the JSON object text in a model reply, or None."""
+    # Structured decoding emits exactly one JSON object, so try that before the regex.
+    try:
+        if isinstance(json.loads(reply), dict):
+            return reply
+    except json.JSONDecodeError:
+        pass
+    match = re.search(r'\{.*?\}', reply)
+    return match.group(0) if match else None
+
+
+@timed("acc", "fallback")
+def generate_fallback_acc_response(thalamus_data: dict, input_data: str) -> dict:
+    """Generate a fallback ACC response when the model fails to produce valid JSON."""
+    CHAT_RESPONSES.inc(engine="acc", outcome="fallback")
+    return evaluate_rules(thalamus_data, input_data)
+
+
+@timed("thalamus", "parse")
+def parse_thalamus_reply(reply: str, user_prompt: str) -> dict:
+    """Validate a thalamus reply and attach the original message for ACC processing."""
+    thalamus_json = extract_json_object(reply)
+    if not thalamus_json:
+        CHAT_RESPONSES.inc(engine="thalamus", outcome="invalid")
+        logger.error(f"No JSON found in Thalamus response: {reply}")
+        raise ThalamusOutputError("Invalid response from Thalamus model")
+    try:
+        thalamus_data = json.loads(thalamus_json)
+    except json.JSONDecodeError as e:
+        CHAT_RESPONSES.inc(engine="thalamus", outcome="invalid")
+        logger.error(f"Failed to parse Thalamus JSON: {e}")
+        raise ThalamusOutputError("Invalid JSON from Thalamus model")
+    # Validate required fields
+    if "region" not in thalamus_data or "schema" not in thalamus_data:
+        CHAT_RESPONSES.inc(engine="thalamus", outcome="invalid")
+        raise ThalamusOutputError("Thalamus response missing required fields")
+    # Add the original message for ACC processing
+    thalamus_data["message"] = user_prompt
+    CHAT_RESPONSES.inc(engine="thalamus", outcome="valid")
+    return thalamus_data
+
+
+def build_acc_input(thalamus_data: dict, input_data: str = None):
+    """Build the ACC input (with a perception field) from a thalamus result.
+
+    ``input_data`` is read from the nested message when not given. Returns
+    ``(acc_input, input_data)``; raises json.JSONDecodeError for a malformed message.
+    """
+    if input_data is None:
+        # Extract original input data to create perception
+        original_message = json.loads(thalamus_data.get("message", "{}"))
+        input_data = original_message.get("input_data", "Unknown input")
+
+    # Create enhanced input for ACC with perception field
+    acc_input = {
+        "region": thalamus_data.get("region", ""),
+        "schema": thalamus_data.get("schema", ""),
+        "perception": f"Analyzed: {input_data}",
+        "message": thalamus_data.get("message", "{}")
+    }
+    return acc_input, input_data
+
+
+@timed("acc", "parse")
+def parse_acc_reply(reply: str, thalamus_data: dict, input_data: str, rules_result: dict = None) -> dict:
+    """Validate an ACC reply, falling back to the rule-based evaluation when it is unusable.
+
+    ``rules_result`` is the rule scorer's answer for an escalated evaluation; a valid
+    reply is compared with it for the tier agreement metrics.
+    """
+    acc_json = extract_json_object(reply)
+    if not acc_json:
+        logger.error(f"No JSON found in ACC response: {reply}")
+        # Fallback to structured response
+        acc_data = generate_fallback_acc_response(thalamus_data, input_data)
+        logger.info(f"Using fallback ACC response: {acc_data}")
+        return acc_data
+    # Validate ACC JSON
+    try:
+        acc_data = json.loads(acc_json)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse ACC JSON: {e}")
+        # Fallback to structured response
+        acc_data = generate_fallback_acc_response(thalamus_data, input_data)
+        logger.info(f"Using fallback ACC response: {acc_data}")
+        return acc_data
+    missing_fields = [field for field in ACC_FIELDS if field not in acc_data]
+    if missing_fields:
+        logger.warning(f"ACC response missing fields: {missing_fields}")
+        # Use fallback when required fields are missing
+        acc_data = generate_fallback_acc_response(thalamus_data, input_data)
+        logger.info(f"Using fallback ACC response due to missing fields: {acc_data}")
+        return acc_data
+    CHAT_RESPONSES.inc(engine="acc", outcome="valid")
+    if rules_result is not None:
+        record_agreement(rules_result, acc_data)
+    logger.info(f"Valid ACC response: {acc_data}")
+    return acc_data
@@ -0,0 +1,93 @@
+# prompt_store.py
+
+import hashlib
+import os
+import threading
+import yaml
+
+
+class PromptStore:
+    """Loads prompts.yaml and rebuilds the static prompt prefixes when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.load()
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        # Short content hash, used to tell prompt revisions apart.
+        return yaml.safe_load(raw), hashlib.sha256(raw).hexdigest()[:12], os.stat(self.path).st_mtime_ns
+
+    def load(self):
+        self.data, self.version, self._mtime = self._read()
+
+    def reload_if_changed(self, on_reload=None):
+        """Reload the YAML if it changed on disk. Returns True if it was reloaded.
+
+        ``on_reload(prefixes)`` runs with the new prefixes before the new version is
+        published; callers that see False meanwhile wait on the lock, so nobody runs on
+        old prefixes while ``version`` already names the new prompts.
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            previous = self.data
+            self.data, version, mtime = self._read()
+            if on_reload is not None:
+                try:
+                    on_reload(self.prefixes())
+                except Exception:
+                    # Keep serving the old prompts; the next call tries again.
+                    self.data = previous
+                    raise
+            self.version = version
+            self._mtime = mtime
+            return True
+
+    def thalamus_prefix(self):
+        # Everything before the per-request input; identical for every thalamus call.
+        thalamus = self.data["thalamus"]
+        return (
+            thalamus["main_prompt"]
+            + "\n\n"
+            + thalamus["region_key_prompt"]
+            + "\n\n"
+            + thalamus["schema_key_prompt"]
+            + "\n\n"
+            + thalamus["example_prompt"]
+            + "\n\nInput:\n"
+        )
+
+    def acc_prefix(self):
+        acc = self.data["acc"]
+        return (
+            acc["main_system_prompt"]
+            + "\n\n"
+            + acc["pass_doubt_key_prompt"]
+            + "\n\n"
+            + acc["threshold_score_key_prompt"]
+            + "\n\n"
+            + acc["feelings_key_prompt"]
+            + "\n\n"
+            + acc["significance_key_prompt"]
+            + "\n\n"
+            + acc["example_prompt"]
+            + "\n\nInput:\n"
+        )
+
+    def prefixes(self):
+        return {"thalamus": self.thalamus_prefix(), "acc": self.acc_prefix()}
+
+    @staticmethod
+    def build_suffix(input_text):
+        # The per-request tail that follows a prefix.
+        return input_text + "\nOutput:"
@@ -0,0 +1,17 @@
+# regions.py
+
+# Brain regions the thalamus routes to, and the schemas each one handles.
+# Keep in sync with prompts/prompts.yaml and the training data.
+REGION_SCHEMAS = {
+    "amygdala": ["fear_analysis", "reward_processing", "facial_emotion_recognition"],
+    "prefrontal_cortex": ["problem_solving", "planning", "self_awareness"],
+    "sensory_cortex": ["haptic_recognition", "audio_processing", "olfactory_analysis"],
+    "visual_cortex": ["object_recognition", "motion_analysis", "spatial_awareness"],
+    "hippocampus": ["short_term_memory", "long_term_memory", "pattern_recognition"],
+}
+
+# Every valid (region, schema) routing decision.
+ROUTING_LABELS = [(region, schema) for region, schemas in REGION_SCHEMAS.items() for schema in schemas]
+
+# Fields every ACC evaluation must contain.
+ACC_FIELDS = ["pass_doubt", "threshold_score", "feelings", "significance"]
@@ -0,0 +1,130 @@
+# scheduler.py
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Priority classes, most urgent first, when the settings do not name any.
+DEFAULT_CLASSES = ("critical", "high", "normal", "low")
+# Request attributes a priority rule can match on.
+RULE_ATTRIBUTES = ("sensor", "model", "region", "schema")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passed before its work could start."""
+
+
+class Ticket:
+    """Scheduling attributes of one pool call: priority class, client and deadline.
+
+    ``deadline`` is a time.monotonic() timestamp; work still queued after it is dropped.
+    """
+
+    def __init__(self, priority, client=None, deadline=None):
+        self.priority = priority
+        self.client = client
+        self.deadline = deadline
+
+    def expired(self, now=None):
+        return self.deadline is not None and (now if now is not None else time.monotonic()) > self.deadline
+
+
+class PriorityPolicy:
+    """Maps request attributes (sensor, model, region, schema) to a priority class.
+
+    ``rules`` is a list of dicts such as ``{"region": "amygdala", "class": "critical"}``;
+    the first rule whose attributes all match wins, otherwise ``default_class`` applies.
+    """
+
+    def __init__(self, classes=DEFAULT_CLASSES, default_class="normal", rules=()):
+        self.classes = tuple(classes)
+        if not self.classes:
+            raise ValueError("At least one priority class is required")
+        self.default_class = default_class if default_class in self.classes else self.classes[-1]
+        self.rules = []
+        for rule in rules:
+            rule = dict(rule)
+            name = rule.pop("class", None)
+            unknown = set(rule) - set(RULE_ATTRIBUTES)
+            if name not in self.classes or unknown or not rule:
+                raise ValueError(f"Invalid priority rule {rule} -> {name!r}")
+            self.rules.append(({key: str(value).lower() for key, value in rule.items()}, name))
+        self._ranks = {name: rank for rank, name in enumerate(self.classes)}
+
+    def rank(self, name):
+        """Position of a class, 0 being the most urgent; unknown classes rank as the default."""
+        return self._ranks.get(name, self._ranks[self.default_class])
+
+    def classify(self, **attributes):
+        values = {key: str(value).lower() for key, value in attributes.items() if value is not None}
+        for match, name in self.rules:
+            if all(values.get(key) == value for key, value in match.items()):
+                return name
+        return self.default_class
+
+    def most_urgent(self, names):
+        return min(names, key=self.rank, default=self.default_class)
+
+
+class FairQueue:
+    """Thread-safe queue serving priority classes strictly in order.
+
+    Within a class, clients take turns (round robin), so one busy client cannot
+    starve the others. Entries need ``ticket`` attributes.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        # rank -> client -> entries, oldest first.
+        self._classes = {rank: OrderedDict() for rank in range(len(policy.classes))}
+        self._size = 0
+        self._ready = threading.Condition()
+
+    def __len__(self):
+        return self._size
+
+    def depth(self, name):
+        clients = self._classes[self.policy.rank(name)]
+        return sum(len(entries) for entries in list(clients.values()))
+
+    def put(self, entry):
+        with self._ready:
+            clients = self._classes[self.policy.rank(entry.ticket.priority)]
+            clients.setdefault(entry.ticket.client, deque()).append(entry)
+            self._size += 1
+            self._ready.notify()
+
+    def get(self):
+        """Block until an entry is available and return the most urgent one."""
+        with self._ready:
+            while not self._size:
+                self._ready.wait()
+            for clients in self._classes.values():
+                if clients:
+                    client, entries = next(iter(clients.items()))
+                    entry = entries.popleft()
+                    if entries:
+                        clients.move_to_end(client)
+                    else:
+                        del clients[client]
+                    self._size -= 1
+                    return entry
+
+    def evict_less_urgent(self, name):
+        """Remove and return the newest entry of the least urgent class below ``name``, or None.
+
+        The entry comes from the client with the most queued work in that class.
+        """
+        with self._ready:
+            for rank in sorted(self._classes, reverse=True):
+                if rank <= self.policy.rank(name):
+                    return None
+                clients = self._classes[rank]
+                if clients:
+                    client = max(clients, key=lambda key: len(clients[key]))
+                    entry = clients[client].pop()
+                    if not clients[client]:
+                        del clients[client]
+                    self._size -= 1
+                    return entry
+            return None
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Run the server in several worker processes that share one copy of the model weights.
+
+    python serve.py --workers 4
+
+The models are loaded once in this (master) process, then the workers are forked
+from it. Each worker's engines reuse the master's models (see
+backends.share_loaded_models), so the weight pages stay shared copy-on-write
+instead of being loaded once per worker; resident memory grows by the per-worker
+state (activations, caches, Python objects) rather than by a full model copy.
+
+Preloading is skipped on CUDA (CUDA state does not survive fork) and with
+--no-preload, where every worker loads its own models as under plain uvicorn.
+The master restarts workers that exit and logs each worker's RSS, PSS and shared
+memory every server.memory_report_interval seconds.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch  # noqa: E402
+
+import backends  # noqa: E402
+from chat_engine import model_path  # noqa: E402
+from instrumentation import memory_usage  # noqa: E402
+from settings import load_settings  # noqa: E402
+
+logger = logging.getLogger("serve")
+
+DEFAULT_SIGHT_MODEL = "nlpconnect/vit-gpt2-image-captioning"
+
+
+def preload_models(settings):
+    """Load the enabled models with the arguments the engines will use, keeping them for the workers."""
+    backends.share_loaded_models()
+    enabled = settings.get("models", {}).get("enabled", {})
+    chat = settings.get("chat", {})
+    sight = settings.get("sight", {})
+    # ONNX Runtime sessions keep native thread pools that do not survive fork.
+    if enabled.get("chat", True) and chat.get("backend", "eager") != "onnx":
+        start = time.perf_counter()
+        backends.load_causal_lm(
+            chat.get("model_dir") or model_path,
+            backend=chat.get("backend", "eager"),
+            device="cpu",
+            onnx_dir=chat.get("onnx_dir"),
+            dtype=chat.get("dtype"),
+            adapters=chat.get("adapters") or None,
+        )
+        logger.info(f"Preloaded thalamus model in {time.perf_counter() - start:.1f}s")
+    if enabled.get("sight", True) and sight.get("backend", "eager") != "onnx":
+        start = time.perf_counter()
+        backends.load_vision_encoder_decoder(
+            sight.get("model_name", DEFAULT_SIGHT_MODEL),
+            backend=sight.get("backend", "eager"),
+            device="cpu",
+            onnx_dir=sight.get("onnx_dir"),
+            dtype=sight.get("dtype"),
+        )
+        logger.info(f"Preloaded sight model in {time.perf_counter() - start:.1f}s")
+    # Objects that exist now are never collected, so the collector does not write to
+    # (and unshare) the pages holding them in every worker.
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(sock, threads, log_level):
+    import uvicorn
+    import main
+
+    torch.set_num_threads(threads)
+    server = uvicorn.Server(uvicorn.Config(main.app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def spawn(sock, threads, log_level):
+    pid = os.fork()
+    if pid == 0:
+        # The master's handlers would signal the other workers; uvicorn installs its own.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(sock, threads, log_level)
+        except BaseException:
+            logger.exception("Worker failed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Started worker {pid}")
+    return pid
+
+
+def report_memory(pids):
+    total_pss = 0
+    for pid in sorted(pids):
+        try:
+            usage = memory_usage(pid)
+        except OSError:
+            continue
+        total_pss += usage["pss"]
+        logger.info(
+            f"Worker {pid}: rss {usage['rss'] / 2**20:.0f} MiB, pss {usage['pss'] / 2**20:.0f} MiB, "
+            f"shared {usage['shared'] / 2**20:.0f} MiB, private {usage['private'] / 2**20:.0f} MiB"
+        )
+    master = memory_usage()
+    logger.info(
+        f"Master: rss {master['rss'] / 2**20:.0f} MiB; "
+        f"total pss {(total_pss + master['pss']) / 2**20:.0f} MiB across {len(pids)} workers"
+    )
+
+
+def serve(host, port, workers, preload, report_interval, log_level="info"):
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    if preload and torch.cuda.is_available():
+        logger.warning("Not preloading models: CUDA cannot be shared with forked workers")
+        preload = False
+    if preload:
+        # Keep the master single-threaded so no thread pool is running when it forks.
+        torch.set_num_threads(1)
+        preload_models(load_settings())
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    logger.info(f"Listening on {host}:{port} with {workers} workers (preload: {preload})")
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pids = set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        pids.add(spawn(sock, threads, log_level))
+
+    next_report = time.monotonic() + report_interval if report_interval else None
+    while pids:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            pids.discard(pid)
+            if not stopping:
+                logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+                pids.add(spawn(sock, threads, log_level))
+            continue
+        if next_report is not None and time.monotonic() >= next_report and not stopping:
+            report_memory(pids)
+            next_report = time.monotonic() + report_interval
+        time.sleep(0.5)
+    sock.close()
+
+
+if __name__ == "__main__":
+    server_settings = load_settings().get("server", {})
+    parser = argparse.ArgumentParser(description="Serve albert from several workers sharing the model weights")
+    parser.add_argument("--host", default=server_settings.get("host", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=server_settings.get("port", 8000))
+    parser.add_argument("--workers", type=int, default=server_settings.get("workers", 1), help="Worker processes")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        default=server_settings.get("preload", True), help="Load the models in every worker")
+    parser.add_argument("--memory-report-interval", type=float,
+                        default=server_settings.get("memory_report_interval", 60),
+                        help="Seconds between per-worker memory reports (0 disables them)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.host, args.port, args.workers, args.preload, args.memory_report_interval)
@@ -0,0 +1,14 @@
+# settings.py
+
+import os
+import yaml
+
+# Settings live next to the prompts; ALBERT_SETTINGS points at an alternative file.
+DEFAULT_SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "config/settings.yaml")
+SETTINGS_PATH = os.environ.get("ALBERT_SETTINGS", DEFAULT_SETTINGS_PATH)
+
+
+def load_settings(path=None):
+    """Load the server settings YAML as a dict of sections."""
+    with open(path or SETTINGS_PATH, "r") as f:
+        return yaml.safe_load(f) or {}
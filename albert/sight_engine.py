@@ -1,21 +1,89 @@
 # sight_engine.py
 
+import time
+
 import torch
 from PIL import Image
-from transformers import VisionEncoderDecoderModel, ViTImageProcessor, AutoTokenizer as CaptionAutoTokenizer
+from transformers import ViTImageProcessor, AutoTokenizer as CaptionAutoTokenizer
+from backends import load_vision_encoder_decoder, torch_dtype
+from batching import MicroBatcher
+from image_preprocessing import ImagePreprocessor
+from instrumentation import GENERATED_TOKENS, MODEL_MEMORY_BYTES, model_memory_bytes, observe_stages, timed
+
+def caption_version(model_name, max_length, num_beams, draft, backend="eager", dtype=None):
+    # Captions only change with the model, backend, dtype and decoding settings; used as a cache key prefix.
+    version = f"{model_name}|{backend}|{max_length}|{num_beams}|{int(draft)}"
+    return f"{version}|{dtype}" if dtype else version
 
 class SightEngine:
-    def __init__(self, model_name: str = "nlpconnect/vit-gpt2-image-captioning"):
-        self.model = VisionEncoderDecoderModel.from_pretrained(model_name)
+    def __init__(self, model_name: str = "nlpconnect/vit-gpt2-image-captioning", max_batch_size: int = 8,
+                 max_wait_ms: float = 10, request_timeout: float = 60.0, max_length: int = 16, num_beams: int = 4,
+                 max_upload_bytes: int = None, max_pixels: int = None, draft: bool = True,
+                 backend: str = "eager", onnx_dir: str = None, dtype: str = None):
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = load_vision_encoder_decoder(
+            model_name, backend=backend, device=self.device, onnx_dir=onnx_dir, dtype=dtype
+        )
+        # Pixel values must match reduced-precision weights (None leaves them float32).
+        self.input_dtype = torch_dtype(dtype) if backend != "onnx" else None
         self.feature_extractor = ViTImageProcessor.from_pretrained(model_name)
         self.tokenizer = CaptionAutoTokenizer.from_pretrained(model_name)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model.to(self.device)
-        self.model.eval()
+        self.backend = backend
+        MODEL_MEMORY_BYTES.set(model_memory_bytes(self.model), engine="sight")
+        # Decodes uploads straight to the processor's input size; same normalization.
+        self.preprocessor = ImagePreprocessor.from_processor(
+            self.feature_extractor, max_upload_bytes=max_upload_bytes, max_pixels=max_pixels, draft=draft
+        )
+        # Caption decoding parameters and the largest number of images per generate() call.
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.request_timeout = request_timeout
+        self.version = caption_version(model_name, max_length, num_beams, draft, backend, dtype)
+        # Concurrent single-image requests (e.g. a camera burst) are captioned together.
+        self.batcher = MicroBatcher(
+            lambda key, images: self._caption_batch(images),
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=max_wait_ms,
+            request_timeout=request_timeout,
+            name="sight-batcher",
+        )
+
+    def _caption_batch(self, images: list) -> list:
+        # One processor call, one encoder pass and one joint beam search for the whole batch.
+        start = time.perf_counter()
+        pixel_values = self.preprocessor.to_tensor(images).to(self.device, dtype=self.input_dtype)
+        preprocessed = time.perf_counter()
+        output_ids = self.model.generate(pixel_values, max_length=self.max_length, num_beams=self.num_beams)
+        generated = time.perf_counter()
+        captions = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        observe_stages("sight", {
+            "preprocess": preprocessed - start,
+            "beam_search": generated - preprocessed,
+            "detokenize": time.perf_counter() - generated,
+        })
+        # Count real caption tokens; finished beams are padded (the decoder start token is not generated).
+        pad_token_id = self.model.generation_config.pad_token_id
+        new_tokens = output_ids[:, 1:]
+        token_count = int((new_tokens != pad_token_id).sum()) if pad_token_id is not None else new_tokens.numel()
+        GENERATED_TOKENS.inc(token_count, engine="sight", decoding="beam")
+        return captions
+
+    @timed("sight", "decode")
+    def decode_image(self, contents: bytes) -> Image.Image:
+        """Decode uploaded bytes to a model-sized image; raises ImageTooLargeError past the limits."""
+        return self.preprocessor.decode(contents)
+
+    def submit_sight(self, image: Image.Image):
+        """Queue an image for captioning and return a Future for its caption."""
+        return self.batcher.submit(image)
 
     def generate_sight(self, image: Image.Image) -> str:
-        # Preprocess the image.
-        pixel_values = self.feature_extractor(images=image, return_tensors="pt").pixel_values.to(self.device)
-        output_ids = self.model.generate(pixel_values, max_length=16, num_beams=4)
-        sight_description = self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
-        return sight_description
+        return self.submit_sight(image).result(timeout=self.request_timeout)
+
+    def generate_sights(self, images: list) -> list:
+        """Caption many images directly, in chunks of at most max_batch_size."""
+        captions = []
+        for start in range(0, len(images), self.max_batch_size):
+            captions.extend(self._caption_batch(images[start:start + self.max_batch_size]))
+        return captions
@@ -1,13 +1,26 @@
 # pipeline.py
 
-from datasets import load_dataset
-from transformers import AutoTokenizer
+import argparse
+import functools
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
 
-# Load the dataset from JSONL
-dataset = load_dataset("json", data_files={"train": "training_dataset_3-27-25.jsonl"}, split="train")
+from datasets import load_dataset, load_from_disk
+from transformers import AutoTokenizer
 
-# Load the tokenizer
-tokenizer = AutoTokenizer.from_pretrained("distilgpt2")
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_FILE = os.path.join(DATA_DIR, "training_dataset_3-27-25.jsonl")
+DEFAULT_CACHE_DIR = os.path.join(DATA_DIR, ".tokenized_cache")
+STRATEGIES = ("pad", "bucket", "pack")
+# "full" puts the routing instructions before every example; "bare" is just the input and
+# output, in the serving prompt's "<input>\nOutput: <json>" shape, for training LoRA adapters.
+PROMPT_FORMATS = ("full", "bare")
+# Bump when the preprocessing below changes, so old caches are not reused.
+PIPELINE_VERSION = 3
 
 # Define the prompt prefix
 prompt_prefix = (
@@ -32,14 +45,199 @@ def generate_prompt(example):
     # Combine the prefix with the input JSON from the dataset.
     return prompt_prefix + example["input"]
 
-def tokenize_function(example):
-    prompt = generate_prompt(example)
+def generate_text(example, prompt_format="full"):
+    if prompt_format == "bare":
+        # Same as PromptStore.build_suffix(input) followed by the reply.
+        return example["input"] + "\nOutput: " + example["output"]
     # We choose to combine input prompt and output into a single string for language modeling
-    full_text = prompt + "\nExpected Output: " + example["output"]
-    return tokenizer(full_text, truncation=True, max_length=600)
+    return generate_prompt(example) + "\nExpected Output: " + example["output"]
+
+def tokenize_batch(batch, tokenizer, max_length, add_eos=False, prompt_format="full"):
+    """Tokenize a batch of examples (dataset.map with batched=True)."""
+    texts = [
+        generate_text({"input": i, "output": o}, prompt_format) for i, o in zip(batch["input"], batch["output"])
+    ]
+    if add_eos:
+        # Packed examples need an explicit boundary between them.
+        texts = [text + tokenizer.eos_token for text in texts]
+    encoded = tokenizer(texts, truncation=True, max_length=max_length)
+    encoded["length"] = [len(ids) for ids in encoded["input_ids"]]
+    return encoded
+
+def pack_batch(batch, max_length, pad_token_id):
+    """Greedily pack whole examples into sequences of exactly max_length tokens.
+
+    Examples are not split across sequences. Each example's position_ids restart at
+    0 and no attention_mask is emitted, so the model builds a block-diagonal causal
+    mask from them and packed examples never attend to each other. The padded tail
+    is a block of its own; it and the first token of every example get labels -100,
+    so no loss is computed across an example boundary.
+    """
+    packed = {"input_ids": [], "position_ids": [], "labels": [], "length": []}
+    row = None
+
+    def flush(row):
+        filled = len(row["input_ids"])
+        padding = max_length - filled
+        row["input_ids"].extend([pad_token_id] * padding)
+        row["position_ids"].extend(range(padding))
+        row["labels"].extend([-100] * padding)
+        for column, values in row.items():
+            packed[column].append(values)
+        packed["length"].append(filled)
+
+    for ids in batch["input_ids"]:
+        if row is not None and len(row["input_ids"]) + len(ids) > max_length:
+            flush(row)
+            row = None
+        if row is None:
+            row = {"input_ids": [], "position_ids": [], "labels": []}
+        row["input_ids"].extend(ids)
+        row["position_ids"].extend(range(len(ids)))
+        row["labels"].append(-100)
+        row["labels"].extend(ids[1:])
+    if row is not None:
+        flush(row)
+    return packed
+
+def tokenizer_fingerprint(tokenizer):
+    if tokenizer.is_fast:
+        state = tokenizer.backend_tokenizer.to_str()
+    else:
+        state = json.dumps(sorted(tokenizer.get_vocab().items()))
+    return hashlib.sha256(state.encode("utf-8")).hexdigest()
+
+def dataset_fingerprint(data_files, tokenizer, max_length, strategy, prompt_format="full"):
+    """Hash of everything that determines the tokenized output."""
+    digest = hashlib.sha256()
+    for path in data_files:
+        with open(path, "rb") as f:
+            for block in iter(functools.partial(f.read, 1 << 20), b""):
+                digest.update(block)
+    digest.update(prompt_prefix.encode("utf-8"))
+    digest.update(tokenizer_fingerprint(tokenizer).encode("utf-8"))
+    digest.update(json.dumps([PIPELINE_VERSION, max_length, strategy, prompt_format]).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def padding_ratio(lengths, batch_size, strategy, max_length, seed=0):
+    """Estimated share of the tokens fed to the model that are padding.
+
+    "pad" batches examples in random order and pads each batch to its longest
+    example; "bucket" mimics Trainer's group_by_length sampler, which sorts
+    megabatches of 50 batches by length; packed rows are already max_length.
+    """
+    if not lengths:
+        return 0.0
+    if strategy == "pack":
+        return 1.0 - sum(lengths) / (len(lengths) * max_length)
+    order = list(lengths)
+    random.Random(seed).shuffle(order)
+    if strategy == "bucket":
+        megabatch = 50 * batch_size
+        order = [length for i in range(0, len(order), megabatch)
+                 for length in sorted(order[i:i + megabatch], reverse=True)]
+    padded = sum(max(order[i:i + batch_size]) * len(order[i:i + batch_size]) for i in range(0, len(order), batch_size))
+    return 1.0 - sum(order) / padded
+
+def load_tokenized_dataset(data_files=None, tokenizer=None, max_length=600, strategy="pad", num_proc=None,
+                           cache_dir=DEFAULT_CACHE_DIR, batch_size=2, rebuild=False, prompt_format="full"):
+    """Return ``(dataset, stats)``, tokenizing only when the cache does not match.
+
+    The cache lives under ``cache_dir/<fingerprint>`` and is reused until the data
+    files, tokenizer, prompt prefix, max_length, strategy or prompt format change.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', expected one of {', '.join(STRATEGIES)}")
+    if prompt_format not in PROMPT_FORMATS:
+        raise ValueError(f"Unknown prompt format '{prompt_format}', expected one of {', '.join(PROMPT_FORMATS)}")
+    data_files = [os.path.abspath(path) for path in (data_files or [DEFAULT_DATA_FILE])]
+    if tokenizer is None:
+        tokenizer = AutoTokenizer.from_pretrained("distilgpt2")
+
+    fingerprint = dataset_fingerprint(data_files, tokenizer, max_length, strategy, prompt_format)
+    cache_path = os.path.join(cache_dir, fingerprint)
+    stats_path = os.path.join(cache_path, "preprocessing_stats.json")
+    if not rebuild and os.path.exists(stats_path):
+        with open(stats_path, "r") as f:
+            stats = json.load(f)
+        dataset = load_from_disk(cache_path)
+        stats.update(cached=True, padding_ratio=padding_ratio(dataset["length"], batch_size, strategy, max_length))
+        return dataset, stats
+
+    dataset = load_dataset("json", data_files={"train": data_files}, split="train")
+    examples = len(dataset)
+    start = time.perf_counter()
+    tokenized = dataset.map(
+        tokenize_batch,
+        batched=True,
+        num_proc=num_proc,
+        remove_columns=dataset.column_names,
+        fn_kwargs={
+            "tokenizer": tokenizer, "max_length": max_length, "add_eos": strategy == "pack",
+            "prompt_format": prompt_format,
+        },
+        desc="Tokenizing",
+    )
+    tokenize_seconds = time.perf_counter() - start
+    tokens = sum(tokenized["length"])
+    if strategy == "pack":
+        tokenized = tokenized.map(
+            pack_batch,
+            batched=True,
+            batch_size=1000,
+            remove_columns=tokenized.column_names,
+            fn_kwargs={"max_length": max_length, "pad_token_id": tokenizer.eos_token_id},
+            desc="Packing",
+        )
+
+    stats = {
+        "fingerprint": fingerprint,
+        "strategy": strategy,
+        "prompt_format": prompt_format,
+        "examples": examples,
+        "rows": len(tokenized),
+        "tokens": tokens,
+        "tokenize_seconds": round(tokenize_seconds, 3),
+        "tokens_per_second": round(tokens / tokenize_seconds, 1) if tokenize_seconds else None,
+    }
+    # Save next to the final path and rename, so an interrupted run never leaves a half-written cache.
+    temporary = cache_path + ".tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    tokenized.save_to_disk(temporary)
+    with open(os.path.join(temporary, "preprocessing_stats.json"), "w") as f:
+        json.dump(stats, f, indent=2)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(temporary, cache_path)
+
+    stats.update(cached=False, padding_ratio=padding_ratio(tokenized["length"], batch_size, strategy, max_length))
+    return load_from_disk(cache_path), stats
 
-tokenized_datasets = dataset.map(tokenize_function, batched=False)
+def format_stats(stats):
+    tokens_per_second = stats.get("tokens_per_second")
+    speed = f"{tokens_per_second:,.0f} tokens/s" if tokens_per_second else "n/a"
+    source = "cache" if stats["cached"] else "tokenized"
+    return (
+        f"{stats['examples']} examples -> {stats['rows']} rows ({stats['strategy']}, {source} {stats['fingerprint']}), "
+        f"{stats['tokens']:,} tokens, {speed}, padding {100 * stats['padding_ratio']:.1f}%"
+    )
 
 if __name__ == "__main__":
-    print(f"Tokenized dataset has {len(tokenized_datasets)} examples.")
+    parser = argparse.ArgumentParser(description="Tokenize the thalamus training data into the on-disk cache")
+    parser.add_argument("--data", nargs="+", default=None, help="JSONL training files")
+    parser.add_argument("--tokenizer", default="distilgpt2", help="Tokenizer name or path")
+    parser.add_argument("--max-length", type=int, default=600, help="Maximum tokens per training row")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="pad",
+                        help="pad: one example per row; bucket: group rows by length; pack: fill rows with several examples")
+    parser.add_argument("--prompt-format", choices=PROMPT_FORMATS, default="full",
+                        help="full: routing instructions before each example; bare: input and output only (adapters)")
+    parser.add_argument("--num-proc", type=int, default=None, help="Tokenizer processes")
+    parser.add_argument("--batch-size", type=int, default=2, help="Training batch size used to estimate padding")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for tokenized datasets")
+    parser.add_argument("--rebuild", action="store_true", help="Tokenize even if a matching cache exists")
+    args = parser.parse_args()
 
+    tokenized_datasets, stats = load_tokenized_dataset(
+        args.data, AutoTokenizer.from_pretrained(args.tokenizer), args.max_length, args.strategy,
+        args.num_proc, args.cache_dir, args.batch_size, args.rebuild, args.prompt_format,
+    )
+    print(format_stats(stats))
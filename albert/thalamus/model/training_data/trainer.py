@@ -1,41 +1,113 @@
+import argparse
+
 import torch
-from pipeline import tokenized_datasets
-from transformers import AutoTokenizer, AutoModelForCausalLM, Trainer, TrainingArguments, DataCollatorForLanguageModeling
-
-tokenizer = AutoTokenizer.from_pretrained("distilgpt2")
-
-# Assign pad token: using the EOS token as the pad token.
-if tokenizer.pad_token is None:
-    tokenizer.pad_token = tokenizer.eos_token
-
-model = AutoModelForCausalLM.from_pretrained("distilgpt2")
-
-training_args = TrainingArguments(
-    output_dir="./thalamus_finetuned",
-    overwrite_output_dir=True,
-    num_train_epochs=3,
-    per_device_train_batch_size=2,
-    save_strategy="epoch",  # Save at the end of each epoch.
-    save_total_limit=2,
-    logging_steps=100,
-    learning_rate=5e-5,
-    weight_decay=0.01,
-    fp16=torch.cuda.is_available(),
+from pipeline import DEFAULT_CACHE_DIR, STRATEGIES, format_stats, load_tokenized_dataset
+from transformers import (
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    Trainer,
+    TrainingArguments,
+    DataCollatorForLanguageModeling,
+    default_data_collator,
 )
 
-# Create a data collator that will dynamically pad the inputs.
-data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+parser = argparse.ArgumentParser(description="Fine-tune the thalamus routing model")
+parser.add_argument("--data", nargs="+", default=None, help="JSONL training files")
+parser.add_argument("--base-model", default="distilgpt2", help="Model and tokenizer to fine-tune")
+parser.add_argument("--output-dir", default="./thalamus_finetuned", help="Where to save the model and tokenizer")
+parser.add_argument("--max-length", type=int, default=600, help="Maximum tokens per training row")
+parser.add_argument("--strategy", choices=STRATEGIES, default="pad",
+                    help="pad: one example per row; bucket: group rows by length; pack: fill rows with several examples")
+parser.add_argument("--num-proc", type=int, default=None, help="Tokenizer processes")
+parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for tokenized datasets")
+parser.add_argument("--epochs", type=float, default=3, help="Training epochs")
+parser.add_argument("--batch-size", type=int, default=2, help="Per-device training batch size")
+parser.add_argument("--learning-rate", type=float, default=5e-5, help="Learning rate (LoRA usually wants ~2e-4)")
+parser.add_argument("--lora", action="store_true",
+                    help="Train a LoRA adapter on bare input/output examples instead of the full model (needs peft); "
+                         "serve it with chat.adapters")
+parser.add_argument("--lora-r", type=int, default=8, help="LoRA rank")
+parser.add_argument("--lora-alpha", type=int, default=16, help="LoRA scaling factor")
+parser.add_argument("--lora-dropout", type=float, default=0.05, help="LoRA dropout")
+parser.add_argument("--lora-target-modules", nargs="+", default=None,
+                    help="Module names to adapt (default: peft's choice for the architecture, c_attn for GPT-2)")
 
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=tokenized_datasets,
-    data_collator=data_collator,
-)
 
-if __name__ == "__main__":
+def add_lora(model, args):
+    try:
+        from peft import LoraConfig, get_peft_model
+    except ImportError as e:
+        raise SystemExit("--lora needs peft: pip install peft") from e
+    config = LoraConfig(
+        task_type="CAUSAL_LM",
+        r=args.lora_r,
+        lora_alpha=args.lora_alpha,
+        lora_dropout=args.lora_dropout,
+        target_modules=args.lora_target_modules,
+    )
+    model = get_peft_model(model, config)
+    model.print_trainable_parameters()
+    return model
+
+
+def main(args):
+    tokenizer = AutoTokenizer.from_pretrained(args.base_model)
+
+    # Assign pad token: using the EOS token as the pad token.
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    # Adapters are served without the instruction prefix, so they are trained without it too.
+    tokenized_datasets, stats = load_tokenized_dataset(
+        args.data, tokenizer, args.max_length, args.strategy, args.num_proc, args.cache_dir, args.batch_size,
+        prompt_format="bare" if args.lora else "full",
+    )
+    print(format_stats(stats))
+
+    model = AutoModelForCausalLM.from_pretrained(args.base_model)
+    config = model.config
+    if args.strategy == "pack":
+        # The per-example attention mask is only derived from position_ids when no KV cache is built.
+        config.use_cache = False
+    if args.lora:
+        model = add_lora(model, args)
+
+    training_args = TrainingArguments(
+        output_dir=args.output_dir,
+        overwrite_output_dir=True,
+        num_train_epochs=args.epochs,
+        per_device_train_batch_size=args.batch_size,
+        save_strategy="epoch",  # Save at the end of each epoch.
+        save_total_limit=2,
+        logging_steps=100,
+        learning_rate=args.learning_rate,
+        weight_decay=0.01,
+        fp16=torch.cuda.is_available(),
+        # Batch examples of similar length together (uses the dataset's "length" column).
+        group_by_length=args.strategy == "bucket",
+    )
+
+    if args.strategy == "pack":
+        # Packed rows are already max_length and carry their own labels and per-example position_ids.
+        data_collator = default_data_collator
+    else:
+        # Create a data collator that will dynamically pad the inputs.
+        data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=tokenized_datasets,
+        data_collator=data_collator,
+    )
+
     trainer.train()         # Run training
-    trainer.save_model()    # Save the final model to output_dir.
-    tokenizer.save_pretrained("./thalamus_finetuned")  # Save the tokenizer as well
+    config.use_cache = True  # The saved model is served with its KV cache.
+    trainer.save_model()    # Save the final model (or just the adapter, with --lora) to output_dir.
+    tokenizer.save_pretrained(args.output_dir)  # Save the tokenizer as well
     print("Training complete and model saved!")
-    print("Model and tokenizer saved to './thalamus_finetuned'")
+    print(f"Model and tokenizer saved to '{args.output_dir}'")
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -1,47 +1,272 @@
+import copy
+import time
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, LogitsProcessor, LogitsProcessorList, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+from backends import load_causal_lm, BASE_ADAPTER, KV_CACHE_BACKENDS
+
+
+class PrefillClock(LogitsProcessor):
+    """Notes when generate() first asks for logits processing, i.e. when the prefill pass is done."""
+
+    def __init__(self):
+        self.prefill_done = None
+
+    def __call__(self, input_ids, scores):
+        if self.prefill_done is None:
+            self.prefill_done = time.perf_counter()
+        return scores
+
+
+class BatchTokenStreamer(BaseStreamer):
+    """Streams the text of each row of a batched generate() call to its own callback.
+
+    ``callbacks`` has one entry per prompt (None for rows nobody listens to) and is
+    called with each new piece of decoded text. Rows stop streaming at their first EOS.
+    """
+
+    def __init__(self, tokenizer, callbacks):
+        self.tokenizer = tokenizer
+        self.callbacks = callbacks
+        self._token_ids = [[] for _ in callbacks]
+        self._sent = [0] * len(callbacks)
+        self._finished = [callback is None for callback in callbacks]
+        self._prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the prompt ids; every later one the next token of each row.
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        for row, token_id in enumerate(value.view(len(self.callbacks), -1)[:, -1].tolist()):
+            if self._finished[row]:
+                continue
+            if token_id == self.tokenizer.eos_token_id:
+                self._finished[row] = True
+                continue
+            self._token_ids[row].append(token_id)
+            # Decode the whole row so multi-token characters and word spacing come out right.
+            text = self.tokenizer.decode(self._token_ids[row], skip_special_tokens=True)
+            if text.endswith("\ufffd"):
+                continue  # an incomplete UTF-8 sequence; wait for the next token
+            if len(text) > self._sent[row]:
+                self.callbacks[row](text[self._sent[row]:])
+                self._sent[row] = len(text)
+
+    def end(self):
+        self._finished = [True] * len(self.callbacks)
+
 
 class Thalamus:
-    def __init__(self, model_dir="./thalamus_finetuned", device=None):
+    # Token budget for unconstrained generation.
+    max_new_tokens = 150
+    # Sampling settings, used unless do_sample is False.
+    temperature = 0.3  # Lower temperature for more focused output
+    top_p = 0.9  # Nucleus sampling
+
+    def __init__(self, model_dir="./thalamus_finetuned", device=None, do_sample=True, backend="eager", onnx_dir=None,
+                 dtype=None, adapters=None):
         # If device is not provided, use CUDA if available, else CPU.
         self.device = device if device is not None else ("cuda" if torch.cuda.is_available() else "cpu")
         
         # Load the tokenizer and model from the fine-tuned directory.
         self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
-        self.model = AutoModelForCausalLM.from_pretrained(model_dir)
-        self.model.to(self.device)
+        self.model = load_causal_lm(
+            model_dir, backend=backend, device=self.device, onnx_dir=onnx_dir, dtype=dtype, adapters=adapters or None
+        )
+        self.backend = backend
+        # LoRA adapters (name -> directory) sharing the model's weights; see backends.attach_adapters.
+        self.adapters = dict(adapters or {})
+        # Prefix caching and single-pass scoring need a reusable DynamicCache.
+        self.supports_kv_cache = backend in KV_CACHE_BACKENDS
+
+        # Batched prompts are left-padded so every row ends where generation starts.
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+
+        # Greedy decoding (do_sample=False) makes replies reproducible, e.g. for caching.
+        self.do_sample = do_sample
+
+        # Static prompt prefixes: name -> (input_ids, past_key_values), computed once.
+        self.prefixes = {}
+        # Tokenized candidate lists for score_candidates.
+        self._candidate_cache = {}
+
+    def _adapter_kwargs(self, names):
+        # Once adapters are loaded every call names one per row (None: the base model alone).
+        if not self.adapters:
+            return {}
+        return {"adapter_names": [name or BASE_ADAPTER for name in names]}
+
+    def cache_prefix(self, name, text, adapter=None):
+        """Pre-tokenize a static prompt prefix and run its prefill once (with ``adapter``, if any)."""
+        if not self.supports_kv_cache:
+            raise ValueError(f"The {self.backend} backend does not support prefix caching")
+        prefix_ids = self.tokenizer(text, return_tensors="pt")["input_ids"].to(self.model.device)
+        with torch.no_grad():
+            past_key_values = self.model(prefix_ids, use_cache=True, **self._adapter_kwargs([adapter])).past_key_values
+        # Replace the whole entry at once so in-flight batches keep a consistent pair.
+        self.prefixes[name] = (prefix_ids, past_key_values)
         
-    def generate_text(self, prompt):
-        # Encode the prompt
-        input_ids = self.tokenizer.encode(prompt, return_tensors="pt")
+    def _encode_candidates(self, candidates):
+        # Candidates are right-padded; padding positions are masked out of the scores.
+        key = tuple(candidates)
+        encoded = self._candidate_cache.get(key)
+        if encoded is None:
+            rows = [self.tokenizer.encode(candidate, add_special_tokens=False) for candidate in candidates]
+            width = max(len(row) for row in rows)
+            candidate_ids = torch.full((len(rows), width), self.tokenizer.pad_token_id, dtype=torch.long)
+            candidate_mask = torch.zeros((len(rows), width), dtype=torch.long)
+            for i, row in enumerate(rows):
+                candidate_ids[i, :len(row)] = torch.tensor(row)
+                candidate_mask[i, :len(row)] = 1
+            encoded = (candidate_ids.to(self.model.device), candidate_mask.to(self.model.device))
+            self._candidate_cache[key] = encoded
+        return encoded
+
+    def score_candidates(self, prompt, candidates, prefix=None, adapter=None):
+        """Log-likelihood of each candidate continuation of ``prompt``.
+
+        The prompt is prefilled once; all candidates are then scored together in a
+        single batched forward pass on top of its KV cache.
+        """
+        prompt_ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"].to(self.model.device)
+        if not self.supports_kv_cache:
+            return self._score_candidates_uncached(prompt_ids, candidates)
+        past_key_values = None
+        if prefix is not None:
+            prefix_ids, prefix_past = self.prefixes[prefix]
+            past_key_values = copy.deepcopy(prefix_past)
+        candidate_ids, candidate_mask = self._encode_candidates(candidates)
+        num_candidates = candidate_ids.shape[0]
+
+        with torch.no_grad():
+            prompt_out = self.model(
+                prompt_ids, past_key_values=past_key_values, use_cache=True, **self._adapter_kwargs([adapter])
+            )
+            past_key_values = prompt_out.past_key_values
+            context_length = past_key_values.get_seq_length()
+            past_key_values.batch_repeat_interleave(num_candidates)
+            attention_mask = torch.cat(
+                [torch.ones((num_candidates, context_length), dtype=torch.long, device=self.model.device), candidate_mask],
+                dim=1,
+            )
+            candidate_out = self.model(
+                candidate_ids, attention_mask=attention_mask, past_key_values=past_key_values,
+                **self._adapter_kwargs([adapter] * num_candidates),
+            )
+
+        # Token t of a candidate is predicted by the logits at t - 1 (the prompt's last for t = 0).
+        logits = torch.cat(
+            [prompt_out.logits[:, -1:].expand(num_candidates, -1, -1), candidate_out.logits[:, :-1]], dim=1
+        ).float()
+        token_log_probs = logits.gather(2, candidate_ids.unsqueeze(-1)).squeeze(-1) - logits.logsumexp(dim=-1)
+        return (token_log_probs * candidate_mask).sum(dim=1).tolist()
+
+    def _score_candidates_uncached(self, prompt_ids, candidates):
+        # Without a reusable cache, score prompt + candidate as full sequences in one batch.
+        candidate_ids, candidate_mask = self._encode_candidates(candidates)
+        num_candidates, prompt_length = candidate_ids.shape[0], prompt_ids.shape[1]
+        input_ids = torch.cat([prompt_ids.expand(num_candidates, -1), candidate_ids], dim=1)
+        attention_mask = torch.cat([torch.ones_like(prompt_ids).expand(num_candidates, -1), candidate_mask], dim=1)
+        with torch.no_grad():
+            logits = self.model(input_ids, attention_mask=attention_mask).logits
+        logits = logits[:, prompt_length - 1:-1].float()
+        token_log_probs = logits.gather(2, candidate_ids.unsqueeze(-1)).squeeze(-1) - logits.logsumexp(dim=-1)
+        return (token_log_probs * candidate_mask).sum(dim=1).tolist()
+
+    def generate_text(self, prompt, prefix=None, constraint=None):
+        return self.generate_texts([prompt], prefix=prefix, constraint=constraint)[0]
+
+    def generate_texts(self, prompts, prefix=None, constraint=None, return_token_counts=False, token_callbacks=None,
+                       timings=None, adapters=None):
+        # adapters: optional per-prompt adapter names (None rows run on the base model), so
+        # prompts for different adapters share one batch.
+        # token_callbacks: optional per-prompt callables that receive the reply text as it is generated.
+        # timings: optional dict filled with seconds per stage (tokenize, prefill, decode, detokenize)
+        # and the number of prompt tokens prefilled.
+        start = time.perf_counter()
+        # Encode the prompts as one left-padded batch
+        encoded = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        tokenized = time.perf_counter()
         # Move input_ids to the same device as the model (GPU if available)
-        input_ids = input_ids.to(self.model.device)
+        input_ids = encoded["input_ids"].to(self.model.device)
+        attention_mask = encoded["attention_mask"].to(self.model.device)
 
-        # Create attention mask
-        attention_mask = (input_ids != self.tokenizer.pad_token_id).long()
-        attention_mask = attention_mask.to(self.model.device)
+        # With a cached prefix, prompts are only the per-request suffixes: prepend the
+        # prefix ids and reuse its past_key_values so only the suffix is prefilled.
+        past_key_values = None
+        if prefix is not None:
+            prefix_ids, prefix_past = self.prefixes[prefix]
+            batch_size = input_ids.shape[0]
+            input_ids = torch.cat([prefix_ids.expand(batch_size, -1), input_ids], dim=1)
+            attention_mask = torch.cat([torch.ones_like(prefix_ids).expand(batch_size, -1), attention_mask], dim=1)
+            # generate() extends the cache in place, so each batch works on its own copy.
+            past_key_values = copy.deepcopy(prefix_past)
+            past_key_values.batch_repeat_interleave(batch_size)
         
-        # Store original input length to extract only new tokens
+        # Store padded input length to extract only new tokens
         input_length = input_ids.shape[1]
+
+        # A constraint (see constrained.py) restricts decoding to a JSON template and
+        # stops each row as soon as the template is complete.
+        max_new_tokens = self.max_new_tokens
+        logits_processor = LogitsProcessorList()
+        stopping_criteria = None
+        if constraint is not None:
+            max_new_tokens = constraint.max_tokens
+            logits_processor.append(constraint.logits_processor(input_length))
+            stopping_criteria = StoppingCriteriaList([constraint.stopping_criteria(input_length)])
+        # Splits generate() into prefill and decode time.
+        clock = PrefillClock()
+        logits_processor.append(clock)
+
+        streamer = None
+        if token_callbacks is not None and any(callback is not None for callback in token_callbacks):
+            streamer = BatchTokenStreamer(self.tokenizer, token_callbacks)
+
+        sampling_kwargs = {}
+        if self.do_sample:
+            sampling_kwargs = {"temperature": self.temperature, "top_p": self.top_p}
         
         # Generate output tokens with increased max_new_tokens
-        output_ids = self.model.generate(
-            input_ids,
-            attention_mask=attention_mask,
-            max_new_tokens=150,  # Increased for better generation
-            do_sample=True,
-            temperature=0.3,  # Lower temperature for more focused output
-            top_p=0.9,  # Add nucleus sampling
-            pad_token_id=self.tokenizer.eos_token_id,
-            eos_token_id=self.tokenizer.eos_token_id
-        )
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                logits_processor=logits_processor,
+                stopping_criteria=stopping_criteria,
+                streamer=streamer,
+                max_new_tokens=max_new_tokens,
+                do_sample=self.do_sample,
+                pad_token_id=self.tokenizer.eos_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                **self._adapter_kwargs(adapters or [None] * len(prompts)),
+                **sampling_kwargs
+            )
+
+        generate_end = time.perf_counter()
 
         # Extract only the newly generated tokens (excluding input prompt)
-        new_tokens = output_ids[0][input_length:]
-        generated_text = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+        new_tokens = output_ids[:, input_length:]
+        generated_texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        if timings is not None:
+            prefill_done = clock.prefill_done or generate_end
+            timings.update({
+                "tokenize": tokenized - start,
+                # Includes copying the cached prefix's KV cache.
+                "prefill": prefill_done - tokenized,
+                "decode": generate_end - prefill_done,
+                "detokenize": time.perf_counter() - generate_end,
+                "prompt_tokens": int(encoded["attention_mask"].sum()),
+            })
         
         # Clean up the output and ensure it's valid JSON
-        generated_text = generated_text.strip()
-        
-        return generated_text
-
+        generated_texts = [generated_text.strip() for generated_text in generated_texts]
+        if return_token_counts:
+            # Finished rows are padded with EOS, so count everything else.
+            token_counts = (new_tokens != self.tokenizer.eos_token_id).sum(dim=1).tolist()
+            return generated_texts, token_counts
+        return generated_texts
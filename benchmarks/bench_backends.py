@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark and parity check for the inference backends (see albert/backends.py).
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. A run loads the thalamus model and routes the labeled examples in
+generate and score mode, then loads the captioning model and captions the
+example images. It reports load time, latency, micro-batched throughput and
+peak RSS. Routing decisions and captions are compared with the first backend
+(eager by default) as the parity check.
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ALBERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+DATASET_PATH = os.path.join(ALBERT_DIR, "thalamus", "model", "training_data", "training_dataset_3-27-25.jsonl")
+PROMPTS_PATH = os.path.join(ALBERT_DIR, "prompts", "prompts.yaml")
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "sight")
+
+
+def latency_summary(latencies):
+    return {
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+    }
+
+
+def run_chat(args, backend):
+    from chat_engine import ChatEngine, model_path
+    from prompt_store import PromptStore
+
+    start = time.perf_counter()
+    engine = ChatEngine(
+        model_dir=args.model_dir or model_path, deterministic=True, backend=backend, onnx_dir=args.chat_onnx_dir
+    )
+    for name, prefix in PromptStore(PROMPTS_PATH).prefixes().items():
+        engine.set_prompt_prefix(name, prefix)
+    load_seconds = time.perf_counter() - start
+
+    with open(DATASET_PATH, "r") as f:
+        inputs = [json.loads(line)["input"] for line in f if line.strip()][:args.limit]
+    prompts = [PromptStore.build_suffix(text) for text in inputs]
+    engine.generate_reply(prompts[0], engine="thalamus")  # warm-up
+
+    results = {"load_seconds": round(load_seconds, 2)}
+    for mode in ("generate", "score"):
+        latencies, routes = [], []
+        for prompt in prompts:
+            start = time.perf_counter()
+            routed = json.loads(engine.generate_reply(prompt, engine="thalamus", mode=mode))
+            latencies.append(time.perf_counter() - start)
+            routes.append([routed.get("region"), routed.get("schema")])
+        results[mode] = {**latency_summary(latencies), "routes": routes}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda prompt: engine.generate_reply(prompt, engine="thalamus", mode="generate"), prompts))
+    results["batched_rps"] = round(len(prompts) / (time.perf_counter() - start), 2)
+    return results
+
+
+def run_sight(args, backend):
+    from PIL import Image
+    from sight_engine import SightEngine
+
+    start = time.perf_counter()
+    engine = SightEngine(model_name=args.sight_model, backend=backend, onnx_dir=args.sight_onnx_dir)
+    load_seconds = time.perf_counter() - start
+    images = [Image.open(path).convert("RGB") for path in sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.jpg")))]
+    engine.generate_sights(images[:1])  # warm-up
+
+    latencies, captions = [], []
+    for image in images:
+        start = time.perf_counter()
+        captions.append(engine.generate_sights([image])[0])
+        latencies.append(time.perf_counter() - start)
+    return {"load_seconds": round(load_seconds, 2), **latency_summary(latencies), "captions": captions}
+
+
+def run_worker(args):
+    result = {"backend": args.worker, "chat": run_chat(args, args.worker)}
+    if not args.skip_sight:
+        result["sight"] = run_sight(args, args.worker)
+    # ru_maxrss is in KiB on Linux.
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def agreement(values, baseline):
+    return round(sum(a == b for a, b in zip(values, baseline)) / len(baseline), 4)
+
+
+def summarize(result, baseline):
+    chat = result["chat"]
+    summary = {
+        "backend": result["backend"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "chat_load_seconds": chat["load_seconds"],
+        "generate_mean_ms": chat["generate"]["mean_ms"],
+        "generate_p95_ms": chat["generate"]["p95_ms"],
+        "score_mean_ms": chat["score"]["mean_ms"],
+        "batched_rps": chat["batched_rps"],
+        "generate_route_agreement": agreement(chat["generate"]["routes"], baseline["chat"]["generate"]["routes"]),
+        "score_route_agreement": agreement(chat["score"]["routes"], baseline["chat"]["score"]["routes"]),
+    }
+    if "sight" in result:
+        summary.update({
+            "sight_load_seconds": result["sight"]["load_seconds"],
+            "caption_mean_ms": result["sight"]["mean_ms"],
+            "caption_agreement": agreement(result["sight"]["captions"], baseline["sight"]["captions"]),
+        })
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and parity-check inference backends")
+    parser.add_argument("--backends", default="eager,int8,compile", help="Comma-separated; the first is the baseline")
+    parser.add_argument("--model-dir", help="Thalamus model directory (defaults to the served model)")
+    parser.add_argument("--sight-model", default="nlpconnect/vit-gpt2-image-captioning")
+    parser.add_argument("--chat-onnx-dir", help="Exported thalamus model for the onnx backend")
+    parser.add_argument("--sight-onnx-dir", help="Exported captioning model for the onnx backend")
+    parser.add_argument("--limit", type=int, default=50, help="Number of labeled examples to route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--skip-sight", action="store_true")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        sys.exit(0)
+
+    results = []
+    for backend in args.backends.split(","):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--worker", backend],
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            print(f"{backend} failed:\n{completed.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if results:
+        print(json.dumps([summarize(result, results[0]) for result in results], indent=2))
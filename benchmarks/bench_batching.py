@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sequential Thalamus.generate_text vs. the ChatEngine micro-batcher.
+
+Sends the same set of thalamus prompts through both paths with N concurrent
+callers and reports requests/second for each.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+ALBERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+from chat_engine import ChatEngine, model_path  # noqa: E402
+
+DATASET_PATH = os.path.join(ALBERT_DIR, "thalamus", "model", "training_data", "training_dataset_3-27-25.jsonl")
+PROMPTS_PATH = os.path.join(ALBERT_DIR, "prompts", "prompts.yaml")
+
+
+def load_prompts(count):
+    with open(PROMPTS_PATH, "r") as f:
+        thalamus_prompts = yaml.safe_load(f)["thalamus"]
+    prefix = "\n\n".join([
+        thalamus_prompts["main_prompt"],
+        thalamus_prompts["region_key_prompt"],
+        thalamus_prompts["schema_key_prompt"],
+        thalamus_prompts["example_prompt"],
+    ])
+    with open(DATASET_PATH, "r") as f:
+        inputs = [json.loads(line)["input"] for line in f if line.strip()]
+    return [prefix + "\n\nInput:\n" + inputs[i % len(inputs)] + "\nOutput:" for i in range(count)]
+
+
+def run_sequential(engine, prompts):
+    # The unbatched path: one batch-size-1 generate() after another.
+    start = time.perf_counter()
+    for prompt in prompts:
+        engine.thalamus.generate_text(prompt)
+    return time.perf_counter() - start
+
+
+def run_batched(engine, prompts, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda prompt: engine.generate_reply(prompt, engine="thalamus"), prompts))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark thalamus micro-batching")
+    parser.add_argument("--model-dir", default=model_path, help="Path to the thalamus model directory")
+    parser.add_argument("--requests", type=int, default=64, help="Number of prompts to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of concurrent callers")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--decoding", default="sample", choices=["sample", "structured"])
+    args = parser.parse_args()
+
+    engine = ChatEngine(
+        model_dir=args.model_dir,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        request_timeout=None,
+        decoding=args.decoding,
+    )
+    prompts = load_prompts(args.requests)
+
+    # Warm up both paths once so neither pays one-time costs.
+    engine.thalamus.generate_text(prompts[0])
+    engine.generate_reply(prompts[0], engine="thalamus")
+
+    sequential = run_sequential(engine, prompts)
+    batched = run_batched(engine, prompts, args.concurrency)
+
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "max_batch_size": args.max_batch_size,
+        "max_wait_ms": args.max_wait_ms,
+        "decoding": args.decoding,
+        "sequential_rps": round(args.requests / sequential, 2),
+        "batched_rps": round(args.requests / batched, 2),
+        "speedup": round(sequential / batched, 2),
+    }, indent=2))
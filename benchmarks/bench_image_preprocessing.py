@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /sight/ image preprocessing, old path vs. ImagePreprocessor.
+
+The old path fully decodes the upload, thumbnails it to 640px and runs
+ViTImageProcessor (a second resize). The new path decodes JPEGs at a reduced
+draft scale and resizes once to the model size. Example images are upscaled
+to --width x --height JPEGs to stand in for camera stills. Reports decode and
+preprocessing milliseconds per image and the largest pixel difference.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image
+from transformers import ViTImageProcessor
+
+ALBERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+from image_preprocessing import ImagePreprocessor  # noqa: E402
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "sight")
+
+
+def make_uploads(width, height, quality):
+    uploads = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.jpg"))):
+        buffer = BytesIO()
+        Image.open(path).convert("RGB").resize((width, height)).save(buffer, format="JPEG", quality=quality)
+        uploads.append(buffer.getvalue())
+    return uploads
+
+
+def old_decode(contents):
+    image = Image.open(BytesIO(contents)).convert("RGB")
+    image.thumbnail((640, 640))
+    return image
+
+
+def time_path(uploads, repeats, decode, preprocess):
+    decode_s = preprocess_s = 0.0
+    outputs = []
+    for _ in range(repeats):
+        for contents in uploads:
+            start = time.perf_counter()
+            image = decode(contents)
+            middle = time.perf_counter()
+            outputs.append(preprocess(image))
+            decode_s += middle - start
+            preprocess_s += time.perf_counter() - middle
+    count = repeats * len(uploads)
+    return 1000 * decode_s / count, 1000 * preprocess_s / count, outputs[:len(uploads)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sight image preprocessing")
+    parser.add_argument("--model-name", default="nlpconnect/vit-gpt2-image-captioning")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    processor = ViTImageProcessor.from_pretrained(args.model_name)
+    preprocessor = ImagePreprocessor.from_processor(processor)
+    uploads = make_uploads(args.width, args.height, args.quality)
+
+    old = time_path(
+        uploads, args.repeats, old_decode,
+        lambda image: processor(images=image, return_tensors="pt").pixel_values,
+    )
+    new = time_path(uploads, args.repeats, preprocessor.decode, lambda image: preprocessor.to_tensor([image]))
+    # Both tensors are normalized to [-1, 1]; draft decoding changes pixels slightly.
+    max_diff = max(float((a - b).abs().max()) for a, b in zip(old[2], new[2]))
+
+    print(json.dumps({
+        "images": len(uploads),
+        "resolution": f"{args.width}x{args.height}",
+        "old_decode_ms": round(old[0], 2),
+        "old_preprocess_ms": round(old[1], 2),
+        "new_decode_ms": round(new[0], 2),
+        "new_preprocess_ms": round(new[1], 2),
+        "speedup": round((old[0] + old[1]) / (new[0] + new[1]), 2),
+        "max_pixel_diff": round(max_diff, 4),
+    }, indent=2))
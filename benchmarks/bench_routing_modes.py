@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: thalamus routing by generation vs. single-pass candidate scoring.
+
+Runs every example of the labeled training set through ChatEngine in
+"generate" and "score" mode and reports accuracy and latency for each. For
+score mode it also fits the softmax temperature (chat.score_temperature)
+that minimizes the negative log-likelihood of the true labels.
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+ALBERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+from chat_engine import ChatEngine, model_path  # noqa: E402
+from prompt_store import PromptStore  # noqa: E402
+
+DATASET_PATH = os.path.join(ALBERT_DIR, "thalamus", "model", "training_data", "training_dataset_3-27-25.jsonl")
+PROMPTS_PATH = os.path.join(ALBERT_DIR, "prompts", "prompts.yaml")
+
+
+def load_examples(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_mode(engine, examples, mode):
+    latencies, correct, results = [], 0, []
+    for example in examples:
+        expected = json.loads(example["output"])
+        start = time.perf_counter()
+        reply = engine.generate_reply(PromptStore.build_suffix(example["input"]), engine="thalamus", mode=mode)
+        latencies.append(time.perf_counter() - start)
+        try:
+            routed = json.loads(reply.strip())
+        except json.JSONDecodeError:
+            routed = {}
+        results.append(routed)
+        if routed.get("region") == expected["region"] and routed.get("schema") == expected["schema"]:
+            correct += 1
+    summary = {
+        "accuracy": round(correct / len(examples), 4),
+        "mean_latency_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p95_latency_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+    }
+    return summary, results
+
+
+def fit_temperature(engine, examples):
+    # Raw log-likelihoods per example, then a grid search over the temperature.
+    labels = engine.routing_labels
+    raw = []
+    for example in examples:
+        expected = json.loads(example["output"])
+        scores = engine.thalamus.score_candidates(
+            PromptStore.build_suffix(example["input"]), engine.routing_candidates, prefix="thalamus"
+        )
+        raw.append((scores, labels.index((expected["region"], expected["schema"]))))
+
+    def nll(temperature):
+        total = 0.0
+        for scores, target in raw:
+            scaled = [value / temperature for value in scores]
+            peak = max(scaled)
+            log_total = peak + math.log(sum(math.exp(value - peak) for value in scaled))
+            total += log_total - scaled[target]
+        return total / len(raw)
+
+    grid = [0.25 * step for step in range(1, 81)]
+    best = min(grid, key=nll)
+    return {"score_temperature": best, "nll_at_1.0": round(nll(1.0), 4), "nll_at_best": round(nll(best), 4)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare thalamus generate vs. score routing")
+    parser.add_argument("--model-dir", default=model_path, help="Path to the thalamus model directory")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Labeled JSONL with input/output pairs")
+    parser.add_argument("--decoding", default="structured", choices=["sample", "structured"])
+    args = parser.parse_args()
+
+    engine = ChatEngine(model_dir=args.model_dir, max_batch_size=1, max_wait_ms=0, request_timeout=None, decoding=args.decoding)
+    engine.set_prompt_prefix("thalamus", PromptStore(PROMPTS_PATH).thalamus_prefix())
+    examples = load_examples(args.dataset)
+
+    # Warm up both modes once.
+    for mode in ("generate", "score"):
+        engine.generate_reply(PromptStore.build_suffix(examples[0]["input"]), engine="thalamus", mode=mode)
+
+    generate_summary, _ = run_mode(engine, examples, "generate")
+    score_summary, score_results = run_mode(engine, examples, "score")
+    score_summary["mean_confidence"] = round(statistics.mean(result["confidence"] for result in score_results), 4)
+    score_summary.update(fit_temperature(engine, examples))
+
+    print(json.dumps({
+        "examples": len(examples),
+        "decoding": args.decoding,
+        "generate": generate_summary,
+        "score": score_summary,
+        "speedup": round(generate_summary["mean_latency_ms"] / score_summary["mean_latency_ms"], 2),
+    }, indent=2))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one-image-at-a-time captioning vs. the SightEngine micro-batcher.
+
+Captions the example images (repeated to --requests) sequentially with batch
+size 1 and then from N concurrent callers through the sight batcher, and
+reports images/second for each.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+ALBERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+from sight_engine import SightEngine  # noqa: E402
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "sight")
+
+
+def load_images(count):
+    paths = sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.jpg")) + glob.glob(os.path.join(EXAMPLES_DIR, "*.png")))
+    images = [Image.open(path).convert("RGB") for path in paths]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def run_sequential(engine, images):
+    # The unbatched path: one batch-size-1 generate() after another.
+    start = time.perf_counter()
+    for image in images:
+        engine._caption_batch([image])
+    return time.perf_counter() - start
+
+
+def run_batched(engine, images, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(engine.generate_sight, images))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sight micro-batching")
+    parser.add_argument("--model-name", default="nlpconnect/vit-gpt2-image-captioning")
+    parser.add_argument("--requests", type=int, default=32, help="Number of images to caption")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent callers")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--num-beams", type=int, default=4)
+    args = parser.parse_args()
+
+    engine = SightEngine(
+        model_name=args.model_name,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        request_timeout=None,
+        num_beams=args.num_beams,
+    )
+    images = load_images(args.requests)
+
+    # Warm up both paths once so neither pays one-time costs.
+    engine._caption_batch(images[:1])
+    engine.generate_sight(images[0])
+
+    sequential = run_sequential(engine, images)
+    batched = run_batched(engine, images, args.concurrency)
+
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "max_batch_size": args.max_batch_size,
+        "num_beams": args.num_beams,
+        "sequential_ips": round(args.requests / sequential, 2),
+        "batched_ips": round(args.requests / batched, 2),
+        "speedup": round(sequential / batched, 2),
+    }, indent=2))
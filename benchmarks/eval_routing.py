@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Evaluate thalamus routing accuracy against latency over a grid of configurations.
+
+Every example of a labeled JSONL set ({"input", "output"} pairs, by default the
+training set) is routed through ChatEngine in micro-batches for each combination
+of backend, routing mode, decoding, sampling temperature / top_p and token
+budget. Options that do not affect a combination (e.g. temperature in score
+mode) are collapsed, so each distinct configuration runs once. For each one it
+reports region, schema and exact accuracy, the share of replies that are valid
+JSON, mean generated tokens and latency per example.
+
+Results go to <output>/results.json, with the replies of each configuration in
+<output>/predictions/<config>.jsonl. Configuration ids are stable, so runs from
+different models or machines can be compared entry by entry. --min-accuracy
+picks the fastest configuration that meets the bar.
+
+    python benchmarks/eval_routing.py --backends eager,int8 --temperatures 0,0.3 --output eval/
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+ALBERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+import torch  # noqa: E402
+
+from chat_engine import ChatEngine, ROUTING_MODES, model_path  # noqa: E402
+from instrumentation import GENERATED_TOKENS  # noqa: E402
+from processing import extract_json_object  # noqa: E402
+from prompt_store import PromptStore  # noqa: E402
+from thalamus.thalamus import Thalamus  # noqa: E402
+
+DATASET_PATH = os.path.join(ALBERT_DIR, "thalamus", "model", "training_data", "training_dataset_3-27-25.jsonl")
+PROMPTS_PATH = os.path.join(ALBERT_DIR, "prompts", "prompts.yaml")
+DECODINGS = ("structured", "sample")
+
+
+def load_examples(path, limit=None):
+    with open(path, "r") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+    return examples[:limit]
+
+
+def build_grid(args):
+    """Distinct configurations, in a stable order."""
+    configs = {}
+    for backend, mode, decoding, temperature, top_p, max_new_tokens in itertools.product(
+        args.backends, args.modes, args.decodings, args.temperatures, args.top_p, args.max_new_tokens
+    ):
+        if mode == "score":
+            # Scoring ranks every label in one pass; no decoding settings apply.
+            config = {"backend": backend, "mode": mode}
+        else:
+            config = {"backend": backend, "mode": mode, "decoding": decoding, "temperature": temperature}
+            if temperature > 0:
+                config["top_p"] = top_p
+            if decoding == "sample":
+                # Structured decoding has its own budget (the JSON template's length).
+                config["max_new_tokens"] = max_new_tokens
+        configs.setdefault(config_id(config), config)
+    return configs
+
+
+def config_id(config):
+    parts = [config["backend"], config["mode"]]
+    if config["mode"] != "score":
+        parts.append(config["decoding"])
+        temperature = config["temperature"]
+        parts.append(f"t{temperature:g}-p{config['top_p']:g}" if temperature > 0 else "greedy")
+        if "max_new_tokens" in config:
+            parts.append(f"n{config['max_new_tokens']}")
+    return "-".join(parts)
+
+
+def load_engine(args, backend):
+    engine = ChatEngine(
+        model_dir=args.model_dir,
+        max_batch_size=args.batch_size,
+        max_wait_ms=0,
+        request_timeout=None,
+        decoding="structured",
+        backend=backend,
+        onnx_dir=args.onnx_dir,
+        dtype=args.dtype,
+        adapters={"thalamus": args.adapter} if args.adapter else None,
+    )
+    engine.set_prompt_prefix("thalamus", PromptStore(PROMPTS_PATH).thalamus_prefix())
+    return engine
+
+
+def configure(engine, config, structured_constraints):
+    """Switch a loaded engine to a configuration without reloading the model."""
+    if config["mode"] == "score":
+        return
+    structured = config["decoding"] == "structured"
+    engine.decoding = config["decoding"]
+    engine.constraints = structured_constraints if structured else {}
+    engine.thalamus.do_sample = config["temperature"] > 0
+    # Unset options fall back to the class defaults.
+    engine.thalamus.temperature = config["temperature"] or Thalamus.temperature
+    engine.thalamus.top_p = config.get("top_p", Thalamus.top_p)
+    engine.thalamus.max_new_tokens = config.get("max_new_tokens", Thalamus.max_new_tokens)
+
+
+def route_all(engine, prompts, mode):
+    # Submitting everything at once lets the micro-batcher fill each batch.
+    futures = [engine.submit_reply(prompt, engine="thalamus", mode=mode) for prompt in prompts]
+    return [future.result() for future in futures]
+
+
+def judge(reply, expected):
+    text = reply.strip()
+    try:
+        valid_json = isinstance(json.loads(text), dict)
+    except json.JSONDecodeError:
+        valid_json = False
+    # Accuracy is judged as leniently as the server parses replies.
+    routed = {}
+    found = extract_json_object(text)
+    if found is not None:
+        try:
+            routed = json.loads(found)
+        except json.JSONDecodeError:
+            pass
+    if not isinstance(routed, dict):
+        routed = {}
+    region_ok = routed.get("region") == expected["region"]
+    schema_ok = routed.get("schema") == expected["schema"]
+    return {
+        "valid_json": valid_json,
+        "region": routed.get("region"),
+        "schema": routed.get("schema"),
+        "region_correct": region_ok,
+        "schema_correct": schema_ok,
+        "correct": region_ok and schema_ok,
+    }
+
+
+def evaluate(engine, config, examples, prompts, seed):
+    mode = config["mode"]
+    decoding = config.get("decoding")
+    # Warm up this configuration on one batch (compiles, allocator growth, caches).
+    route_all(engine, prompts[:engine.batcher.max_batch_size], mode)
+
+    torch.manual_seed(seed)
+    tokens_before = GENERATED_TOKENS.value(engine="thalamus", decoding=decoding) if decoding else 0
+    start = time.perf_counter()
+    replies = route_all(engine, prompts, mode)
+    elapsed = time.perf_counter() - start
+    generated = (GENERATED_TOKENS.value(engine="thalamus", decoding=decoding) - tokens_before) if decoding else 0
+
+    predictions = []
+    for example, reply in zip(examples, replies):
+        expected = json.loads(example["output"])
+        predictions.append({"input": example["input"], "expected": expected, "reply": reply, **judge(reply, expected)})
+
+    def rate(field):
+        return round(sum(prediction[field] for prediction in predictions) / len(predictions), 4)
+
+    metrics = {
+        "region_accuracy": rate("region_correct"),
+        "schema_accuracy": rate("schema_correct"),
+        "accuracy": rate("correct"),
+        "json_valid_rate": rate("valid_json"),
+        "mean_generated_tokens": round(generated / len(predictions), 2),
+        "ms_per_example": round(1000 * elapsed / len(predictions), 2),
+        "examples_per_second": round(len(predictions) / elapsed, 2),
+    }
+    return metrics, predictions
+
+
+def select_fastest(results, min_accuracy):
+    passing = [entry for entry in results if entry["metrics"]["accuracy"] >= min_accuracy]
+    return min(passing, key=lambda entry: entry["metrics"]["ms_per_example"], default=None)
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def parse_list(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Routing accuracy vs. latency over decoding configurations")
+    parser.add_argument("--model-dir", default=model_path, help="Path to the thalamus model directory")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Labeled JSONL with input/output pairs")
+    parser.add_argument("--limit", type=int, default=None, help="Only evaluate the first N examples")
+    parser.add_argument("--backends", type=parse_list(str), default=["eager"], help="Comma-separated backends")
+    parser.add_argument("--onnx-dir", default=None, help="Exported model for the onnx backend")
+    parser.add_argument("--dtype", default=None, help="Weight precision, e.g. bfloat16 (default: the checkpoint's)")
+    parser.add_argument("--adapter", default=None, help="Thalamus LoRA adapter (trainer.py --lora) on --model-dir")
+    parser.add_argument("--modes", type=parse_list(str), default=list(ROUTING_MODES), help="generate and/or score")
+    parser.add_argument("--decodings", type=parse_list(str), default=list(DECODINGS), help="structured and/or sample")
+    parser.add_argument("--temperatures", type=parse_list(float), default=[0.0, 0.3],
+                        help="Sampling temperatures; 0 means greedy decoding")
+    parser.add_argument("--top-p", type=parse_list(float), default=[0.9], help="Nucleus sampling thresholds")
+    parser.add_argument("--max-new-tokens", type=parse_list(int), default=[150],
+                        help="Token budgets for unconstrained (sample) decoding")
+    parser.add_argument("--batch-size", type=int, default=8, help="Micro-batch size")
+    parser.add_argument("--seed", type=int, default=0, help="Seed set before each configuration")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Pick the fastest config with this accuracy")
+    parser.add_argument("--output", default=None, help="Directory for results.json and predictions/")
+    args = parser.parse_args()
+    for name, allowed in (("modes", ROUTING_MODES), ("decodings", DECODINGS)):
+        unknown = set(getattr(args, name)) - set(allowed)
+        if unknown:
+            parser.error(f"--{name}: unknown {', '.join(sorted(unknown))} (expected {', '.join(allowed)})")
+
+    examples = load_examples(args.dataset, args.limit)
+    prompts = [PromptStore.build_suffix(example["input"]) for example in examples]
+    grid = build_grid(args)
+
+    results = []
+    for backend in args.backends:
+        engine = load_engine(args, backend)
+        structured_constraints = dict(engine.constraints)
+        for identifier, config in grid.items():
+            if config["backend"] != backend:
+                continue
+            configure(engine, config, structured_constraints)
+            metrics, predictions = evaluate(engine, config, examples, prompts, args.seed)
+            results.append({"id": identifier, "config": config, "metrics": metrics})
+            print(f"{identifier}: {json.dumps(metrics)}", file=sys.stderr, flush=True)
+            if args.output:
+                os.makedirs(os.path.join(args.output, "predictions"), exist_ok=True)
+                with open(os.path.join(args.output, "predictions", f"{identifier}.jsonl"), "w") as f:
+                    f.writelines(json.dumps(prediction) + "\n" for prediction in predictions)
+        engine.batcher.close()
+
+    report = {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_dir": os.path.realpath(args.model_dir),
+            "dataset": os.path.realpath(args.dataset),
+            "dataset_sha256": file_sha256(args.dataset),
+            "examples": len(examples),
+            "batch_size": args.batch_size,
+            "dtype": args.dtype,
+            "adapter": os.path.realpath(args.adapter) if args.adapter else None,
+            "seed": args.seed,
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    if args.min_accuracy is not None:
+        best = select_fastest(results, args.min_accuracy)
+        report["selected"] = best["id"] if best else None
+        if best is None:
+            print(f"No configuration reaches accuracy {args.min_accuracy}", file=sys.stderr)
+    if args.output:
+        with open(os.path.join(args.output, "results.json"), "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
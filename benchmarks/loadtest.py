@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Load test: replay a mix of thalamus, ACC and sight traffic against the albert server.
+
+Starts the server in-process or as a uvicorn subprocess, on the real models or
+on tiny stand-in models (see stand_in_models.py, fully offline), then drives it
+through the albert/clients classes either at a fixed concurrency (closed loop)
+or at a fixed request rate (open loop). Prints a JSON report with p50/p95/p99
+latency, throughput and error rate per traffic type, plus the server's peak RSS.
+
+With --baseline the run is compared against an earlier report and the script
+exits with status 1 when latency, throughput, errors or memory regressed.
+
+Examples:
+    python benchmarks/loadtest.py --requests 200 --concurrency 8 --output run.json
+    python benchmarks/loadtest.py --rate 20 --duration 30 --mix thalamus=1
+    python benchmarks/loadtest.py --requests 200 --concurrency 8 --baseline run.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import yaml
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ALBERT_DIR = os.path.join(ROOT_DIR, "albert")
+sys.path.insert(0, ALBERT_DIR)
+
+from clients.http_client import RetryPolicy  # noqa: E402
+from clients.thalamus_client import ThalamusClient  # noqa: E402
+from clients.acc_client import ACCClient  # noqa: E402
+from clients.vision_client import VisionClient  # noqa: E402
+from stand_in_models import build_stand_in_models  # noqa: E402
+
+SETTINGS_PATH = os.path.join(ALBERT_DIR, "config", "settings.yaml")
+DATASET_PATH = os.path.join(ALBERT_DIR, "thalamus", "model", "training_data", "training_dataset_3-27-25.jsonl")
+IMAGE_DIR = os.path.join(ROOT_DIR, "examples", "sight")
+DEFAULT_STAND_IN_DIR = os.path.join(tempfile.gettempdir(), "albert_stand_in_models")
+TRAFFIC_TYPES = ("thalamus", "acc", "sight")
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def parse_mix(text):
+    """Parse "thalamus=0.6,acc=0.3,sight=0.1" into normalized weights."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in TRAFFIC_TYPES:
+            raise argparse.ArgumentTypeError(f"Unknown traffic type {name!r} (expected {', '.join(TRAFFIC_TYPES)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("The mix needs a positive weight")
+    return {name: round(weight / total, 4) for name, weight in mix.items() if weight > 0}
+
+
+def write_settings(args):
+    """Write the settings file the server runs with and return its path."""
+    with open(args.settings or SETTINGS_PATH, "r") as f:
+        settings = yaml.safe_load(f) or {}
+    if args.models == "stand-in":
+        thalamus_dir, sight_dir = build_stand_in_models(args.stand_in_dir)
+        settings.setdefault("chat", {})["model_dir"] = thalamus_dir
+        settings.setdefault("sight", {})["model_name"] = sight_dir
+    if args.no_cache:
+        settings.setdefault("routing_cache", {})["enabled"] = False
+        settings.setdefault("caption_cache", {})["enabled"] = False
+    # Ready means loaded and warmed up, so traffic never hits a loading engine.
+    settings.setdefault("models", {})["loading"] = "eager"
+    handle, path = tempfile.mkstemp(prefix="albert_loadtest_", suffix=".yaml")
+    with os.fdopen(handle, "w") as f:
+        yaml.safe_dump(settings, f)
+    return path
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class InProcessServer:
+    """Runs the app with uvicorn on a background thread of this process."""
+
+    def __init__(self, settings_path, port, log_path=None):
+        os.environ["ALBERT_SETTINGS"] = settings_path
+        import uvicorn
+        import main
+        self.pid = os.getpid()
+        self.server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="loadtest-server", daemon=True)
+        self.thread.start()
+
+    def alive(self):
+        return self.thread.is_alive()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+class SubprocessServer:
+    """Runs ``uvicorn main:app`` in a child process, so its memory is measured on its own."""
+
+    def __init__(self, settings_path, port, log_path=None):
+        env = dict(os.environ, ALBERT_SETTINGS=settings_path)
+        # The app logs every request at INFO, so its output is discarded unless asked for.
+        self.log_file = open(log_path or os.devnull, "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=ALBERT_DIR,
+            env=env,
+            stdout=self.log_file,
+            stderr=subprocess.STDOUT,
+        )
+        self.pid = self.process.pid
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log_file.close()
+
+
+def wait_until_ready(server, base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not server.alive():
+            raise RuntimeError("The server exited before becoming ready")
+        try:
+            response = requests.get(f"{base_url}/health/ready", timeout=5)
+            if response.status_code == 200:
+                return response.json()
+            engines = response.json().get("engines", {})
+            failed = {name: status["error"] for name, status in engines.items() if status["state"] == "failed"}
+            if failed:
+                raise RuntimeError(f"Engines failed to load: {failed}")
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"The server was not ready after {timeout}s")
+
+
+def peak_rss_bytes(pid):
+    """High-water resident set size of a process (Linux); None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Workload:
+    """Turns request numbers into thalamus, ACC and sight calls through the client classes."""
+
+    def __init__(self, base_url, mix, connections, timeout, unique=False, seed=0):
+        with open(DATASET_PATH, "r") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        self.events = [json.loads(row["input"]) for row in rows]
+        self.routes = [json.loads(row["output"]) for row in rows]
+        self.images = sorted(
+            os.path.join(IMAGE_DIR, name) for name in os.listdir(IMAGE_DIR)
+            if name.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.unique = unique
+        self.seed = seed
+        # No client-side retries: every failure should show up in the error rate.
+        options = {"retry": RetryPolicy(max_retries=0), "max_connections": connections, "timeout": timeout}
+        self.thalamus = ThalamusClient(url=f"{base_url}/chat/completions", **options)
+        self.acc = ACCClient(url=f"{base_url}/chat/completions", **options)
+        self.vision = VisionClient(url=f"{base_url}/sight/", **options)
+
+    def kind(self, number):
+        # Seeded per request number, so every run replays the same sequence.
+        return random.Random(self.seed * 1_000_003 + number).choices(self.kinds, self.weights)[0]
+
+    def _event(self, number):
+        event = dict(self.events[number % len(self.events)])
+        if self.unique:
+            # Distinct inputs keep the routing cache from answering repeats.
+            event["input_data"] = f"{event['input_data']} ({number})"
+        return event
+
+    def send(self, kind, number):
+        if kind == "thalamus":
+            event = self._event(number)
+            self.thalamus.analyze(event["sensor"], event["input_type"], event["input_data"])
+        elif kind == "acc":
+            route = dict(self.routes[number % len(self.routes)], message=json.dumps(self._event(number)))
+            self.acc.evaluate(json.dumps(route))
+        else:
+            result = self.vision.get_caption(self.images[number % len(self.images)])
+            if "sight" not in result:
+                raise RuntimeError(f"Caption request failed: {result}")
+
+    def close(self):
+        for client in (self.thalamus, self.acc, self.vision):
+            client.close()
+
+
+def _timed_call(workload, number, scheduled, samples, lock):
+    kind = workload.kind(number)
+    error = None
+    try:
+        workload.send(kind, number)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    sample = (kind, time.perf_counter() - scheduled, error)
+    if samples is not None:
+        with lock:
+            samples.append(sample)
+
+
+def run_closed_loop(workload, concurrency, requests_total, duration, first_number=0, record=True):
+    """``concurrency`` callers each send their next request as soon as the last one returns."""
+    samples = [] if record else None
+    lock = threading.Lock()
+    numbers = itertools.count(first_number)
+    stop_at = time.perf_counter() + duration if duration else None
+
+    def caller():
+        while True:
+            with lock:
+                number = next(numbers)
+            if requests_total is not None and number >= first_number + requests_total:
+                return
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return
+            _timed_call(workload, number, time.perf_counter(), samples, lock)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def run_open_loop(workload, rate, requests_total, duration, max_in_flight, first_number=0):
+    """Start requests on a fixed schedule regardless of how fast earlier ones return.
+
+    Latency is measured from each request's scheduled start, so time spent waiting
+    for a free caller counts (no coordinated omission).
+    """
+    samples = []
+    lock = threading.Lock()
+    if requests_total is None:
+        requests_total = int(rate * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for index in range(requests_total):
+            scheduled = start + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_timed_call, workload, first_number + index, scheduled, samples, lock)
+    return samples, time.perf_counter() - start
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated percentile (0-100) of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency * 1000 for _, latency, error in samples if error is None)
+    errors = [error for _, _, error in samples if error is not None]
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed, 3) if elapsed else None,
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "mean": _round(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _round(latencies[-1]) if latencies else None,
+        },
+        "sample_errors": sorted(set(errors))[:5],
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def compare(report, baseline, tolerance, error_tolerance):
+    """List the metrics that got worse than the baseline by more than the tolerance."""
+    regressions = []
+
+    def check(metric, current, previous, higher_is_worse=True, absolute=False):
+        if current is None or previous is None:
+            return
+        if absolute:
+            worse = current > previous + error_tolerance
+        elif higher_is_worse:
+            worse = current > previous * (1 + tolerance)
+        else:
+            worse = current < previous * (1 - tolerance)
+        if worse:
+            change = None if not previous else round((current - previous) / previous, 4)
+            regressions.append({"metric": metric, "baseline": previous, "current": current, "change": change})
+
+    for kind, previous in baseline.get("results", {}).items():
+        current = report["results"].get(kind)
+        if current is None:
+            continue
+        for quantile in ("p50", "p95", "p99"):
+            check(f"{kind}.latency_ms.{quantile}", current["latency_ms"][quantile], previous["latency_ms"][quantile])
+        check(f"{kind}.throughput_rps", current["throughput_rps"], previous["throughput_rps"], higher_is_worse=False)
+        check(f"{kind}.error_rate", current["error_rate"], previous["error_rate"], absolute=True)
+    check("server.peak_rss_bytes", report["server"]["peak_rss_bytes"], baseline.get("server", {}).get("peak_rss_bytes"))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    settings_path = write_settings(args)
+    port = args.port or free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log(f"Starting the server ({args.server}, {args.models} models) on {base_url}")
+    server_class = InProcessServer if args.server == "inprocess" else SubprocessServer
+    server = server_class(settings_path, port, log_path=args.server_log)
+    try:
+        start = time.perf_counter()
+        wait_until_ready(server, base_url, args.startup_timeout)
+        startup_seconds = time.perf_counter() - start
+        log(f"Server ready after {startup_seconds:.1f}s")
+
+        connections = args.concurrency if args.rate is None else args.max_in_flight
+        workload = Workload(base_url, args.mix, connections, args.timeout, unique=args.unique, seed=args.seed)
+        try:
+            if args.warmup:
+                log(f"Warming up with {args.warmup} requests")
+                # Warm-up numbers come after the measured ones so both runs see the same sequence.
+                run_closed_loop(workload, min(args.concurrency, args.warmup), args.warmup, None,
+                                first_number=10 ** 9, record=False)
+            log("Running load")
+            if args.rate is None:
+                samples, elapsed = run_closed_loop(workload, args.concurrency, args.requests, args.duration)
+            else:
+                samples, elapsed = run_open_loop(workload, args.rate, args.requests, args.duration, args.max_in_flight)
+        finally:
+            workload.close()
+        peak_rss = peak_rss_bytes(server.pid)
+    finally:
+        server.stop()
+        os.remove(settings_path)
+
+    results = {"all": summarize(samples, elapsed)}
+    for kind in args.mix:
+        results[kind] = summarize([sample for sample in samples if sample[0] == kind], elapsed)
+    return {
+        "config": {
+            "server": args.server,
+            "models": args.models,
+            "mix": args.mix,
+            "concurrency": args.concurrency if args.rate is None else None,
+            "rate": args.rate,
+            "requests": args.requests,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "no_cache": args.no_cache,
+            "unique": args.unique,
+            "seed": args.seed,
+            "git_commit": git_commit(),
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "server": {
+            "startup_seconds": round(startup_seconds, 3),
+            # In-process runs include the load generator in this figure.
+            "peak_rss_bytes": peak_rss,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the albert server with a mix of traffic")
+    parser.add_argument("--server", choices=("inprocess", "subprocess"), default="subprocess",
+                        help="Run the app in this process or in a uvicorn child process")
+    parser.add_argument("--models", choices=("stand-in", "real"), default="stand-in",
+                        help="Tiny offline stand-in models, or the models named in the settings")
+    parser.add_argument("--stand-in-dir", default=DEFAULT_STAND_IN_DIR, help="Where stand-in models are built")
+    parser.add_argument("--settings", default=None, help="Base settings file (defaults to albert/config/settings.yaml)")
+    parser.add_argument("--server-log", default=None, help="File for the subprocess server's output")
+    parser.add_argument("--port", type=int, default=0, help="Server port (default: a free port)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("thalamus=0.6,acc=0.3,sight=0.1"),
+                        help="Traffic weights, e.g. thalamus=0.6,acc=0.3,sight=0.1")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers (closed loop)")
+    parser.add_argument("--rate", type=float, default=None, help="Requests per second (open loop) instead of --concurrency")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Most concurrent requests in open-loop mode")
+    parser.add_argument("--requests", type=int, default=None, help="Number of measured requests")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=600.0, help="Seconds to wait for the server")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the routing and caption caches")
+    parser.add_argument("--unique", action="store_true", help="Make every thalamus/ACC input distinct")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the traffic sequence")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed relative regression in latency, throughput and peak RSS")
+    parser.add_argument("--error-tolerance", type=float, default=0.01, help="Allowed absolute rise in error rate")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.requests = 100
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+
+    report = run(args)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.error_tolerance)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+        for regression in regressions:
+            log(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']}")
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    sys.exit(exit_code)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tiny stand-in thalamus and captioning models for offline benchmarks.
+
+Builds randomly initialized (seeded) models with the same architectures as the
+real ones -- a GPT-2 causal LM and a ViT + GPT-2 VisionEncoderDecoder -- and a
+small byte-level BPE tokenizer trained on the repo's prompts and training data.
+They load through the normal engine code paths, so the server, batching and
+caching can be load-tested without downloading or training anything. Their
+replies are gibberish; the thalamus and ACC parsers fall back accordingly.
+"""
+
+import argparse
+import os
+import sys
+
+import torch
+from tokenizers import ByteLevelBPETokenizer
+from transformers import (
+    GPT2Config,
+    GPT2LMHeadModel,
+    PreTrainedTokenizerFast,
+    VisionEncoderDecoderConfig,
+    VisionEncoderDecoderModel,
+    ViTConfig,
+    ViTImageProcessor,
+)
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TOKENIZER_CORPUS = [
+    os.path.join(ROOT_DIR, "albert", "prompts", "prompts.yaml"),
+    os.path.join(ROOT_DIR, "albert", "thalamus", "model", "training_data", "training_dataset_3-27-25.jsonl"),
+    os.path.join(ROOT_DIR, "README.md"),
+]
+END_OF_TEXT = "<|endoftext|>"
+
+
+def build_tokenizer(vocab_size=2000):
+    bpe = ByteLevelBPETokenizer()
+    bpe.train([path for path in TOKENIZER_CORPUS if os.path.exists(path)], vocab_size=vocab_size,
+              special_tokens=[END_OF_TEXT], show_progress=False)
+    return PreTrainedTokenizerFast(
+        tokenizer_object=bpe._tokenizer,
+        bos_token=END_OF_TEXT, eos_token=END_OF_TEXT, unk_token=END_OF_TEXT, pad_token=END_OF_TEXT,
+    )
+
+
+def build_thalamus(output_dir, tokenizer, n_layer=2, n_embd=64):
+    config = GPT2Config(
+        n_layer=n_layer, n_head=2, n_embd=n_embd, vocab_size=len(tokenizer),
+        bos_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id,
+    )
+    GPT2LMHeadModel(config).save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+
+def build_sight(output_dir, tokenizer, hidden_size=32):
+    encoder = ViTConfig(
+        hidden_size=hidden_size, num_hidden_layers=1, num_attention_heads=2, intermediate_size=2 * hidden_size,
+        image_size=224, patch_size=32,
+    )
+    decoder = GPT2Config(
+        n_layer=1, n_head=2, n_embd=hidden_size, vocab_size=len(tokenizer), add_cross_attention=True,
+        is_decoder=True, bos_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id,
+    )
+    model = VisionEncoderDecoderModel(config=VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder))
+    for config in (model.config, model.generation_config):
+        config.decoder_start_token_id = tokenizer.bos_token_id
+        config.pad_token_id = tokenizer.eos_token_id
+    model.generation_config.eos_token_id = tokenizer.eos_token_id
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    ViTImageProcessor().save_pretrained(output_dir)
+
+
+def build_stand_in_models(output_dir, seed=0, force=False):
+    """Create ``<output_dir>/thalamus`` and ``<output_dir>/sight`` unless they already exist.
+
+    Returns ``(thalamus_dir, sight_dir)``.
+    """
+    thalamus_dir = os.path.join(output_dir, "thalamus")
+    sight_dir = os.path.join(output_dir, "sight")
+    if force or not (os.path.isdir(thalamus_dir) and os.path.isdir(sight_dir)):
+        torch.manual_seed(seed)
+        tokenizer = build_tokenizer()
+        build_thalamus(thalamus_dir, tokenizer)
+        build_sight(sight_dir, tokenizer)
+    return thalamus_dir, sight_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build tiny stand-in models for offline benchmarks")
+    parser.add_argument("--output", required=True, help="Directory to write thalamus/ and sight/ into")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random weights")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the models exist")
+    args = parser.parse_args()
+
+    thalamus_dir, sight_dir = build_stand_in_models(args.output, seed=args.seed, force=args.force)
+    print(f"thalamus: {thalamus_dir}", file=sys.stderr)
+    print(f"sight: {sight_dir}", file=sys.stderr)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# The server modules import each other by bare name, as when run from albert/.
+sys.path.insert(0, os.path.join(ROOT_DIR, "albert"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def stand_in_models(tmp_path_factory):
+    """Tiny seeded thalamus and sight models (see benchmarks/stand_in_models.py)."""
+    from stand_in_models import build_stand_in_models
+
+    return build_stand_in_models(str(tmp_path_factory.mktemp("models")))
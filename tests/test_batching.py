@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def doubling_handler(key, items):
+    return [item * 2 for item in items]
+
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def make(handler=doubling_handler, **kwargs):
+        batcher = MicroBatcher(handler, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+
+def blocked_handler():
+    """A handler that holds the worker on its first batch until ``release`` is set."""
+    started, release = threading.Event(), threading.Event()
+    batches = []
+
+    def handler(key, items):
+        batches.append((key, list(items)))
+        started.set()
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    return handler, started, release, batches
+
+
+def test_concurrent_requests_share_a_batch(make_batcher):
+    batches = []
+
+    def handler(key, items):
+        batches.append(list(items))
+        return doubling_handler(key, items)
+
+    batcher = make_batcher(handler, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+def test_batches_are_split_by_key_and_size(make_batcher):
+    batches = []
+
+    def handler(key, items):
+        batches.append((key, list(items)))
+        return doubling_handler(key, items)
+
+    batcher = make_batcher(handler, max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit(i, key="a" if i % 2 else "b") for i in range(4)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6]
+    for key, items in batches:
+        assert len(items) <= 2
+        assert all((item % 2 == 1) == (key == "a") for item in items)
+
+
+def test_request_expires_while_queued(make_batcher):
+    handler, started, release, _ = blocked_handler()
+    batcher = make_batcher(handler, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit(1)
+    assert started.wait(5)
+    expired = batcher.submit(2, timeout=0.01)
+    time.sleep(0.05)
+    release.set()
+    assert first.result(timeout=5) == 2
+    with pytest.raises(TimeoutError):
+        expired.result(timeout=5)
+
+
+def test_cancelled_request_is_skipped(make_batcher):
+    handler, started, release, batches = blocked_handler()
+    batcher = make_batcher(handler, max_batch_size=1, max_wait_ms=0)
+    batcher.submit(1)
+    assert started.wait(5)
+    cancelled = batcher.submit(2)
+    assert cancelled.cancel()
+    release.set()
+    assert batcher.submit(3).result(timeout=5) == 6
+    assert [items for _, items in batches] == [[1], [3]]
+
+
+def test_cancelled_and_expired_request_does_not_stop_the_worker(make_batcher):
+    handler, started, release, _ = blocked_handler()
+    batcher = make_batcher(handler, max_batch_size=1, max_wait_ms=0)
+    batcher.submit(1)
+    assert started.wait(5)
+    doomed = batcher.submit(2, timeout=0.01)
+    doomed.cancel()
+    time.sleep(0.05)
+    release.set()
+    assert batcher.submit(3).result(timeout=5) == 6
+
+
+def test_handler_error_fails_only_its_batch(make_batcher):
+    def handler(key, items):
+        if key == "bad":
+            raise ValueError("boom")
+        return doubling_handler(key, items)
+
+    batcher = make_batcher(handler, max_wait_ms=50)
+    bad = batcher.submit(1, key="bad")
+    good = batcher.submit(2, key="good")
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    assert good.result(timeout=5) == 4
+
+
+def test_wrong_result_count_is_an_error(make_batcher):
+    batcher = make_batcher(lambda key, items: [], max_wait_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit(1).result(timeout=5)
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(doubling_handler)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
+
+
+def test_requests_are_collected_in_submission_order(make_batcher):
+    # Priority is applied by the inference pool; the batcher itself is first come, first served.
+    handler, started, release, batches = blocked_handler()
+    batcher = make_batcher(handler, max_batch_size=3, max_wait_ms=50)
+    first = batcher.submit(0, key="a")
+    assert started.wait(5)
+    futures = [batcher.submit(item, key=key) for item, key in [(1, "b"), (2, "a"), (3, "b"), (4, "a"), (5, "b")]]
+    release.set()
+    assert first.result(timeout=5) == 0
+    assert [future.result(timeout=5) for future in futures] == [2, 4, 6, 8, 10]
+    # The oldest three requests form the next batch, split by key in order of first appearance.
+    assert batches == [("a", [0]), ("b", [1, 3]), ("a", [2]), ("a", [4]), ("b", [5])]
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache, "time", fake)
+    return fake
+
+
+def test_concurrent_identical_keys_share_one_compute():
+    store = TTLCache("test_coalesce")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(store.get_or_compute("k", compute)))
+    leader.start()
+    assert started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(store.get_or_compute("k", compute))) for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_failing_leader_propagates_and_is_not_cached():
+    store = TTLCache("test_failing_leader")
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            store.get_or_compute("k", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    # Nothing was stored and the key is no longer in flight, so the next caller recomputes.
+    assert store.peek("k") is None
+    assert store.get_or_compute("k", lambda: "retried") == "retried"
+
+
+def test_entries_expire_after_the_ttl(clock):
+    store = TTLCache("test_ttl", ttl_seconds=10)
+    store.put("k", "old")
+    clock.now += 9
+    assert store.peek("k") == "old"
+    clock.now += 2
+    assert store.peek("k") is None
+    assert store.get_or_compute("k", lambda: "new") == "new"
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    store = TTLCache("test_lru", max_entries=2)
+    store.put("a", 1)
+    store.put("b", 2)
+    assert store.peek("a") == 1  # "b" is now the least recently used
+    store.put("c", 3)
+    assert store.peek("b") is None
+    assert (store.peek("a"), store.peek("c")) == (1, 3)
+
+
+def test_sqlite_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = TTLCache("test_disk", disk_path=path)
+    assert first.get_or_compute("k", lambda: {"region": "amygdala"}) == {"region": "amygdala"}
+    first.disk.close()
+
+    second = TTLCache("test_disk", disk_path=path)
+    assert second.peek("k") is None  # memory tier starts empty
+    assert second.get_or_compute("k", pytest.fail) == {"region": "amygdala"}
+    assert second.peek("k") == {"region": "amygdala"}
+    second.disk.close()
+
+
+def test_expired_disk_entries_are_recomputed(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    first = TTLCache("test_disk_ttl", ttl_seconds=10, disk_path=path)
+    first.put("k", "old")
+    first.disk.close()
+
+    clock.now += 11
+    second = TTLCache("test_disk_ttl", ttl_seconds=10, disk_path=path)
+    assert second.get_or_compute("k", lambda: "new") == "new"
+    second.disk.close()
@@ -0,0 +1,79 @@
+import io
+import random
+
+from PIL import Image
+
+from caption_cache import CaptionCache, PerceptualIndex, dhash
+
+
+def flip_bits(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def gradient(width=64, height=48, noise=0, seed=0):
+    rng = random.Random(seed)
+    image = Image.new("L", (width, height))
+    image.putdata(
+        [min(255, max(0, (x * 255) // width + rng.randint(-noise, noise))) for y in range(height) for x in range(width)]
+    )
+    return image.convert("RGB")
+
+
+def test_lookup_matches_hashes_within_max_distance():
+    index = PerceptualIndex("test_phash", max_distance=4)
+    phash = 0x0123_4567_89AB_CDEF
+    index.put(phash, "a cat")
+    # Spread the flipped bits over several bands; one band still matches exactly.
+    assert index.get(flip_bits(phash, [0, 15, 30, 45])) == "a cat"
+    assert index.get(flip_bits(phash, [0, 13, 26, 39, 52])) is None
+
+
+def test_lookup_returns_the_closest_entry():
+    index = PerceptualIndex("test_phash_closest", max_distance=4)
+    phash = 0xFFFF_0000_FFFF_0000
+    index.put(flip_bits(phash, [1, 2, 3]), "far")
+    index.put(flip_bits(phash, [1]), "near")
+    assert index.get(phash) == "near"
+
+
+def test_evicted_hashes_leave_the_band_index():
+    index = PerceptualIndex("test_phash_lru", max_entries=1, max_distance=4)
+    index.put(0, "first")
+    index.put(2**64 - 1, "second")
+    assert index.get(0) is None
+    assert index.get(2**64 - 1) == "second"
+    assert all(len(bucket) == 1 for bucket in index._buckets)
+
+
+def test_near_identical_frames_reuse_the_caption():
+    frame = gradient()
+    nudged = gradient(noise=2, seed=1)
+    assert (dhash(frame) ^ dhash(nudged)).bit_count() <= 4
+
+    cache = CaptionCache(version="test")
+    generated = []
+
+    def generate(image):
+        generated.append(image)
+        return "a gradient"
+
+    def encode(image):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def decode(contents):
+        return Image.open(io.BytesIO(contents))
+
+    assert cache.get_or_caption(encode(frame), decode, generate) == "a gradient"
+    assert cache.get_or_caption(encode(nudged), decode, generate) == "a gradient"
+    assert len(generated) == 1
+    # A different scene is captioned by the model.
+    assert cache.get_or_caption(encode(frame.rotate(90)), decode, lambda image: "something else") == "something else"
+
+
+def test_negative_max_distance_disables_near_lookup():
+    cache = CaptionCache(version="test", max_distance=-1)
+    assert cache.get_near(gradient()) == (None, None)
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+from PIL import Image, ImageFile
+
+from frame_stream import ChangeDetector
+from image_preprocessing import ImageTooLargeError
+
+
+def encode(image, format="PNG"):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_static_frame_has_no_motion():
+    detector = ChangeDetector(threshold=0.05)
+    frame = encode(Image.linear_gradient("L").convert("RGB"))
+    thumbnail = detector.thumbnail(frame)
+    assert detector.should_caption(detector.motion(thumbnail))
+    detector.update(thumbnail, now=0)
+    assert detector.motion(detector.thumbnail(frame)) == 0
+    assert not detector.should_caption(0, now=1)
+
+
+def test_changed_frame_is_captioned():
+    detector = ChangeDetector(threshold=0.05)
+    detector.update(detector.thumbnail(encode(Image.new("L", (64, 64), 0))), now=0)
+    motion = detector.motion(detector.thumbnail(encode(Image.new("L", (64, 64), 255))))
+    assert motion == pytest.approx(1.0)
+    assert detector.should_caption(motion, now=1)
+
+
+@pytest.mark.parametrize("limits", [{"max_pixels": 64 * 64 - 1}, {"max_upload_bytes": 10}])
+def test_oversized_frames_are_rejected_before_decoding(limits, monkeypatch):
+    detector = ChangeDetector(**limits)
+    frame = encode(Image.new("RGB", (64, 64)))
+    monkeypatch.setattr(ImageFile.ImageFile, "load", lambda self: pytest.fail("pixel data was decoded"))
+    with pytest.raises(ImageTooLargeError):
+        detector.thumbnail(frame)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+import yaml
+
+from prompt_store import PromptStore
+
+PROMPTS = {
+    "thalamus": {
+        "main_prompt": "Route it.",
+        "region_key_prompt": "Regions.",
+        "schema_key_prompt": "Schemas.",
+        "example_prompt": "Examples.",
+    },
+    "acc": {
+        "main_system_prompt": "Judge it.",
+        "pass_doubt_key_prompt": "Pass or doubt.",
+        "threshold_score_key_prompt": "Scores.",
+        "feelings_key_prompt": "Feelings.",
+        "significance_key_prompt": "Significance.",
+        "example_prompt": "Examples.",
+    },
+}
+
+
+def write_prompts(path, main_prompt):
+    data = {**PROMPTS, "thalamus": {**PROMPTS["thalamus"], "main_prompt": main_prompt}}
+    path.write_text(yaml.safe_dump(data))
+    # Make sure the edit is visible even on coarse-grained mtimes.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def prompts_path(tmp_path):
+    path = tmp_path / "prompts.yaml"
+    write_prompts(path, "Route it.")
+    return path
+
+
+def test_unchanged_file_is_not_reloaded(prompts_path):
+    store = PromptStore(str(prompts_path))
+    assert not store.reload_if_changed(on_reload=pytest.fail)
+
+
+def test_prefixes_are_rebuilt_before_the_version_changes(prompts_path):
+    store = PromptStore(str(prompts_path))
+    old_version = store.version
+    seen = []
+
+    def on_reload(prefixes):
+        seen.append((store.version, prefixes["thalamus"]))
+
+    write_prompts(prompts_path, "Route it carefully.")
+    assert store.reload_if_changed(on_reload=on_reload)
+    assert seen == [(old_version, store.thalamus_prefix())]
+    assert seen[0][1].startswith("Route it carefully.")
+    assert store.version != old_version
+
+
+def test_failed_rebuild_keeps_the_old_prompts(prompts_path):
+    store = PromptStore(str(prompts_path))
+    old_version, old_prefix = store.version, store.thalamus_prefix()
+
+    def on_reload(prefixes):
+        raise RuntimeError("prefix cache failed")
+
+    write_prompts(prompts_path, "Route it carefully.")
+    with pytest.raises(RuntimeError):
+        store.reload_if_changed(on_reload=on_reload)
+    assert (store.version, store.thalamus_prefix()) == (old_version, old_prefix)
+    # The edit is picked up on the next call.
+    assert store.reload_if_changed()
+    assert store.version != old_version
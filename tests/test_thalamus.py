@@ -0,0 +1,55 @@
+import pytest
+
+from constrained import thalamus_template
+from prompt_store import PromptStore
+from thalamus.thalamus import Thalamus
+
+PREFIX = "Route the sensor event to a brain region and schema.\n\nInput:\n"
+EVENTS = [
+    '{"sensor": "chat", "input_type": "text", "input_data": "What is 12 + 30?"}',
+    '{"sensor": "camera", "input_type": "image", "input_data": "a dog running across a busy street"}',
+    '{"sensor": "audio", "input_type": "audio", "input_data": "loud bang"}',
+]
+SUFFIXES = [PromptStore.build_suffix(event) for event in EVENTS]
+
+
+@pytest.fixture(scope="module")
+def thalamus(stand_in_models):
+    thalamus_dir, _ = stand_in_models
+    engine = Thalamus(model_dir=thalamus_dir, device="cpu", do_sample=False)
+    engine.max_new_tokens = 12
+    engine.cache_prefix("route", PREFIX)
+    return engine
+
+
+def test_batched_generation_matches_single(thalamus):
+    # Prompts of different lengths, so the batch is left-padded.
+    batched = thalamus.generate_texts(SUFFIXES)
+    single = [thalamus.generate_text(suffix) for suffix in SUFFIXES]
+    assert batched == single
+
+
+def test_cached_prefix_matches_full_prompt(thalamus):
+    cached = thalamus.generate_texts(SUFFIXES, prefix="route")
+    full = [thalamus.generate_text(PREFIX + suffix) for suffix in SUFFIXES]
+    assert cached == full
+
+
+def test_cached_prefix_batched_matches_single(thalamus):
+    batched = thalamus.generate_texts(SUFFIXES, prefix="route")
+    single = [thalamus.generate_text(suffix, prefix="route") for suffix in SUFFIXES]
+    assert batched == single
+
+
+def test_structured_decoding_parity(thalamus):
+    constraint = thalamus_template(thalamus.tokenizer)
+    batched = thalamus.generate_texts(SUFFIXES, prefix="route", constraint=constraint)
+    full = [thalamus.generate_text(PREFIX + suffix, constraint=constraint) for suffix in SUFFIXES]
+    assert batched == full
+
+
+def test_cached_prefix_scores_match_full_prompt(thalamus):
+    candidates = [' {"region": "amygdala"}', ' {"region": "hippocampus"}']
+    cached = thalamus.score_candidates(SUFFIXES[0], candidates, prefix="route")
+    full = thalamus.score_candidates(PREFIX + SUFFIXES[0], candidates)
+    assert cached == pytest.approx(full, abs=1e-3)
@@ -0,0 +1,44 @@
+import importlib.util
+import os
+
+import pytest
+import torch
+from transformers import AutoModelForCausalLM
+
+from conftest import ROOT_DIR
+
+# Loaded by path: albert/pipeline.py already owns the module name "pipeline".
+PIPELINE_PATH = os.path.join(ROOT_DIR, "albert", "thalamus", "model", "training_data", "pipeline.py")
+spec = importlib.util.spec_from_file_location("training_pipeline", PIPELINE_PATH)
+training_pipeline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(training_pipeline)
+
+EXAMPLES = [[5, 6, 7, 8], [9, 10, 11], [12, 13, 14, 15, 16], [17, 18]]
+
+
+def test_examples_are_packed_whole_with_their_own_positions():
+    packed = training_pipeline.pack_batch({"input_ids": EXAMPLES}, max_length=8, pad_token_id=0)
+    assert packed["input_ids"] == [[5, 6, 7, 8, 9, 10, 11, 0], [12, 13, 14, 15, 16, 17, 18, 0]]
+    assert packed["position_ids"] == [[0, 1, 2, 3, 0, 1, 2, 0], [0, 1, 2, 3, 4, 0, 1, 0]]
+    # No loss across an example boundary or on the padding.
+    assert packed["labels"] == [[-100, 6, 7, 8, -100, 10, 11, -100], [-100, 13, 14, 15, 16, -100, 18, -100]]
+    assert packed["length"] == [7, 7]
+    assert "attention_mask" not in packed
+
+
+def test_packed_examples_do_not_attend_to_each_other(stand_in_models):
+    thalamus_dir, _ = stand_in_models
+    model = AutoModelForCausalLM.from_pretrained(thalamus_dir).eval()
+    packed = training_pipeline.pack_batch({"input_ids": EXAMPLES[:3]}, max_length=16, pad_token_id=0)
+    with torch.no_grad():
+        # As in trainer.py --strategy pack: no KV cache, so the mask follows position_ids.
+        logits = model(
+            input_ids=torch.tensor(packed["input_ids"]),
+            position_ids=torch.tensor(packed["position_ids"]),
+            use_cache=False,
+        ).logits[0]
+        offset = 0
+        for ids in EXAMPLES[:3]:
+            alone = model(input_ids=torch.tensor([ids])).logits[0]
+            assert torch.allclose(logits[offset:offset + len(ids)], alone, atol=1e-5)
+            offset += len(ids)